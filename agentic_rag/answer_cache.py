@@ -0,0 +1,154 @@
+# answer_cache.py
+
+"""
+Semantic answer cache for retrieve_answer.
+- Per subject: query embedding + retrieved chunk IDs + final answer
+- Hit when cosine(new query, cached query) >= similarity threshold
+- Invalidated whenever store_pipeline writes to the subject; other
+  processes notice through a per-subject generation counter in Mongo
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+
+import numpy as np
+from pymongo import ReturnDocument
+
+from agentic_rag.mongo_utils import get_mongo_client
+
+DEFAULT_SETTINGS = {
+    "enabled": True,
+    "similarity_threshold": 0.95,
+    "ttl_seconds": 3600,
+    "max_entries_per_subject": 256,
+}
+
+GENERATION_DB = os.getenv("LOG_DB", "agentic_rag_logs")
+GENERATION_COLLECTION = "cache_generations"
+GENERATION_POLL_S = float(os.getenv("ANSWER_CACHE_GENERATION_POLL_S", "10"))
+
+
+def get_answer_cache_settings(config: dict, subject: str) -> dict:
+    """Global "answer_cache" block from mongo_config.json, overridable per subject."""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update((config or {}).get("answer_cache", {}))
+    settings.update(((config or {}).get(subject) or {}).get("answer_cache", {}))
+    return settings
+
+
+def _normalize(vector) -> np.ndarray:
+    arr = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(arr)
+    return arr / norm if norm else arr
+
+
+class SemanticAnswerCache:
+    def __init__(self):
+        self.entries = {}          # (subject, provider, scope) → list of entry dicts (oldest first)
+        self.generations = {}      # subject → last generation seen
+        self.checked_at = {}       # subject → monotonic time of last generation poll
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+    # ----------------------------
+    # 🔁 Cross-process invalidation
+    # ----------------------------
+    def _sync_generation(self, subject: str):
+        now = time.monotonic()
+        if now - self.checked_at.get(subject, 0) < GENERATION_POLL_S:
+            return
+        self.checked_at[subject] = now
+        try:
+            doc = get_mongo_client()[GENERATION_DB][GENERATION_COLLECTION].find_one({"_id": subject})
+        except Exception as e:
+            logging.warning(f"⚠️ Answer cache generation check failed: {e}")
+            return
+        generation = (doc or {}).get("generation", 0)
+        if self.generations.get(subject) != generation:
+            self._drop_subject(subject)
+            self.generations[subject] = generation
+
+    def _drop_subject(self, subject: str):
+        with self.lock:
+            for key in [k for k in self.entries if k[0] == subject]:
+                del self.entries[key]
+
+    # ----------------------------
+    # 🔍 Lookup / Store
+    # ----------------------------
+    def lookup(self, subject: str, provider: str, query_vector, settings: dict, scope: str = ""):
+        """`scope` separates answers retrieved under different filters (e.g. per user)."""
+        if not settings.get("enabled", True):
+            return None
+        self._sync_generation(subject)
+        query = _normalize(query_vector)
+        now = time.time()
+        key = (subject, provider, scope)
+        with self.lock:
+            entries = [e for e in self.entries.get(key, []) if now - e["created_at"] < settings["ttl_seconds"]]
+            if entries:
+                self.entries[key] = entries
+            else:
+                self.entries.pop(key, None)   # one key per filter scope → don't keep empty ones
+            if not entries:
+                self.stats["misses"] += 1
+                return None
+            matrix = np.stack([e["embedding"] for e in entries])
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] >= settings["similarity_threshold"]:
+                self.stats["hits"] += 1
+                return {**entries[best], "similarity": float(scores[best])}
+            self.stats["misses"] += 1
+            return None
+
+    def store(self, subject: str, provider: str, query: str, query_vector, chunk_ids: list, answer: str, settings: dict,
+              scope: str = ""):
+        if not settings.get("enabled", True):
+            return
+        entry = {
+            "query": query,
+            "embedding": _normalize(query_vector),
+            "chunk_ids": chunk_ids,
+            "answer": answer,
+            "created_at": time.time(),
+        }
+        with self.lock:
+            entries = self.entries.setdefault((subject, provider, scope), [])
+            entries.append(entry)
+            del entries[:-settings["max_entries_per_subject"]]
+            self.stats["stores"] += 1
+
+    def invalidate(self, subject: str):
+        """Drop local entries and bump the shared generation so other workers drop theirs."""
+        self._drop_subject(subject)
+        self.stats["invalidations"] += 1
+        try:
+            doc = get_mongo_client()[GENERATION_DB][GENERATION_COLLECTION].find_one_and_update(
+                {"_id": subject},
+                {"$inc": {"generation": 1}, "$set": {"updated_at": datetime.utcnow()}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            self.generations[subject] = doc.get("generation", 0)
+        except Exception as e:
+            logging.warning(f"⚠️ Could not publish answer cache invalidation for '{subject}': {e}")
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {**self.stats, "entries": sum(len(v) for v in self.entries.values())}
+
+
+_ANSWER_CACHE = SemanticAnswerCache()
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    return _ANSWER_CACHE
+
+
+def invalidate_subject_answers(subject: str):
+    print(f"🧽 Invalidating cached answers for subject: {subject}")
+    _ANSWER_CACHE.invalidate(subject)
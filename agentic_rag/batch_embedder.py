@@ -0,0 +1,145 @@
+# batch_embedder.py
+
+"""
+Batched embedding helpers for the STORE pipeline.
+- Packs chunks into provider-sized batches (item + token budget)
+- Splits a batch only when the provider rejected one of its inputs (400 /
+  token limit), so chunks that already succeeded are never re-sent
+- Auth errors and 429 / 5xx left over after retries are raised immediately
+  instead of being bisected into thousands of calls
+"""
+
+import os
+import logging
+
+# ============================
+# 📐 Per-provider batch budgets
+# ============================
+# max_items  → inputs per request accepted by the provider API
+# max_tokens → total (estimated) tokens per request
+BATCH_LIMITS = {
+    "gpt": {"max_items": 512, "max_tokens": 250_000},
+    "gemini": {"max_items": 100, "max_tokens": 20_000},
+    "default": {"max_items": 64, "max_tokens": 8_000},
+}
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 chars per token), never below 1."""
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def get_batch_limits(provider: str, overrides: dict = None) -> dict:
+    """Resolve the batch budget for a provider (config overrides > env > defaults)."""
+    provider = (provider or "default").lower()
+    limits = dict(BATCH_LIMITS.get(provider, BATCH_LIMITS["default"]))
+    env_items = os.getenv("EMBED_BATCH_MAX_ITEMS")
+    env_tokens = os.getenv("EMBED_BATCH_MAX_TOKENS")
+    if env_items:
+        limits["max_items"] = int(env_items)
+    if env_tokens:
+        limits["max_tokens"] = int(env_tokens)
+    if overrides:
+        limits.update({k: int(v) for k, v in overrides.items() if k in ("max_items", "max_tokens")})
+    return limits
+
+
+def plan_batches(texts: list, provider: str = "gpt", limits: dict = None) -> list:
+    """Group text indexes into batches that respect the item and token budget."""
+    limits = limits or get_batch_limits(provider)
+    max_items = max(1, limits["max_items"])
+    max_tokens = max(1, limits["max_tokens"])
+
+    batches, current, current_tokens = [], [], 0
+    for idx, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= max_items or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(idx)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _run_round(pending: list, texts: list, embed_fn, scheduler=None) -> list:
+    """
+    Send one round of batches; concurrently through the scheduler when given.
+    Sequential rounds stop at the first error not caused by an input, so the
+    outcome list can be shorter than `pending`.
+    """
+    from agentic_rag.embedding_scheduler import is_input_error
+
+    payloads = [[texts[i] for i in batch] for batch, _ in pending]
+    if scheduler is not None:
+        return scheduler.map(embed_fn, payloads)
+
+    outcomes = []
+    for payload in payloads:
+        try:
+            outcomes.append((embed_fn(payload), None))
+        except Exception as e:
+            outcomes.append((None, e))
+            if not is_input_error(e):
+                break
+    return outcomes
+
+
+def embed_in_batches(texts: list, embed_fn, provider: str = "gpt", limits: dict = None, max_retries: int = 2, scheduler=None) -> list:
+    """
+    Embed `texts` with `embed_fn(list[str]) -> list[vector]` in batches.
+    Returns a list aligned with `texts`; entries the provider rejected (or
+    that came back empty after retries) are None. Errors that are not tied
+    to one input are re-raised.
+    """
+    from agentic_rag.embedding_scheduler import is_input_error, is_retryable
+
+    vectors = [None] * len(texts)
+    batches = plan_batches(texts, provider, limits)
+    print(f"📦 Embedding {len(texts)} chunks in {len(batches)} batch(es) | provider={provider}")
+
+    pending = [(batch, 0) for batch in batches]
+    while pending:
+        outcomes = _run_round(pending, texts, embed_fn, scheduler)
+        retry = []
+        for (batch, attempt), (result, error) in zip(pending, outcomes):
+            if error is not None:
+                logging.warning(f"⚠️ Embedding batch of {len(batch)} failed (attempt {attempt + 1}): {error}")
+                if is_input_error(error):
+                    if len(batch) > 1:
+                        # Split and retry both halves so one bad input can't sink the batch
+                        mid = len(batch) // 2
+                        retry.append((batch[:mid], attempt + 1))
+                        retry.append((batch[mid:], attempt + 1))
+                    else:
+                        print(f"❌ Embedding rejected chunk {batch[0]}: {error}")
+                        logging.error(f"❌ Provider rejected chunk {batch[0]}: {error}")
+                elif scheduler is None and is_retryable(error) and attempt < max_retries:
+                    retry.append((batch, attempt + 1))
+                else:
+                    # Not caused by one input → every other batch would fail the same way
+                    raise error
+                continue
+
+            # Keep whatever succeeded, re-queue only the missing vectors
+            missing = []
+            for pos, idx in enumerate(batch):
+                vec = result[pos] if pos < len(result) else None
+                if vec is not None and len(vec) > 0:
+                    vectors[idx] = vec
+                else:
+                    missing.append(idx)
+            if missing:
+                if attempt < max_retries:
+                    retry.append((missing, attempt + 1))
+                else:
+                    print(f"❌ Embedding failed for chunks {missing}: empty vectors returned")
+                    logging.error(f"❌ Empty embeddings for chunks {missing}")
+        pending = retry + pending[len(outcomes):]
+
+    done = sum(1 for v in vectors if v is not None)
+    print(f"✅ Batched embedding complete: {done}/{len(texts)}")
+    return vectors
@@ -0,0 +1,126 @@
+# bulk_writer.py
+
+"""
+Byte-bounded, unordered bulk inserts for chunk and log writes.
+- Documents are grouped into batches by encoded BSON size ("max_batch_bytes") and
+  count ("max_batch_docs"), well below the 16 MB document / 48 MB message limits
+- Each batch is one unordered bulk_write → one bad document doesn't abort the rest
+- Duplicate-key errors (11000, e.g. a retried write that already landed) are
+  counted as duplicates, not failures; other failed documents lose their _id so
+  callers can tell stored from unstored docs
+- Write concern is configurable ("write_concern": {"w": 1, "j": false, "wtimeout": ...})
+- Per-batch latency is logged and aggregated in get_bulk_write_stats()
+
+Configured with the "bulk_write" block in mongo_config.json (per-subject "write_concern" wins).
+"""
+
+import time
+import logging
+import threading
+
+import bson
+from bson import ObjectId
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError
+from pymongo.write_concern import WriteConcern
+
+DEFAULT_SETTINGS = {
+    "max_batch_bytes": 8 * 1024 * 1024,
+    "max_batch_docs": 1000,
+    "write_concern": None,     # None → the client's default
+}
+
+DUPLICATE_KEY_CODES = (11000, 11001)
+
+_STATS = {"batches": 0, "inserted": 0, "duplicates": 0, "failed": 0, "total_ms": 0.0, "max_ms": 0.0}
+_STATS_LOCK = threading.Lock()
+
+
+class BulkWriteFailed(Exception):
+    """Some documents could not be written (the rest of the batch was)."""
+
+    def __init__(self, report: dict):
+        self.report = report
+        first = report["errors"][0]["errmsg"] if report["errors"] else "unknown error"
+        super().__init__(f"{report['failed']} of {report['submitted']} documents failed to write: {first}")
+
+
+def get_bulk_write_settings(config: dict, subject_config: dict = None) -> dict:
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update((config or {}).get("bulk_write", {}))
+    if subject_config and "write_concern" in subject_config:
+        settings["write_concern"] = subject_config["write_concern"]
+    return settings
+
+
+class BulkWriter:
+    def __init__(self, collection, settings: dict = None):
+        self.settings = {**DEFAULT_SETTINGS, **(settings or {})}
+        write_concern = self.settings.get("write_concern")
+        self.collection = collection.with_options(write_concern=WriteConcern(**write_concern)) if write_concern else collection
+
+    def _batches(self, docs: list):
+        max_bytes, max_docs = self.settings["max_batch_bytes"], self.settings["max_batch_docs"]
+        batch, size = [], 0
+        for doc in docs:
+            doc_size = len(bson.encode(doc))
+            if batch and (size + doc_size > max_bytes or len(batch) >= max_docs):
+                yield batch, size
+                batch, size = [], 0
+            batch.append(doc)
+            size += doc_size
+        if batch:
+            yield batch, size
+
+    def insert(self, docs: list, raise_on_error: bool = True) -> dict:
+        """Insert docs in unordered batches; returns a report (raises BulkWriteFailed on non-duplicate errors)."""
+        report = {"submitted": len(docs), "inserted": 0, "duplicates": 0, "failed": 0,
+                  "batches": [], "errors": []}
+        for doc in docs:
+            doc.setdefault("_id", ObjectId())   # known before the write → callers can link refs
+
+        offset = 0
+        for batch, size in self._batches(docs):
+            started = time.perf_counter()
+            inserted, duplicates, errors = len(batch), 0, []
+            try:
+                self.collection.bulk_write([InsertOne(doc) for doc in batch], ordered=False)
+            except BulkWriteError as e:
+                inserted = e.details.get("nInserted", 0)
+                for err in e.details.get("writeErrors", []):
+                    if err.get("code") in DUPLICATE_KEY_CODES:
+                        duplicates += 1
+                    else:
+                        batch[err["index"]].pop("_id", None)
+                        # Index into `docs` (not the batch) → callers can map errors back to their docs
+                        errors.append({"index": offset + err["index"], "code": err.get("code"), "errmsg": err.get("errmsg")})
+                for err in e.details.get("writeConcernErrors", []):
+                    logging.warning(f"⚠️ Write concern not satisfied on {self.collection.name}: {err.get('errmsg')}")
+            latency_ms = (time.perf_counter() - started) * 1000
+            offset += len(batch)
+
+            report["inserted"] += inserted
+            report["duplicates"] += duplicates
+            report["failed"] += len(errors)
+            report["errors"].extend(errors)
+            report["batches"].append({"docs": len(batch), "bytes": size, "latency_ms": round(latency_ms, 2)})
+            with _STATS_LOCK:
+                _STATS["batches"] += 1
+                _STATS["inserted"] += inserted
+                _STATS["duplicates"] += duplicates
+                _STATS["failed"] += len(errors)
+                _STATS["total_ms"] += latency_ms
+                _STATS["max_ms"] = max(_STATS["max_ms"], latency_ms)
+            logging.info(f"📦 Bulk batch → {self.collection.name}: {len(batch)} docs | {size / 1024:.0f} KB | "
+                         f"{latency_ms:.1f} ms | dup={duplicates} failed={len(errors)}")
+
+        if report["failed"] and raise_on_error:
+            raise BulkWriteFailed(report)
+        return report
+
+
+def get_bulk_write_stats() -> dict:
+    with _STATS_LOCK:
+        stats = dict(_STATS)
+    stats["avg_ms"] = round(stats["total_ms"] / stats["batches"], 2) if stats["batches"] else 0.0
+    return stats
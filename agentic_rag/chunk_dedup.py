@@ -0,0 +1,162 @@
+# chunk_dedup.py
+
+"""
+Cross-file exact chunk deduplication at store time.
+- Before embedding a window, its chunk hashes are looked up with one
+  $in query on metadata.chunk_hash (indexed)
+- Known chunks are neither embedded nor inserted; a reference doc is
+  written to <collection_name>_refs instead (file, user, chunk_index → chunk _id)
+- Lookups are scoped to the same subject, user_id, embedding model and vector
+  dimension (dedup_scope): retrieval filters on user_id and never resolves references,
+  and a vector from another model / dimension can't stand in for this one. The
+  dimension is what the embedder actually returns (probed once per model), the same
+  value embed_chunks stores in metadata.dims. Chunks stored before metadata.embedding_model /
+  metadata.dims were written never match
+- Repeats inside the same window are embedded once and referenced
+- When a referenced chunk's own file drops it, ownership passes to one of
+  its references instead of deleting the vector (release_chunks)
+
+Enabled with "dedup_chunks": true (global or per subject) in mongo_config.json (off by default).
+"""
+
+import logging
+import threading
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING
+
+from agentic_rag.mongo_utils import get_mongo_client
+
+REF_OWNER_FIELDS = ["source_file", "file_hash", "user_id", "chunk_index", "upload_time", "upload_ts"]
+
+_INDEXED = set()
+_INDEXED_LOCK = threading.Lock()
+_DIMS = {}
+_DIMS_LOCK = threading.Lock()
+
+
+def is_chunk_dedup_enabled(config: dict, subject_config: dict) -> bool:
+    return bool((subject_config or {}).get("dedup_chunks", (config or {}).get("dedup_chunks", False)))
+
+
+def embedding_model_key(provider: str, model_name: str) -> str:
+    """Value stored in metadata.embedding_model ("provider:model")."""
+    return f"{provider}:{model_name}"
+
+
+def get_embedding_dims(embedding_fn, embedding_model: str) -> int:
+    """Output size of the embedder (one probe call per model and process; custom models / sizes included)."""
+    with _DIMS_LOCK:
+        if embedding_model not in _DIMS:
+            _DIMS[embedding_model] = len(embedding_fn("dimension probe"))
+        return _DIMS[embedding_model]
+
+
+def dedup_scope(subject: str, metadata: dict, embedding_model: str, dims: int) -> dict:
+    """Filter restricting dedup candidates to vectors this user can retrieve, from the same model and size."""
+    return {"subject": subject, "user_id": metadata.get("user_id"),
+            "metadata.embedding_model": embedding_model, "metadata.dims": dims}
+
+
+def get_chunk_collections(config: dict, subject: str):
+    """(chunk collection, reference collection) for a subject."""
+    db_config = config.get(subject, config["default"])
+    db = get_mongo_client()[db_config["db_name"]]
+    collection = db[db_config["collection_name"]]
+    refs = db[db_config.get("refs_collection_name", db_config["collection_name"] + "_refs")]
+    _ensure_indexes(collection, refs)
+    return collection, refs
+
+
+def _ensure_indexes(collection, refs):
+    key = (collection.database.name, collection.name)
+    with _INDEXED_LOCK:
+        if key in _INDEXED:
+            return
+        try:
+            collection.create_index([("metadata.chunk_hash", ASCENDING)], name="chunk_hash_1")
+            refs.create_index([("chunk_id", ASCENDING)], name="chunk_id_1")
+            refs.create_index([("source_file", ASCENDING), ("user_id", ASCENDING)], name="source_file_user_1")
+            refs.create_index([("file_hash", ASCENDING), ("chunk_index", ASCENDING)], name="file_hash_chunk_index_1")
+        except Exception as e:
+            logging.warning(f"⚠️ Could not ensure chunk dedup indexes on {collection.name}: {e}")
+        _INDEXED.add(key)
+
+
+class ExactChunkDedup:
+    """Per-file helper: split() before embedding, commit() after the window is stored."""
+
+    def __init__(self, config: dict, subject: str, metadata: dict, scope: dict):
+        self.collection, self.refs = get_chunk_collections(config, subject)
+        self.metadata = metadata
+        self.subject = subject
+        self.scope = scope         # see dedup_scope
+        self.pending = []          # (chunk_hash, chunk_index, chunk_id or None → resolved at commit)
+        self.deduped = 0
+
+    def split(self, chunks: list, indices: list, hashes: list) -> (list, list):
+        """Drop chunks whose hash is already stored (or repeated in this window); return the rest."""
+        known = {}
+        for doc in self.collection.find({"metadata.chunk_hash": {"$in": list(set(hashes))}, **self.scope},
+                                        {"metadata.chunk_hash": 1}):
+            known.setdefault(doc["metadata"]["chunk_hash"], doc["_id"])
+
+        fresh, fresh_indices, seen = [], [], set()
+        for chunk, idx, chunk_hash in zip(chunks, indices, hashes):
+            if chunk_hash in known:
+                self.pending.append((chunk_hash, idx, known[chunk_hash]))
+            elif chunk_hash in seen:
+                self.pending.append((chunk_hash, idx, None))
+            else:
+                seen.add(chunk_hash)
+                fresh.append(chunk)
+                fresh_indices.append(idx)
+        if self.pending:
+            print(f"♻️ {len(self.pending)} duplicate chunks → referenced, not embedded")
+        return fresh, fresh_indices
+
+    def commit(self, stored_docs: list) -> int:
+        """Write reference docs for the last split (call after the fresh chunks are inserted)."""
+        inserted = {doc["metadata"]["chunk_hash"]: doc["_id"] for doc in stored_docs if "_id" in doc}
+        now = datetime.now(timezone.utc)
+        refs = []
+        for chunk_hash, idx, chunk_id in self.pending:
+            chunk_id = chunk_id or inserted.get(chunk_hash)
+            if chunk_id is None:
+                continue  # its first occurrence failed to embed
+            refs.append({
+                "chunk_id": chunk_id,
+                "chunk_hash": chunk_hash,
+                "subject": self.subject,
+                "source_file": self.metadata.get("file_name"),
+                "file_hash": self.metadata.get("file_hash"),
+                "user_id": self.metadata.get("user_id"),
+                "chunk_index": idx,
+                "upload_time": now.isoformat(),
+                "upload_ts": now.timestamp(),
+            })
+        if refs:
+            self.refs.insert_many(refs)
+        self.pending = []
+        self.deduped += len(refs)
+        return len(refs)
+
+
+def release_chunks(collection, refs, chunk_ids: list) -> dict:
+    """
+    A file no longer contains these chunks. Chunks still referenced by other
+    files are handed over to one reference (ownership fields copied, ref removed);
+    unreferenced chunks are deleted.
+    """
+    handed_over = 0
+    referenced = set()
+    for ref in refs.find({"chunk_id": {"$in": chunk_ids}}).sort("upload_ts", ASCENDING):
+        if ref["chunk_id"] in referenced:
+            continue
+        referenced.add(ref["chunk_id"])
+        collection.update_one({"_id": ref["chunk_id"]}, {"$set": {f: ref.get(f) for f in REF_OWNER_FIELDS}})
+        refs.delete_one({"_id": ref["_id"]})
+        handed_over += 1
+    orphaned = [cid for cid in chunk_ids if cid not in referenced]
+    deleted = collection.delete_many({"_id": {"$in": orphaned}}).deleted_count if orphaned else 0
+    return {"handed_over": handed_over, "deleted": deleted}
@@ -0,0 +1,222 @@
+# chunkers.py
+
+"""
+Chunking strategies for the STORE pipeline (all incremental over text segments).
+- "fixed" → fixed-offset windows with overlap (original chunk_text behaviour)
+- "cdc"   → content-defined chunking: a gear rolling hash picks boundaries from the
+            text itself, so an edit only changes the chunks around it and every
+            other chunk keeps its hash (cheap re-ingestion of edited files)
+- "tokens"→ sentence/paragraph-aware packing up to a token budget ("chunk_tokens")
+            with token overlap ("chunk_overlap_tokens"), counted with the provider's
+            tokenizer (tiktoken for gpt; ~4 chars/token estimate otherwise).
+            Text without sentence ends (tables, CSV) is cut at newlines / whitespace
+            every ~chunk_tokens worth of chars, so tokenizing stays linear
+
+Strategy is set with "chunk_strategy" (global or per subject) in mongo_config.json;
+the shipped default is "fixed", "cdc" is opt-in (example in STORE_DOC.md).
+Subjects in update mode should stay on "cdc": token packing re-flows every chunk
+after an edit, so update mode would re-embed most of the file.
+"""
+
+import os
+import re
+import math
+import random
+import logging
+from functools import lru_cache
+
+CHUNK_STRATEGIES = ("fixed", "cdc", "tokens")
+
+# 📏 Embedding model input limits (tokens) → chunk_tokens is clamped to these
+MAX_INPUT_TOKENS = {"gpt": 8191, "gemini": 2048, "default": 512}
+CHARS_PER_TOKEN = 4
+
+_SENTENCE_END = re.compile(r"(?<=[.!?;:])\s+|\n{2,}")
+
+# 🎲 Fixed seed → boundaries are stable across processes and releases
+_GEAR = [random.Random(20240607 + i).getrandbits(64) for i in range(256)]
+_MASK64 = (1 << 64) - 1
+
+
+def get_chunking_settings(config: dict, subject_config: dict) -> dict:
+    """Subject settings > global settings > defaults."""
+    config, subject_config = config or {}, subject_config or {}
+
+    def pick(key, default):
+        return subject_config.get(key, config.get(key, default))
+
+    chunk_size = pick("chunk_size", 500)
+    strategy = pick("chunk_strategy", "fixed").lower()
+    if strategy not in CHUNK_STRATEGIES:
+        raise ValueError(f"Unsupported chunk_strategy '{strategy}' (expected one of {CHUNK_STRATEGIES})")
+    if strategy != "cdc" and pick("store_mode", "insert").lower() == "update":
+        logging.warning(f"⚠️ chunk_strategy '{strategy}' with store_mode 'update' → an edit shifts every later "
+                        f"chunk and most of the file is re-embedded (use 'cdc')")
+    if strategy == "tokens":
+        provider = os.getenv("EMBEDDING_PROVIDER", "gpt").lower()
+        budget = min(pick("chunk_tokens", 256), MAX_INPUT_TOKENS.get(provider, MAX_INPUT_TOKENS["default"]))
+        return {
+            "strategy": strategy,
+            "provider": provider,
+            "chunk_size": budget,                  # tokens (see "unit")
+            "chunk_overlap": min(pick("chunk_overlap_tokens", 0), budget // 2),
+            "unit": "tokens",
+        }
+    return {
+        "strategy": strategy,
+        "chunk_size": chunk_size,
+        "chunk_overlap": pick("chunk_overlap", 100) if strategy == "fixed" else 0,
+        "min_size": pick("cdc_min_size", chunk_size // 4),
+        "max_size": pick("cdc_max_size", chunk_size * 2),
+        "unit": "chars",
+    }
+
+
+def iter_chunks(segments, chunk_size: int = 500, overlap: int = 100):
+    """
+    Incremental version of chunk_text: same windows over the concatenated
+    segments, but only ~one chunk of text is buffered at a time.
+    """
+    step = chunk_size - overlap
+    if step <= 0:
+        raise ValueError("chunk_overlap must be smaller than chunk_size")
+    buffer = ""
+    for segment in segments:
+        buffer += segment
+        while len(buffer) >= chunk_size:
+            yield buffer[:chunk_size]
+            buffer = buffer[step:]
+    i = 0
+    while i < len(buffer):
+        yield buffer[i:i + chunk_size]
+        i += step
+
+
+def iter_cdc_chunks(segments, avg_size: int = 500, min_size: int = 125, max_size: int = 1000):
+    """
+    Content-defined chunks: cut where the gear hash of the last ~64 chars has
+    its high bits all zero (expected length ≈ avg_size), bounded by min/max size.
+    The hash shifts left per char, so only the high bits depend on the whole
+    64-char window (FastCDC); low bits only see the last few chars and never
+    fire on repetitive text such as tables.
+    """
+    if not 0 < min_size < avg_size <= max_size:
+        raise ValueError("CDC sizes must satisfy 0 < min_size < avg_size <= max_size")
+    bits = max(1, round(math.log2(avg_size - min_size)))
+    mask = ((1 << bits) - 1) << (64 - bits)
+    gear = _GEAR
+    current, h = [], 0
+    for segment in segments:
+        for ch in segment:
+            current.append(ch)
+            h = ((h << 1) + gear[ord(ch) & 0xFF]) & _MASK64
+            size = len(current)
+            if size >= max_size or (size >= min_size and not (h & mask)):
+                yield "".join(current)
+                current, h = [], 0
+    if current:
+        yield "".join(current)
+
+
+# ============================
+# 🔤 Token-aware packing
+# ============================
+@lru_cache(maxsize=None)
+def get_tokenizer(provider: str):
+    """(encode, decode) for the provider; cached so the BPE tables load once per process."""
+    if provider == "gpt":
+        try:
+            import tiktoken
+            enc = tiktoken.get_encoding("cl100k_base")  # text-embedding-3-* / ada-002
+            return enc.encode, enc.decode
+        except ImportError:
+            pass
+    # No local tokenizer (gemini) or tiktoken missing → ~4 chars per token
+    return (lambda text: range(max(1, len(text) // CHARS_PER_TOKEN)) if text else range(0)), None
+
+
+def count_tokens(text: str, provider: str) -> int:
+    return len(get_tokenizer(provider)[0](text))
+
+
+def _split_oversized(unit: str, budget: int, provider: str) -> list:
+    """A single sentence above the budget → cut on token (or char) positions."""
+    encode, decode = get_tokenizer(provider)
+    if decode is None:
+        step = budget * CHARS_PER_TOKEN
+        return [unit[i:i + step] for i in range(0, len(unit), step)]
+    tokens = encode(unit)
+    return [decode(tokens[i:i + budget]) for i in range(0, len(tokens), budget)]
+
+
+def _split_long(text: str, max_chars: int):
+    """Yield leading pieces of <= max_chars (cut after a newline, else whitespace, else hard); return the rest."""
+    pos = 0
+    while max_chars and len(text) - pos > max_chars:
+        window = text[pos:pos + max_chars]
+        cut = window.rfind("\n") + 1
+        if cut <= max_chars // 2:
+            cut = max(window.rfind(" "), window.rfind("\t")) + 1
+        if cut <= max_chars // 2:
+            cut = max_chars
+        yield window[:cut]
+        pos += cut
+    return text[pos:]
+
+
+def _iter_sentences(segments, max_chars: int = None):
+    """
+    Sentences / paragraphs (with their trailing whitespace) across segment borders.
+    With max_chars, no piece is longer: text without sentence ends (tables, CSV)
+    falls back to line / word cuts as it streams instead of piling up in the buffer.
+    """
+    buffer = ""
+    for segment in segments:
+        buffer += segment
+        last = 0
+        for match in _SENTENCE_END.finditer(buffer):
+            rest = yield from _split_long(buffer[last:match.end()], max_chars)
+            if rest:
+                yield rest
+            last = match.end()
+        buffer = yield from _split_long(buffer[last:], max_chars)
+    if buffer:
+        yield buffer
+
+
+def iter_token_chunks(segments, budget: int = 256, overlap: int = 0, provider: str = "gpt"):
+    """
+    Greedily pack whole sentences up to `budget` tokens; the next chunk starts
+    with trailing sentences worth <= `overlap` tokens. A paragraph break closes
+    the chunk early once it is at least 75% full.
+    """
+    current, sizes, used = [], [], 0
+    for sentence in _iter_sentences(segments, budget * CHARS_PER_TOKEN):
+        n = count_tokens(sentence, provider)
+        units = [(sentence, n)] if n <= budget else [(u, count_tokens(u, provider)) for u in _split_oversized(sentence, budget, provider)]
+        for unit, n in units:
+            if current and used + n > budget:
+                yield "".join(current)
+                # ↩️ Carry whole trailing sentences as token overlap
+                keep, kept = 0, 0
+                while keep < len(sizes) and kept + sizes[-1 - keep] <= overlap and kept + sizes[-1 - keep] + n <= budget:
+                    kept += sizes[-1 - keep]
+                    keep += 1
+                current, sizes, used = current[len(current) - keep:], sizes[len(sizes) - keep:], kept
+            current.append(unit)
+            sizes.append(n)
+            used += n
+            if used >= budget * 0.75 and unit.endswith("\n\n"):
+                yield "".join(current)
+                current, sizes, used = [], [], 0
+    if current:
+        yield "".join(current)
+
+
+def make_chunk_iter(segments, settings: dict):
+    """Chunk iterator for the configured strategy (see get_chunking_settings)."""
+    if settings["strategy"] == "tokens":
+        return iter_token_chunks(segments, settings["chunk_size"], settings["chunk_overlap"], settings["provider"])
+    if settings["strategy"] == "cdc":
+        return iter_cdc_chunks(segments, settings["chunk_size"], settings["min_size"], settings["max_size"])
+    return iter_chunks(segments, settings["chunk_size"], settings["chunk_overlap"])
@@ -0,0 +1,146 @@
+# dedup_filter.py
+
+"""
+Fast duplicate-upload detection for the STORE pipeline.
+- Unique index on store_logs.file_hash (falls back to a plain index if old
+  duplicate log rows exist) → the confirming lookup is an index probe
+- In-process Bloom filter of every logged file_hash, warmed from store_logs
+  and topped up incrementally → "definitely new" answers need no per-file round trip
+- Top-ups re-read every log row with logged_at >= last sync - lookback: ObjectIds
+  are generated client-side (not ordered across processes) and a log row can land
+  after later ones, so "_id > last seen" would skip hashes; re-adding a hash is harmless
+- A Bloom "maybe" is always confirmed against Mongo (no false duplicates)
+
+Env: DEDUP_BLOOM_CAPACITY (default 1,000,000), DEDUP_BLOOM_ERROR_RATE (0.001),
+DEDUP_SYNC_SECONDS (how often new hashes from other processes are pulled, default 5),
+DEDUP_SYNC_LOOKBACK_SECONDS (overlap between top-ups for late / clock-skewed writes, default 300).
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import OperationFailure, DuplicateKeyError
+
+from agentic_rag.mongo_utils import get_mongo_client
+
+BLOOM_CAPACITY = int(os.getenv("DEDUP_BLOOM_CAPACITY", "1000000"))
+BLOOM_ERROR_RATE = float(os.getenv("DEDUP_BLOOM_ERROR_RATE", "0.001"))
+SYNC_SECONDS = float(os.getenv("DEDUP_SYNC_SECONDS", "5"))
+SYNC_LOOKBACK_SECONDS = float(os.getenv("DEDUP_SYNC_LOOKBACK_SECONDS", "300"))
+
+
+class BloomFilter:
+    """Bit-array Bloom filter keyed by hex digests (k indices by double hashing)."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, hex_digest: str):
+        value = int(hex_digest, 16)
+        h1, h2 = value & 0xFFFFFFFFFFFFFFFF, (value >> 64) | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, hex_digest: str):
+        for pos in self._positions(hex_digest):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, hex_digest: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(hex_digest))
+
+
+class UploadDedupIndex:
+    def __init__(self, log_config: dict):
+        self.collection = get_mongo_client()[log_config["db_name"]][log_config["store_logs"]]
+        self.bloom = None
+        self.synced_wall = None    # UTC time the last warm / top-up started (compared with logged_at)
+        self.synced_at = 0.0
+        self.lock = threading.Lock()         # guards the Bloom filter
+        self.sync_lock = threading.Lock()    # one top-up at a time, never under self.lock
+        self.stats = {"bloom_negative": 0, "db_checks": 0, "duplicates": 0}
+
+    def ensure_index(self):
+        try:
+            self.collection.create_index("file_hash", unique=True, name="file_hash_unique")
+        except (OperationFailure, DuplicateKeyError) as e:
+            # Old logs may already hold duplicate hashes → still index the lookup
+            logging.warning(f"⚠️ Unique file_hash index not created ({e}); using a non-unique index")
+            self.collection.create_index("file_hash", name="file_hash_1")
+
+    def warm(self):
+        """Full load of logged hashes (startup, or when the filter outgrows its capacity)."""
+        start = time.perf_counter()
+        started_wall = datetime.now(timezone.utc)
+        capacity = BLOOM_CAPACITY
+        total = self.collection.estimated_document_count()
+        while capacity < total * 2:
+            capacity *= 2
+        bloom = BloomFilter(capacity, BLOOM_ERROR_RATE)
+        for doc in self.collection.find({"file_hash": {"$exists": True}}, {"file_hash": 1}):
+            bloom.add(doc["file_hash"])
+        with self.lock:
+            self.bloom, self.synced_wall, self.synced_at = bloom, started_wall, time.monotonic()
+        print(f"[DEDUP] Bloom filter warmed with {bloom.count} hashes | "
+              f"{len(bloom.bits) / 1e6:.1f} MB | {time.perf_counter() - start:.2f}s")
+
+    def _sync(self):
+        """Pull hashes logged since the last sync (other workers / processes), with a lookback overlap."""
+        if time.monotonic() - self.synced_at < SYNC_SECONDS or not self.sync_lock.acquire(blocking=False):
+            return
+        try:
+            started_wall = datetime.now(timezone.utc)
+            since = self.synced_wall - timedelta(seconds=SYNC_LOOKBACK_SECONDS)
+            hashes = [doc["file_hash"] for doc in self.collection.find({"logged_at": {"$gte": since}}, {"file_hash": 1})
+                      if doc.get("file_hash")]
+            with self.lock:
+                for file_hash in hashes:
+                    self.bloom.add(file_hash)
+                self.synced_wall, self.synced_at = started_wall, time.monotonic()
+                outgrown = self.bloom.count > self.bloom.capacity
+            if outgrown:
+                self.warm()
+        finally:
+            self.sync_lock.release()
+
+    def is_duplicate(self, file_hash: str) -> bool:
+        self._sync()
+        with self.lock:
+            maybe = file_hash in self.bloom
+        if not maybe:
+            self.stats["bloom_negative"] += 1
+            return False
+        self.stats["db_checks"] += 1
+        found = self.collection.find_one({"file_hash": file_hash}, {"_id": 1}) is not None
+        self.stats["duplicates"] += int(found)
+        return found
+
+    def add(self, file_hash: str):
+        with self.lock:
+            self.bloom.add(file_hash)
+
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_dedup_index(log_config: dict) -> UploadDedupIndex:
+    """Per-process index for this store_logs collection (index ensured + filter warmed on first use)."""
+    key = (log_config["db_name"], log_config["store_logs"])
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+    if index is not None:
+        return index
+    # Warm outside the registry lock → other collections / callers aren't blocked by the scan
+    index = UploadDedupIndex(log_config)
+    index.ensure_index()
+    index.warm()
+    with _INDEXES_LOCK:
+        return _INDEXES.setdefault(key, index)
@@ -0,0 +1,224 @@
+# dim_reduction.py
+
+"""
+Optional per-subject dimensionality reduction of stored embeddings.
+- "none"     → store the model's full vectors (default)
+- "truncate" → keep the first `dims` components and re-normalize (Matryoshka-style;
+               only meaningful for models trained for it, e.g. text-embedding-3-*)
+- "pca"      → project onto the top `dims` principal components of a sample of the
+               collection; the projection is fitted offline (`fit`) and saved next to
+               the other caches, then applied identically at store and query time
+
+Configured per subject in mongo_config.json: "dim_reduction": {"method": "pca", "dims": 384}.
+Vectors already at (or below) `dims` pass through unchanged, so re-stored or migrated
+chunks are never reduced twice. The Atlas index numDimensions must equal `dims`.
+
+CLI:
+  python -m agentic_rag.dim_reduction fit <subject> [sample_size]   → fit + save the PCA projection
+  python -m agentic_rag.dim_reduction migrate <subject>             → reduce already-stored full vectors
+"""
+
+import os
+import sys
+import logging
+import threading
+
+import numpy as np
+
+DIM_REDUCTION_METHODS = ("none", "truncate", "pca")
+PROJECTION_DIR = os.path.join(os.path.dirname(__file__), ".cache", "projections")
+DEFAULT_SAMPLE_SIZE = 5000
+
+
+def get_dim_reduction(subject_config: dict) -> dict:
+    settings = {"method": "none", "dims": None}
+    settings.update((subject_config or {}).get("dim_reduction") or {})
+    settings["method"] = settings["method"].lower()
+    if settings["method"] not in DIM_REDUCTION_METHODS:
+        raise ValueError(f"Unsupported dim_reduction method '{settings['method']}' (expected one of {DIM_REDUCTION_METHODS})")
+    if settings["method"] != "none" and not settings.get("dims"):
+        raise ValueError("dim_reduction needs a positive 'dims' when method is not 'none'")
+    return settings
+
+
+def projection_path(subject_config: dict, dims: int) -> str:
+    name = f"{subject_config['db_name']}.{subject_config['collection_name']}.pca{dims}.npz"
+    return (subject_config.get("dim_reduction") or {}).get("projection_path") or os.path.join(PROJECTION_DIR, name)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+# ============================
+# 📉 Reducers
+# ============================
+class TruncateReducer:
+    def __init__(self, dims: int):
+        self.dims = dims
+
+    def reduce(self, matrix: np.ndarray) -> np.ndarray:
+        return _normalize(matrix[:, :self.dims])
+
+
+class PCAReducer:
+    """Centered projection: (x - mean) @ components.T, re-normalized for cosine search."""
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray, explained: float = None):
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)   # (dims, source_dims)
+        self.dims, self.source_dims = self.components.shape
+        self.explained = explained
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, dims: int) -> "PCAReducer":
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        if dims >= vectors.shape[1]:
+            raise ValueError(f"dims={dims} must be smaller than the source dimension {vectors.shape[1]}")
+        if len(vectors) < dims:
+            raise ValueError(f"Need at least {dims} sample vectors to fit {dims} components (got {len(vectors)})")
+        mean = vectors.mean(axis=0)
+        _, singular, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        variance = singular ** 2
+        return cls(mean, vt[:dims], float(variance[:dims].sum() / variance.sum()))
+
+    def reduce(self, matrix: np.ndarray) -> np.ndarray:
+        if matrix.shape[1] != self.source_dims:
+            raise ValueError(f"PCA projection expects {self.source_dims}-dim vectors, got {matrix.shape[1]}")
+        return _normalize((_normalize(matrix) - self.mean) @ self.components.T)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, mean=self.mean, components=self.components, explained=self.explained)
+
+    @classmethod
+    def load(cls, path: str) -> "PCAReducer":
+        data = np.load(path)
+        return cls(data["mean"], data["components"], float(data["explained"]))
+
+
+_REDUCERS = {}
+_REDUCERS_LOCK = threading.Lock()
+
+
+def get_reducer(subject_config: dict):
+    """Cached reducer for the subject, or None when dim_reduction is off."""
+    settings = get_dim_reduction(subject_config)
+    if settings["method"] == "none":
+        return None
+    dims = settings["dims"]
+    if settings["method"] == "truncate":
+        key = ("truncate", dims)
+    else:
+        path = projection_path(subject_config, dims)
+        if not os.path.exists(path):
+            raise RuntimeError(f"❌ PCA projection {path} not found. "
+                               f"Fit it first: python -m agentic_rag.dim_reduction fit <subject>")
+        key = ("pca", path, os.path.getmtime(path))
+    with _REDUCERS_LOCK:
+        reducer = _REDUCERS.get(key)
+        if reducer is None:
+            reducer = TruncateReducer(dims) if key[0] == "truncate" else PCAReducer.load(key[1])
+            _REDUCERS[key] = reducer
+        return reducer
+
+
+def reduce_vectors(vectors: list, reducer) -> list:
+    """Reduce a batch of vectors (lists); vectors already at the target size are kept as-is."""
+    if reducer is None or not vectors:
+        return vectors
+    out = list(vectors)
+    todo = [i for i, v in enumerate(vectors) if len(v) > reducer.dims]
+    by_dim = {}
+    for i in todo:
+        by_dim.setdefault(len(vectors[i]), []).append(i)
+    for rows in by_dim.values():
+        reduced = reducer.reduce(np.asarray([vectors[i] for i in rows], dtype=np.float32))
+        for i, vector in zip(rows, reduced):
+            out[i] = vector.tolist()
+    return out
+
+
+def reduce_vector(vector: list, reducer) -> list:
+    return reduce_vectors([vector], reducer)[0]
+
+
+# ============================
+# 🛠️ Offline fit / migration
+# ============================
+def sample_vectors(collection, sample_size: int = DEFAULT_SAMPLE_SIZE) -> np.ndarray:
+    """Random sample of stored full-size vectors (the most common dimension, i.e. one provider)."""
+    from agentic_rag.vector_codec import decode_vector
+
+    vectors = []
+    for doc in collection.aggregate([{"$match": {"embedding": {"$exists": True}}},
+                                     {"$sample": {"size": sample_size}},
+                                     {"$project": {"embedding": 1}}]):
+        vector = decode_vector(doc["embedding"])
+        if vector:
+            vectors.append(vector)
+    if not vectors:
+        raise RuntimeError("No stored embeddings to fit on")
+    dims = np.bincount([len(v) for v in vectors]).argmax()
+    return np.asarray([v for v in vectors if len(v) == dims], dtype=np.float32)
+
+
+def fit_projection(collection, subject_config: dict, sample_size: int = DEFAULT_SAMPLE_SIZE) -> PCAReducer:
+    dims = get_dim_reduction(subject_config)["dims"]
+    sample = sample_vectors(collection, sample_size)
+    reducer = PCAReducer.fit(sample, dims)
+    path = projection_path(subject_config, dims)
+    reducer.save(path)
+    print(f"📉 PCA {reducer.source_dims}→{dims} fitted on {len(sample)} vectors "
+          f"| explained variance {reducer.explained:.1%} | saved to {path}")
+    return reducer
+
+
+def migrate_collection(collection, subject_config: dict, batch_size: int = 500) -> int:
+    """Rewrite stored vectors that are still larger than the target dimension."""
+    from pymongo import UpdateOne
+    from agentic_rag.vector_codec import decode_vector, encode_vector, get_vector_encoding
+
+    reducer = get_reducer(subject_config)
+    if reducer is None:
+        return 0
+    encoding = get_vector_encoding(subject_config)
+    ops, done = [], 0
+    for doc in collection.find({"embedding": {"$exists": True}}, {"embedding": 1}):
+        vector = decode_vector(doc["embedding"])
+        if not vector or len(vector) <= reducer.dims:
+            continue
+        if encoding == "bit":
+            logging.warning("⚠️ Bit-packed vectors can't be reduced meaningfully; re-store the files instead")
+            return done
+        ops.append(UpdateOne({"_id": doc["_id"]},
+                             {"$set": {"embedding": encode_vector(reduce_vector(vector, reducer), encoding)}}))
+        if len(ops) >= batch_size:
+            collection.bulk_write(ops, ordered=False)
+            done, ops = done + len(ops), []
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+        done += len(ops)
+    return done
+
+
+if __name__ == "__main__":
+    from agentic_rag.mongo_utils import get_mongo_client, load_mongo_config
+
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] not in ("fit", "migrate"):
+        print("Usage: python -m agentic_rag.dim_reduction fit|migrate <subject> [sample_size]")
+        sys.exit(1)
+    os.environ.setdefault("MONGO_CONFIG_PATH", os.path.join(os.path.dirname(__file__), "mongo_config.json"))
+    config = load_mongo_config()
+    subject_config = config.get(args[1], config["default"])
+    collection = get_mongo_client()[subject_config["db_name"]][subject_config["collection_name"]]
+    if args[0] == "fit":
+        if get_dim_reduction(subject_config)["method"] != "pca":
+            print(f"⚠️ Subject '{args[1]}' is not configured with dim_reduction method 'pca'")
+            sys.exit(1)
+        fit_projection(collection, subject_config, int(args[2]) if len(args) > 2 else DEFAULT_SAMPLE_SIZE)
+    else:
+        print(f"✅ Reduced {migrate_collection(collection, subject_config)} stored vectors")
@@ -0,0 +1,163 @@
+# embedding_cache.py
+
+"""
+Content-addressed, on-disk embedding cache (SQLite).
+- Key: (provider, model, chunk_hash) → float32 vector
+- Size-bounded with LRU eviction (last_access timestamp)
+- Hit / miss / write / eviction counters for tracing
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from array import array
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), ".cache", "embeddings.sqlite")
+
+
+def text_hash(text: str) -> str:
+    """Same MD5 scheme as store_pipeline.generate_chunk_hash."""
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def _pack(vector) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> list:
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = None, max_bytes: int = None):
+        self.path = path or os.getenv("EMBED_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.max_bytes = max_bytes or int(float(os.getenv("EMBED_CACHE_MAX_MB", "512")) * 1024 * 1024)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")  # ✅ safe to share across worker processes
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                chunk_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (provider, model, chunk_hash)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+        self.conn.commit()
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def get_many(self, provider: str, model: str, hashes: list) -> dict:
+        """Return {chunk_hash: vector} for every cached hash and touch their LRU stamp."""
+        unique = list(dict.fromkeys(hashes))
+        found = {}
+        with self.lock:
+            for start in range(0, len(unique), 500):  # stay under SQLite's variable limit
+                part = unique[start:start + 500]
+                marks = ",".join("?" * len(part))
+                rows = self.conn.execute(
+                    f"SELECT chunk_hash, vector FROM embeddings WHERE provider=? AND model=? AND chunk_hash IN ({marks})",
+                    [provider, model, *part]
+                ).fetchall()
+                found.update({h: _unpack(blob) for h, blob in rows})
+            if found:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_access=? WHERE provider=? AND model=? AND chunk_hash=?",
+                    [(now, provider, model, h) for h in found]
+                )
+                self.conn.commit()
+            self.stats["hits"] += len(found)
+            self.stats["misses"] += len(unique) - len(found)
+        return found
+
+    def put_many(self, provider: str, model: str, items: dict):
+        """Store {chunk_hash: vector}; evicts least-recently-used rows past max_bytes."""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for h, vector in items.items():
+            blob = _pack(vector)
+            rows.append((provider, model, h, blob, len(blob), now))
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (provider, model, chunk_hash, vector, size_bytes, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self.stats["writes"] += len(rows)
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM embeddings").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)  # evict down to 90% so we don't evict on every write
+        evicted = 0
+        cursor = self.conn.execute("SELECT provider, model, chunk_hash, size_bytes FROM embeddings ORDER BY last_access ASC")
+        doomed = []
+        for provider, model, h, size in cursor:
+            if total <= target:
+                break
+            doomed.append((provider, model, h))
+            total -= size
+            evicted += 1
+        self.conn.executemany("DELETE FROM embeddings WHERE provider=? AND model=? AND chunk_hash=?", doomed)
+        self.stats["evictions"] += evicted
+        logging.info(f"🧹 Embedding cache evicted {evicted} entries")
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM embeddings").fetchone()
+            return {**self.stats, "entries": entries, "size_bytes": size, "max_bytes": self.max_bytes}
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_embedding_cache():
+    """Process-wide cache instance, or None when EMBED_CACHE_ENABLED=false."""
+    global _CACHE
+    if os.getenv("EMBED_CACHE_ENABLED", "true").lower() != "true":
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = EmbeddingCache()
+        return _CACHE
+
+
+def embed_with_cache(texts: list, hashes: list, embed_fn, cache, provider: str, model: str) -> list:
+    """
+    Resolve vectors for `texts` from the cache, embedding only the misses
+    (each distinct hash is sent to the provider once).
+    """
+    if cache is None:
+        return embed_fn(texts)
+
+    cached = cache.get_many(provider, model, hashes)
+    miss_positions = {}
+    for i, h in enumerate(hashes):
+        if h not in cached and h not in miss_positions:
+            miss_positions[h] = i
+    hits = sum(1 for h in hashes if h in cached)
+    print(f"🗃️ Embedding cache: {hits}/{len(hashes)} hit(s), {len(miss_positions)} unique chunk(s) to embed")
+
+    if miss_positions:
+        new_vectors = embed_fn([texts[i] for i in miss_positions.values()])
+        fresh = dict(zip(miss_positions.keys(), new_vectors))
+        cache.put_many(provider, model, fresh)
+        cached.update(fresh)
+    return [cached[h] for h in hashes]
+
@@ -2,15 +2,25 @@ from enum import Enum
 from langchain.embeddings import OpenAIEmbeddings
 
 from agentic_rag.gemini_embedder import GeminiEmbeddings  # ✅ real working version
+from agentic_rag.fake_embedder import FakeEmbeddings
+from agentic_rag.embedding_scheduler import ScheduledEmbeddings, get_scheduler
 
 class EmbeddingProvider(str, Enum):
     OPENAI = "gpt"
     GEMINI = "gemini"
+    FAKE = "fake"  # local deterministic provider for offline/load tests
 
-def get_embedding_model(provider: str):
+def get_base_embedding_model(provider: str):
     if provider == EmbeddingProvider.OPENAI:
         return OpenAIEmbeddings()
     elif provider == EmbeddingProvider.GEMINI:
         return GeminiEmbeddings()
+    elif provider == EmbeddingProvider.FAKE:
+        return FakeEmbeddings()
     else:
         raise ValueError(f"Unsupported embedding provider: {provider}")
+
+def get_embedding_model(provider: str, batch_limits: dict = None):
+    """Provider model wrapped in the shared rate-limited scheduler."""
+    base = get_base_embedding_model(provider)
+    return ScheduledEmbeddings(base, provider, scheduler=get_scheduler(provider), batch_limits=batch_limits)
@@ -0,0 +1,234 @@
+# embedding_scheduler.py
+
+"""
+Rate-limit-aware embedding scheduler shared by every provider.
+- Token buckets per provider (requests/min + tokens/min)
+- Concurrent batch execution on a bounded thread pool
+- Honors 429 / Retry-After with jittered exponential backoff
+- Never fabricates vectors: failures raise EmbeddingError
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.embeddings import Embeddings
+
+from agentic_rag.batch_embedder import embed_in_batches, estimate_tokens, get_batch_limits
+
+# ============================
+# 📐 Per-provider quotas
+# ============================
+RATE_LIMITS = {
+    "gpt": {"requests_per_min": 3000, "tokens_per_min": 1_000_000, "max_workers": 8},
+    "gemini": {"requests_per_min": 1500, "tokens_per_min": 1_000_000, "max_workers": 8},
+    "fake": {"requests_per_min": 60_000, "tokens_per_min": 100_000_000, "max_workers": 4},
+    "default": {"requests_per_min": 500, "tokens_per_min": 200_000, "max_workers": 4},
+}
+
+
+class EmbeddingError(RuntimeError):
+    """Raised when one or more texts could not be embedded."""
+
+    def __init__(self, message: str, failed: list = None):
+        super().__init__(message)
+        self.failed = failed or []
+
+
+# ============================
+# 🪣 Token Bucket
+# ============================
+class TokenBucket:
+    def __init__(self, rate_per_sec: float, capacity: float):
+        self.rate = rate_per_sec
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float = 1.0):
+        """Block until `amount` tokens are available (clamped to capacity)."""
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.paused_until - now
+                if wait <= 0:
+                    if self.tokens >= amount:
+                        self.tokens -= amount
+                        return
+                    wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for `seconds` (used after a 429)."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+# ============================
+# 🚦 Error classification
+# ============================
+def _status_code(exc) -> int:
+    for attr in ("status_code", "code", "http_status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def is_rate_limited(exc) -> bool:
+    status = _status_code(exc)
+    text = f"{type(exc).__name__} {exc}".lower()
+    return status == 429 or "resourceexhausted" in text or "ratelimit" in text or "rate limit" in text or "429" in text
+
+
+def is_retryable(exc) -> bool:
+    if is_rate_limited(exc) or isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    status = _status_code(exc)
+    return status is not None and status >= 500
+
+
+def is_input_error(exc) -> bool:
+    """The provider rejected the request because of its inputs (bad text, token limit)."""
+    if is_retryable(exc):
+        return False
+    status = _status_code(exc)
+    text = f"{type(exc).__name__} {exc}".lower()
+    return status in (400, 413, 422) or "context length" in text or "too many tokens" in text or "token limit" in text \
+        or "invalid input" in text or "invalidargument" in text
+
+
+def retry_after_seconds(exc):
+    """Read a Retry-After hint from the exception or its HTTP response."""
+    value = getattr(exc, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+        value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+# ============================
+# 🗓️ Scheduler
+# ============================
+class EmbeddingScheduler:
+    def __init__(self, provider: str, requests_per_min: float, tokens_per_min: float, max_workers: int = 4,
+                 max_retries: int = 5, base_backoff: float = 1.0, max_backoff: float = 60.0):
+        self.provider = provider
+        # Buckets refill per second and allow ~10s of quota as burst
+        self.request_bucket = TokenBucket(requests_per_min / 60.0, max(1.0, requests_per_min / 6.0))
+        self.token_bucket = TokenBucket(tokens_per_min / 60.0, max(1.0, tokens_per_min / 6.0))
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"embed-{provider}")
+        self.stats = {"requests": 0, "rate_limited": 0, "retries": 0, "failures": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _backoff(self, attempt: int, exc) -> float:
+        hint = retry_after_seconds(exc)
+        if hint is not None:
+            return hint + random.uniform(0, max(0.05, hint * 0.2))  # small jitter on top of the hint
+        cap = min(self.max_backoff, self.base_backoff * (2 ** attempt))
+        return random.uniform(cap / 2, cap)  # jittered exponential backoff
+
+    def call(self, fn, texts: list):
+        """Run `fn(texts)` under the provider quota, retrying transient failures."""
+        tokens = sum(estimate_tokens(t) for t in texts)
+        for attempt in range(self.max_retries + 1):
+            self.request_bucket.acquire(1)
+            self.token_bucket.acquire(tokens)
+            self._count("requests")
+            try:
+                return fn(texts)
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    self._count("failures")
+                    raise
+                delay = self._backoff(attempt, e)
+                if is_rate_limited(e):
+                    self._count("rate_limited")
+                    self.request_bucket.pause(delay)
+                    self.token_bucket.pause(delay)
+                self._count("retries")
+                logging.warning(f"⏳ {self.provider} embedding retry {attempt + 1}/{self.max_retries} in {delay:.2f}s: {e}")
+                time.sleep(delay)
+
+    def map(self, fn, batches: list) -> list:
+        """Run `fn` over every batch concurrently; returns (result, error) per batch."""
+        def run(batch):
+            try:
+                return self.call(fn, batch), None
+            except Exception as e:
+                return None, e
+        return list(self.executor.map(run, batches))
+
+
+_SCHEDULERS = {}
+_SCHEDULERS_LOCK = threading.Lock()
+
+
+def get_scheduler(provider: str) -> EmbeddingScheduler:
+    """Process-wide scheduler per provider, so every caller shares one quota."""
+    provider = (provider or "default").lower()
+    with _SCHEDULERS_LOCK:
+        if provider not in _SCHEDULERS:
+            limits = dict(RATE_LIMITS.get(provider, RATE_LIMITS["default"]))
+            if os.getenv("EMBED_REQUESTS_PER_MIN"):
+                limits["requests_per_min"] = float(os.getenv("EMBED_REQUESTS_PER_MIN"))
+            if os.getenv("EMBED_TOKENS_PER_MIN"):
+                limits["tokens_per_min"] = float(os.getenv("EMBED_TOKENS_PER_MIN"))
+            if os.getenv("EMBED_MAX_WORKERS"):
+                limits["max_workers"] = int(os.getenv("EMBED_MAX_WORKERS"))
+            _SCHEDULERS[provider] = EmbeddingScheduler(provider, **limits)
+        return _SCHEDULERS[provider]
+
+
+# ============================
+# 🧠 Scheduled Embeddings wrapper
+# ============================
+class ScheduledEmbeddings(Embeddings):
+    """Wraps a provider model so all calls go through the shared scheduler."""
+
+    def __init__(self, base, provider: str, scheduler: EmbeddingScheduler = None, batch_limits: dict = None):
+        self.base = base
+        self.provider = provider
+        self.scheduler = scheduler or get_scheduler(provider)
+        self.batch_limits = get_batch_limits(provider, batch_limits)
+        self.base_class_name = base.__class__.__name__
+        model = getattr(base, "model_name", None) or getattr(base, "model", None)
+        self.model_name = model if isinstance(model, str) else self.base_class_name
+
+    def embed_documents(self, texts: list) -> list:
+        try:
+            vectors = embed_in_batches(texts, self.base.embed_documents, provider=self.provider,
+                                       limits=self.batch_limits, scheduler=self.scheduler)
+        except Exception as e:
+            raise EmbeddingError(f"❌ Embedding with {self.provider} failed: {e}", list(range(len(texts)))) from e
+        failed = [i for i, v in enumerate(vectors) if v is None]
+        if failed:
+            raise EmbeddingError(f"❌ {len(failed)}/{len(texts)} chunk(s) failed to embed with {self.provider}", failed)
+        return vectors
+
+    def embed_query(self, text: str) -> list:
+        return self.scheduler.call(lambda batch: self.base.embed_query(batch[0]), [text])
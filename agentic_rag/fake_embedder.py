@@ -0,0 +1,61 @@
+# fake_embedder.py
+
+"""
+Deterministic local embedding provider for offline runs and load tests.
+- Vectors are derived from a SHA-256 of the text (same text → same vector)
+- Can simulate provider quota errors (429 + Retry-After) and latency
+"""
+
+import os
+import math
+import time
+import hashlib
+import threading
+
+
+class FakeRateLimitError(Exception):
+    """Mimics a provider 429 response."""
+    status_code = 429
+
+    def __init__(self, retry_after: float = 0.1):
+        super().__init__(f"429 Too Many Requests (retry after {retry_after}s)")
+        self.retry_after = retry_after
+
+
+class FakeEmbeddings:
+    def __init__(self, dimensions: int = None, latency: float = None, fail_every: int = None, retry_after: float = 0.05):
+        self.dimensions = dimensions or int(os.getenv("FAKE_EMBEDDING_DIM", "768"))
+        self.latency = latency if latency is not None else float(os.getenv("FAKE_EMBEDDING_LATENCY", "0"))
+        self.fail_every = fail_every if fail_every is not None else int(os.getenv("FAKE_EMBEDDING_FAIL_EVERY", "0"))
+        self.retry_after = retry_after
+        self.model_name = f"fake-{self.dimensions}"
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _tick(self):
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail_every and calls % self.fail_every == 0:
+            raise FakeRateLimitError(self.retry_after)
+
+    def _vector(self, text: str) -> list:
+        values = []
+        counter = 0
+        while len(values) < self.dimensions:
+            digest = hashlib.sha256(f"{counter}:{text}".encode("utf-8")).digest()
+            values.extend((b - 127.5) / 127.5 for b in digest)
+            counter += 1
+        values = values[:self.dimensions]
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+    def embed_documents(self, texts):
+        self._tick()
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        self._tick()
+        return self._vector(text)
@@ -0,0 +1,272 @@
+# flat_vector_store.py
+
+"""
+Memory-mapped flat vector files for single-node / offline retrieval.
+
+Layout per subject (<base>/<subject>/):
+- manifest.json  → count, dim, source collection, export time, filter fields
+- vectors.f32    → contiguous float32 matrix (count x dim), L2-normalized
+- docs.jsonl     → one JSON line per row (_id, chunk_text, metadata fields)
+- offsets.u64    → uint64 byte offsets into docs.jsonl (count + 1 entries)
+- columns.json   → {field: [value per row]} for the vector index filter fields
+
+Search is exact: one matrix-vector product over the memory map plus
+argpartition top-k, so pages load lazily and startup is near zero.
+Filtered search is a true pre-filter: filter columns are loaded into memory on
+first use (numeric → float array, others → category codes), the row mask is
+applied to the scores before argpartition, and only the top-k rows are read from
+docs.jsonl. Fields missing from columns.json (older exports) are collected with
+one pass over docs.jsonl.
+
+Usage:
+    python -m agentic_rag.flat_vector_store export default profile history
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+from datetime import datetime, timezone
+from typing import List
+
+import numpy as np
+from langchain_core.documents import Document
+
+from agentic_rag.vector_codec import decode_vector
+
+DEFAULT_FLAT_DIR = os.path.join(os.path.dirname(__file__), ".cache", "flat")
+DOC_FIELDS = ["chunk_text", "subject", "source_file", "file_hash", "user_id", "upload_time",
+              "upload_ts", "chunk_index", "total_chunks", "metadata"]
+
+# Same semantics as $vectorSearch pre-filters (missing field → only $ne / $nin match)
+FILTER_CHECKS = {
+    "$eq": lambda a, b: a == b, "$ne": lambda a, b: a != b,
+    "$in": lambda a, b: a in b, "$nin": lambda a, b: a not in b,
+    "$gt": lambda a, b: a is not None and a > b, "$gte": lambda a, b: a is not None and a >= b,
+    "$lt": lambda a, b: a is not None and a < b, "$lte": lambda a, b: a is not None and a <= b,
+}
+
+
+def get_flat_dir(config: dict) -> str:
+    """FLAT_STORE_DIR env > "flat_store.path" in mongo_config.json (relative to agentic_rag/) > default."""
+    path = os.getenv("FLAT_STORE_DIR") or (config or {}).get("flat_store", {}).get("path")
+    if not path:
+        return DEFAULT_FLAT_DIR
+    return path if os.path.isabs(path) else os.path.join(os.path.dirname(__file__), path)
+
+
+# ============================
+# 📤 Export from Mongo
+# ============================
+def export_subject(subject: str, config: dict, base_dir: str = None, batch_size: int = 1000) -> dict:
+    """Stream a subject collection into the flat format (bounded memory, plus the filter columns)."""
+    from agentic_rag.mongo_utils import get_mongo_client
+    from agentic_rag.index_manager import get_vector_index_settings
+
+    subject_config = config.get(subject, config["default"])
+    filter_fields = get_vector_index_settings(config, subject_config)["filter_fields"]
+    columns = {field: [] for field in filter_fields}
+    collection = get_mongo_client()[subject_config["db_name"]][subject_config["collection_name"]]
+    out_dir = os.path.join(base_dir or get_flat_dir(config), subject)
+    os.makedirs(out_dir, exist_ok=True)
+    print(f"📤 Exporting {subject_config['collection_name']} → {out_dir}")
+
+    tmp = {name: os.path.join(out_dir, name + ".tmp") for name in ("vectors.f32", "docs.jsonl", "offsets.u64", "columns.json")}
+    dim, count, skipped = None, 0, 0
+    with open(tmp["vectors.f32"], "wb") as vec_f, open(tmp["docs.jsonl"], "wb") as doc_f, open(tmp["offsets.u64"], "wb") as off_f:
+        offset = 0
+        offsets, rows = [offset], []
+        cursor = collection.find({"embedding": {"$exists": True}}, {f: 1 for f in DOC_FIELDS + ["embedding"]}, batch_size=batch_size)
+        for doc in cursor:
+            vector = decode_vector(doc.pop("embedding"))  # list or packed BinData
+            if not vector:
+                skipped += 1
+                continue
+            if dim is None:
+                dim = len(vector)
+            if len(vector) != dim:
+                skipped += 1  # vector from a different provider/model
+                continue
+            rows.append(vector)
+            doc["_id"] = str(doc["_id"])
+            for field in filter_fields:
+                columns[field].append(doc.get(field))
+            line = (json.dumps(doc, default=str) + "\n").encode("utf-8")
+            doc_f.write(line)
+            offset += len(line)
+            offsets.append(offset)
+            count += 1
+            if len(rows) >= batch_size:
+                _write_rows(vec_f, rows)
+                np.asarray(offsets, dtype=np.uint64).tofile(off_f)
+                offsets, rows = [], []
+        if rows:
+            _write_rows(vec_f, rows)
+        np.asarray(offsets, dtype=np.uint64).tofile(off_f)
+    with open(tmp["columns.json"], "w") as col_f:
+        json.dump(columns, col_f, default=str)
+
+    for name, path in tmp.items():
+        os.replace(path, os.path.join(out_dir, name))  # ✅ readers never see a half-written export
+
+    manifest = {
+        "subject": subject,
+        "count": count,
+        "dim": dim or 0,
+        "skipped": skipped,
+        "filter_fields": filter_fields,
+        "db_name": subject_config["db_name"],
+        "collection_name": subject_config["collection_name"],
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"✅ Exported {count} vectors (dim={dim}, skipped={skipped})")
+    return manifest
+
+
+def _write_rows(vec_f, rows: list):
+    block = np.asarray(rows, dtype=np.float32)
+    norms = np.linalg.norm(block, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    (block / norms).astype(np.float32).tofile(vec_f)
+
+
+# ============================
+# 🔍 Memory-mapped store
+# ============================
+class FlatVectorStore:
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        self.count = self.manifest["count"]
+        self.dim = self.manifest["dim"]
+        self.vectors = np.memmap(os.path.join(directory, "vectors.f32"), dtype=np.float32, mode="r",
+                                 shape=(self.count, self.dim)) if self.count else np.zeros((0, self.dim), np.float32)
+        self.offsets = np.fromfile(os.path.join(directory, "offsets.u64"), dtype=np.uint64)
+        self.docs_path = os.path.join(directory, "docs.jsonl")
+        self.columns_path = os.path.join(directory, "columns.json")
+        self.columns = {}          # field → ("num", float64 array) | ("cat", int32 codes, distinct values)
+        self.columns_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, subject: str, config: dict):
+        return cls(os.path.join(get_flat_dir(config), subject))
+
+    def _read_docs(self, rows) -> list:
+        """Docs for the given rows, one file handle for all of them."""
+        docs = []
+        with open(self.docs_path, "rb") as f:
+            for row in rows:
+                start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+                f.seek(start)
+                docs.append(json.loads(f.read(end - start)))
+        return docs
+
+    # ----------------------------
+    # 🔎 Filter columns
+    # ----------------------------
+    @staticmethod
+    def _to_column(values: list) -> tuple:
+        present = [v for v in values if v is not None]
+        if present and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+            return ("num", np.asarray([np.nan if v is None else v for v in values], dtype=np.float64))
+        index, codes = {}, np.empty(len(values), dtype=np.int32)
+        for row, value in enumerate(values):
+            if isinstance(value, (list, dict)):
+                value = json.dumps(value, sort_keys=True, default=str)   # never a filter value → just keep it hashable
+            codes[row] = index.setdefault(value, len(index))
+        return ("cat", codes, list(index))
+
+    def _load_columns(self, fields: list):
+        """Columns for `fields` into memory (columns.json, else one pass over docs.jsonl)."""
+        with self.columns_lock:
+            missing = [f for f in fields if f not in self.columns]
+            if not missing:
+                return
+            stored = {}
+            if os.path.exists(self.columns_path):
+                with open(self.columns_path) as f:
+                    stored = {k: v for k, v in json.load(f).items() if k in missing}
+            scan = [f for f in missing if f not in stored]
+            if scan:
+                stored.update({f: [] for f in scan})
+                with open(self.docs_path, "rb") as f:
+                    for line in f:
+                        doc = json.loads(line)
+                        for field in scan:
+                            stored[field].append(doc.get(field))
+            for field, values in stored.items():
+                self.columns[field] = self._to_column(values)
+
+    def _column_mask(self, field: str, op: str, value) -> np.ndarray:
+        column = self.columns[field]
+        if column[0] == "num":
+            data = column[1]
+            if op in ("$in", "$nin"):
+                found = np.isin(data, [v for v in value if isinstance(v, (int, float)) and not isinstance(v, bool)])
+                return found if op == "$in" else ~found
+            with np.errstate(invalid="ignore"):
+                # NaN (missing) compares False, and != True, exactly like None in FILTER_CHECKS
+                return FILTER_CHECKS[op](data, value) if op in ("$eq", "$ne") else {
+                    "$gt": np.greater, "$gte": np.greater_equal, "$lt": np.less, "$lte": np.less_equal}[op](data, value)
+        # Categorical → evaluate once per distinct value, then gather by code
+        _, codes, values = column
+        check = FILTER_CHECKS[op]
+        hits = np.fromiter((check(v, value) for v in values), dtype=bool, count=len(values))
+        return hits[codes]
+
+    def filter_mask(self, vector_filter: dict) -> np.ndarray:
+        """Boolean row mask for a build_vector_filter() result ({"$and": [...]} or a single clause)."""
+        clauses = vector_filter.get("$and", [vector_filter])
+        self._load_columns(sorted({field for clause in clauses for field in clause}))
+        mask = np.ones(self.count, dtype=bool)
+        for clause in clauses:
+            for field, ops in clause.items():
+                for op, value in ops.items():
+                    mask &= self._column_mask(field, op, value)
+        return mask
+
+    def search(self, query_vector, k: int = 5, vector_filter: dict = None) -> List[Document]:
+        """Exact top-k; `vector_filter` (see retriever_factory.build_vector_filter) restricts rows before top-k."""
+        if len(query_vector) != self.dim:
+            raise RuntimeError(
+                f"❌ LLM embedding mismatch: flat store indexed with {self.dim} dims, queried with {len(query_vector)}")
+        if self.count == 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        scores = self.vectors @ query
+        k = min(k, self.count)
+        if vector_filter:
+            mask = self.filter_mask(vector_filter)
+            k = min(k, int(mask.sum()))
+            if k == 0:
+                return []
+            scores = np.where(mask, scores, -np.inf)   # excluded rows can't reach the top-k
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        docs = []
+        for row, doc in zip(top, self._read_docs(top)):
+            text = doc.pop("chunk_text", "")
+            doc["score"] = float(scores[row])
+            docs.append(Document(page_content=text, metadata=doc))
+        return docs
+
+
+if __name__ == "__main__":
+    from agentic_rag.mongo_utils import load_mongo_config
+
+    args = sys.argv[1:]
+    if not args or args[0] != "export":
+        print("Usage: python -m agentic_rag.flat_vector_store export [subject ...]")
+        sys.exit(1)
+    os.environ.setdefault("MONGO_CONFIG_PATH", os.path.join(os.path.dirname(__file__), "mongo_config.json"))
+    config = load_mongo_config()
+    subjects = args[1:] or [k for k, v in config.items() if isinstance(v, dict) and "collection_name" in v]
+    for subject in subjects:
+        start = time.perf_counter()
+        export_subject(subject, config)
+        print(f"⏱️ {subject}: {time.perf_counter() - start:.2f}s")
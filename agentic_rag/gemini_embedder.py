@@ -7,21 +7,19 @@ genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 class GeminiEmbeddings:
     def __init__(self, model_name="models/embedding-001"):
         self.model = genai.get_model(model_name)
+        self.model_name = model_name
 
     def embed_documents(self, texts):
-        embeddings = []
-        for text in texts:
-            try:
-                response = genai.embed_content(
-                    model=self.model.name,  # ✅ correct usage
-                    content=text,
-                    task_type="retrieval_document",
-                    title="DocChunk"
-                )
-                embeddings.append(response["embedding"])
-            except Exception as e:
-                print(f"❌ Gemini embedding failed: {e}")
-                embeddings.append([0.0] * 768)  # fallback for error case
+        # ✅ One request per batch; errors propagate to the scheduler (no zero-vector fallback)
+        response = genai.embed_content(
+            model=self.model.name,  # ✅ correct usage
+            content=list(texts),
+            task_type="retrieval_document",
+            title="DocChunk"
+        )
+        embeddings = response["embedding"]
+        if len(embeddings) != len(texts):
+            raise ValueError(f"❌ Gemini returned {len(embeddings)} embeddings for {len(texts)} texts")
         return embeddings
 
     def embed_query(self, text):
@@ -0,0 +1,257 @@
+# index_manager.py
+
+"""
+Create / verify every index the RAG collections rely on, driven by mongo_config.json.
+- Atlas Vector Search index per subject ("index_name"): vector path "embedding",
+  numDimensions (provider size, or dim_reduction dims), similarity, filter fields
+  (pre-filters used by search_by_vector)
+- B-tree indexes behind the dedup, update-mode, resume and cleanup queries
+  (chunk + reference collections, store_logs, ingest_jobs)
+- Drift report: missing indexes, definitions that differ from the config and
+  unmanaged extra indexes (reported only, never dropped)
+- Drifted indexes are rebuilt (drop + create); a unique rebuild is blocked, and the
+  existing index kept, while duplicate values exist (e.g. the plain file_hash index
+  dedup_filter falls back to on old store_logs)
+
+Log TTL / time-series indexes are owned by log_retention.py.
+
+CLI (set MONGODB_URI=mongodb://localhost:27017 to run against a local mongod;
+vector indexes are then reported as unsupported):
+  python -m agentic_rag.index_manager check [subject ...]   → report, exit 1 on drift
+  python -m agentic_rag.index_manager apply [subject ...]   → create / update, then report
+"""
+
+import os
+import sys
+import logging
+
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+from pymongo.operations import SearchIndexModel
+
+from agentic_rag.mongo_utils import get_mongo_client
+
+PROVIDER_DIMENSIONS = {"gpt": 1536, "gemini": 768}
+DEFAULT_FILTER_FIELDS = ["subject", "user_id", "source_file", "upload_ts"]
+SUBJECT_KEYS = ("default", "profile", "history")
+
+# (name, keys, options) — names match the ones ensured lazily at runtime (chunk_dedup, dedup_filter, near_dedup)
+CHUNK_INDEXES = [
+    ("chunk_hash_1", [("metadata.chunk_hash", ASCENDING)], {}),
+    ("file_hash_chunk_index_1", [("file_hash", ASCENDING), ("chunk_index", ASCENDING)], {}),
+    ("source_file_user_1", [("source_file", ASCENDING), ("user_id", ASCENDING)], {}),
+    ("upload_ts_1", [("upload_ts", ASCENDING)], {}),
+]
+NEAR_DEDUP_INDEXES = [("lsh_bands_1", [("metadata.lsh_bands", ASCENDING)], {"sparse": True})]
+REF_INDEXES = [
+    ("chunk_id_1", [("chunk_id", ASCENDING)], {}),
+    ("source_file_user_1", [("source_file", ASCENDING), ("user_id", ASCENDING)], {}),
+    ("file_hash_chunk_index_1", [("file_hash", ASCENDING), ("chunk_index", ASCENDING)], {}),
+]
+STORE_LOG_INDEXES = [("file_hash_unique", [("file_hash", ASCENDING)], {"unique": True})]
+JOB_INDEXES = [
+    ("file_hash_user_status_1", [("file_hash", ASCENDING), ("user_id", ASCENDING), ("status", ASCENDING)], {}),
+]
+MANAGED_OPTIONS = ("unique", "sparse")
+
+
+# ============================
+# 📐 Desired definitions
+# ============================
+def get_vector_index_settings(config: dict, subject_config: dict, provider: str = None) -> dict:
+    """numDimensions / similarity / filter fields for a subject's vector index."""
+    from agentic_rag.dim_reduction import get_dim_reduction
+
+    provider = (provider or os.getenv("EMBEDDING_PROVIDER", "gpt")).lower()
+    settings = {"similarity": "cosine", "filter_fields": DEFAULT_FILTER_FIELDS,
+                "num_dimensions": PROVIDER_DIMENSIONS.get(provider)}
+    settings.update((config or {}).get("vector_index", {}))
+    settings.update(subject_config.get("vector_index", {}))
+    reduction = get_dim_reduction(subject_config)
+    if reduction["method"] != "none":
+        settings["num_dimensions"] = reduction["dims"]
+    if subject_config.get("vector_encoding") == "bit":
+        settings["similarity"] = "euclidean"   # Atlas only supports euclidean on packed-bit vectors
+    return settings
+
+
+def vector_index_definition(config: dict, subject_config: dict, provider: str = None) -> dict:
+    settings = get_vector_index_settings(config, subject_config, provider)
+    fields = [{"type": "vector", "path": "embedding", "numDimensions": settings["num_dimensions"],
+               "similarity": settings["similarity"]}]
+    fields += [{"type": "filter", "path": path} for path in settings["filter_fields"]]
+    return {"fields": fields}
+
+
+def desired_btree_indexes(config: dict, subjects: list = None) -> dict:
+    """{(db_name, collection_name): [(name, keys, options)]}; log collections only for a full run."""
+    from agentic_rag.near_dedup import get_near_dedup_settings, stores_signatures
+
+    wanted = {}
+    for subject in subjects or SUBJECT_KEYS:
+        subject_config = config.get(subject)
+        if not subject_config:
+            continue
+        db_name, collection_name = subject_config["db_name"], subject_config["collection_name"]
+        indexes = list(CHUNK_INDEXES)
+        if stores_signatures(get_near_dedup_settings(config, subject_config)):
+            indexes += NEAR_DEDUP_INDEXES
+        wanted[(db_name, collection_name)] = indexes
+        refs_name = subject_config.get("refs_collection_name", collection_name + "_refs")
+        wanted[(db_name, refs_name)] = list(REF_INDEXES)
+    if subjects:
+        return wanted
+    logs = config["logs"]
+    wanted[(logs["db_name"], logs["store_logs"])] = list(STORE_LOG_INDEXES)
+    wanted[(logs["db_name"], logs.get("ingest_jobs", "ingest_jobs"))] = list(JOB_INDEXES)
+    return wanted
+
+
+# ============================
+# 🔍 Drift detection
+# ============================
+def _normalize_fields(definition: dict) -> list:
+    return sorted(((f.get("type"), f.get("path"), f.get("numDimensions"), f.get("similarity"))
+                   for f in definition.get("fields", [])), key=str)
+
+
+def check_vector_index(collection, index_name: str, definition: dict) -> dict:
+    try:
+        existing = list(collection.list_search_indexes(index_name))
+    except OperationFailure as e:
+        return {"kind": "vector", "name": index_name, "status": "unsupported", "detail": str(e).split(",")[0]}
+    if not existing:
+        return {"kind": "vector", "name": index_name, "status": "missing"}
+    current = existing[0].get("latestDefinition", {})
+    if _normalize_fields(current) != _normalize_fields(definition):
+        return {"kind": "vector", "name": index_name, "status": "drift", "current": current, "wanted": definition}
+    return {"kind": "vector", "name": index_name, "status": "ok", "queryable": existing[0].get("queryable")}
+
+
+def check_btree_indexes(collection, wanted: list, owned_elsewhere: set = frozenset()) -> list:
+    info = collection.index_information()
+    by_key = {tuple(spec["key"]): (name, spec) for name, spec in info.items()}
+    report, matched = [], {"_id_"} | set(owned_elsewhere)
+    for name, keys, options in wanted:
+        found = by_key.get(tuple(keys))
+        if found is None:
+            report.append({"kind": "btree", "name": name, "status": "missing", "spec": (name, keys, options)})
+            continue
+        found_name, spec = found
+        matched.add(found_name)
+        differs = {opt: spec.get(opt, False) for opt in MANAGED_OPTIONS if bool(spec.get(opt)) != bool(options.get(opt))}
+        if differs:
+            report.append({"kind": "btree", "name": found_name, "status": "drift", "current": differs,
+                           "wanted": options, "spec": (name, keys, options)})
+        else:
+            report.append({"kind": "btree", "name": found_name, "status": "ok"})
+    for name in info:
+        if name not in matched:
+            report.append({"kind": "btree", "name": name, "status": "unmanaged"})
+    return report
+
+
+# ============================
+# 🛠️ Apply
+# ============================
+def apply_vector_index(collection, index_name: str, definition: dict, status: str) -> str:
+    if status == "missing":
+        collection.create_search_index(SearchIndexModel(definition=definition, name=index_name, type="vectorSearch"))
+        return "created"
+    if status == "drift":
+        collection.update_search_index(index_name, definition)
+        return "updated"
+    return "unchanged"
+
+
+def first_duplicate(collection, keys: list):
+    """One key value stored more than once (blocks a unique index), or None."""
+    pipeline = [{"$group": {"_id": [f"${field}" for field, _ in keys], "n": {"$sum": 1}}},
+                {"$match": {"n": {"$gt": 1}}}, {"$limit": 1}]
+    for doc in collection.aggregate(pipeline, allowDiskUse=True):
+        return doc["_id"]
+    return None
+
+
+def apply_btree_index(collection, row: dict) -> str:
+    name, keys, options = row["spec"]
+    if row["status"] == "drift":
+        # Options can't be changed in place (and Mongo refuses a second index on the same keys)
+        # → never drop an index the replacement can't be built for
+        if options.get("unique"):
+            duplicate = first_duplicate(collection, keys)
+            if duplicate is not None:
+                return f"blocked: duplicate value {duplicate} → existing index kept"
+        current = collection.index_information()[row["name"]]
+        collection.drop_index(row["name"])
+        try:
+            collection.create_index(keys, name=name, **options)
+        except OperationFailure:
+            # e.g. a duplicate written since the check → put the old index back before reporting
+            collection.create_index(current["key"], name=row["name"],
+                                    **{opt: current[opt] for opt in MANAGED_OPTIONS if opt in current})
+            raise
+        return "rebuilt"
+    collection.create_index(keys, name=name, **options)
+    return "created"
+
+
+def run(config: dict, subjects: list = None, apply: bool = False, provider: str = None) -> list:
+    """Check (and optionally fix) every managed index; returns report rows with "collection"."""
+    client = get_mongo_client()
+    rows = []
+    for subject in subjects or [s for s in SUBJECT_KEYS if s in config]:
+        subject_config = config[subject]
+        collection = client[subject_config["db_name"]][subject_config["collection_name"]]
+        definition = vector_index_definition(config, subject_config, provider)
+        row = check_vector_index(collection, subject_config["index_name"], definition)
+        if apply and row["status"] in ("missing", "drift"):
+            try:
+                row["action"] = apply_vector_index(collection, subject_config["index_name"], definition, row["status"])
+            except OperationFailure as e:
+                row["action"] = f"error: {e}"
+        rows.append({"collection": collection.name, "subject": subject, **row})
+
+    # TTL / plain time-field indexes on the log collections belong to log_retention.py
+    from agentic_rag.log_retention import get_retention_policies
+    retention = {name: {f"{p['time_field']}_ttl", f"{p['time_field']}_1"}
+                 for name, p in get_retention_policies(config["logs"]).items()}
+
+    for (db_name, collection_name), wanted in desired_btree_indexes(config, subjects).items():
+        collection = client[db_name][collection_name]
+        for row in check_btree_indexes(collection, wanted, retention.get(collection_name, set())):
+            if apply and row["status"] in ("missing", "drift"):
+                try:
+                    row["action"] = apply_btree_index(collection, row)
+                except OperationFailure as e:
+                    row["action"] = f"error: {e}"
+            row.pop("spec", None)
+            rows.append({"collection": collection_name, **row})
+    return rows
+
+
+def print_report(rows: list) -> bool:
+    """Pretty-print; returns True when something is missing or drifted."""
+    icons = {"ok": "✅", "missing": "❌", "drift": "⚠️", "unmanaged": "➖", "unsupported": "🚫"}
+    drift = False
+    for row in rows:
+        action = f" → {row['action']}" if row.get("action") else ""
+        print(f"{icons.get(row['status'], '?')} {row['collection']:<24} {row['kind']:<6} {row['name']:<28} {row['status']}{action}")
+        if row["status"] == "drift":
+            print(f"      current: {row.get('current')}\n      wanted:  {row.get('wanted')}")
+        if row["status"] in ("missing", "drift") and not row.get("action", "").startswith(("created", "updated", "rebuilt")):
+            drift = True
+    return drift
+
+
+if __name__ == "__main__":
+    from agentic_rag.mongo_utils import load_mongo_config
+
+    args = sys.argv[1:]
+    if not args or args[0] not in ("check", "apply"):
+        print("Usage: python -m agentic_rag.index_manager check|apply [subject ...]")
+        sys.exit(1)
+    os.environ.setdefault("MONGO_CONFIG_PATH", os.path.join(os.path.dirname(__file__), "mongo_config.json"))
+    logging.basicConfig(level=logging.WARNING)
+    report = run(load_mongo_config(), args[1:] or None, apply=args[0] == "apply")
+    sys.exit(1 if print_report(report) else 0)
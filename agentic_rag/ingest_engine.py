@@ -0,0 +1,533 @@
+# ingest_engine.py
+
+"""
+Staged, parallel ingest engine for bulk STORE runs (store_multiple_files).
+- Parse stage: process pool (PDF / DOCX / XLSX parsing is CPU-bound); workers stream
+  chunk windows back through a bounded queue instead of returning the whole file
+- Embed stage: threads, one chunk window per call (I/O-bound; rate limited by the scheduler)
+- Write stage: threads batching windows per subject into one bulk insert; write errors
+  are mapped back to the file that owns each failed document
+- Every file runs as an ingest job (claim_job / checkpoint_job), so a failed or
+  interrupted bulk run resumes from the last committed window like store_pipeline
+- Stages are connected by bounded queues → a slow stage backpressures the ones before it
+- Reports per-stage throughput and per-file status
+
+Settings: "ingest" block in mongo_config.json, overridable with
+INGEST_PARSE_WORKERS / INGEST_EMBED_WORKERS / INGEST_WRITE_WORKERS / INGEST_QUEUE_SIZE.
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_SETTINGS = {
+    "parse_workers": max(1, (os.cpu_count() or 2) - 1),
+    "embed_workers": 4,
+    "write_workers": 2,
+    "queue_size": 32,            # windows waiting per queue
+    "window_chunks": 256,        # chunks per embed call / write unit
+    "write_batch_chunks": 1000,  # chunks per insert_many
+    "write_flush_seconds": 1.0,
+}
+
+_STOP = object()
+
+
+def get_ingest_settings(config: dict) -> dict:
+    settings = dict(DEFAULT_SETTINGS)
+    settings["window_chunks"] = (config or {}).get("stream_window_chunks", settings["window_chunks"])
+    settings.update((config or {}).get("ingest", {}))
+    for key in ("parse_workers", "embed_workers", "write_workers", "queue_size"):
+        env = os.getenv(f"INGEST_{key.upper()}")
+        if env:
+            settings[key] = int(env)
+    return settings
+
+
+# ============================
+# 🧾 Parse stage (runs in a worker process)
+# ============================
+def parse_file(file_path: str, chunking: dict, window_size: int, out_queue):
+    """
+    Stream the file's chunks to `out_queue` as ("window", path, chunks) messages,
+    then ("done", path, total) or ("error", path, message). Must stay picklable (module-level).
+    The queue is bounded, so a worker never runs more than a few windows ahead.
+    """
+    from agentic_rag.store_pipeline import iter_text_segments, iter_windows
+    from agentic_rag.chunkers import make_chunk_iter
+
+    total = 0
+    try:
+        chunks = (c for c in make_chunk_iter(iter_text_segments(file_path), chunking) if c.strip())
+        for window in iter_windows(chunks, window_size):
+            total += len(window)
+            out_queue.put(("window", file_path, window))
+    except Exception as e:
+        out_queue.put(("error", file_path, f"{type(e).__name__}: {e}"))
+        return total
+    out_queue.put(("done", file_path, total))
+    return total
+
+
+# ============================
+# 📊 Stats
+# ============================
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.chunks = 0
+        self.busy_seconds = 0.0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def record(self, chunks: int, seconds: float, error: bool = False):
+        with self.lock:
+            self.items += 1
+            self.chunks += chunks
+            self.busy_seconds += seconds
+            self.errors += int(error)
+
+    def as_dict(self, wall_seconds: float) -> dict:
+        return {
+            "items": self.items,
+            "chunks": self.chunks,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "chunks_per_sec": round(self.chunks / wall_seconds, 2) if wall_seconds else 0.0,
+        }
+
+
+# ============================
+# 🏭 Engine
+# ============================
+class IngestEngine:
+    def __init__(self, config: dict, settings: dict = None, mode: str = None):
+        self.config = config
+        self.mode = mode           # None → each file uses its subject's "store_mode"
+        self.settings = settings or get_ingest_settings(config)
+        self.embed_queue = queue.Queue(maxsize=self.settings["queue_size"])
+        self.write_queue = queue.Queue(maxsize=self.settings["queue_size"])
+        self.stats = {name: StageStats(name) for name in ("parse", "embed", "write")}
+        self.files = {}            # file_path → per-file status dict
+        self.lock = threading.Lock()
+
+    # ----------------------------
+    # Per-file bookkeeping
+    # ----------------------------
+    def _set_status(self, path: str, **fields):
+        with self.lock:
+            self.files.setdefault(path, {"file": path, "status": "queued", "chunks": 0, "stored": 0}).update(fields)
+
+    def _window_done(self, state: dict, window: tuple = None, stored: int = 0, error: str = None):
+        """
+        Called once per window (written, skipped or failed) and once when parsing ends.
+        Windows finish out of order → the job checkpoint only advances over the
+        contiguous prefix of written windows; the last call finalizes the file.
+        Runs on the parse, embed and write threads → never raises: a failed checkpoint
+        fails the file (the job resumes from the last checkpoint that was saved).
+        """
+        from agentic_rag.ingest_jobs import checkpoint_job
+
+        with state["lock"]:
+            state["pending_windows"] -= 1
+            state["stored"] += stored
+            if error and not state.get("error"):
+                state["error"] = error
+            if window is not None and not error:
+                seq, end = window
+                state["done_windows"][seq] = end
+                advanced = False
+                while state["next_commit"] in state["done_windows"]:
+                    state["committed"] = state["done_windows"].pop(state["next_commit"])
+                    state["next_commit"] += 1
+                    advanced = True
+                if advanced and state["committed"] > state["resume_from"] and not state.get("error"):
+                    try:
+                        checkpoint_job(self.config["logs"], state["job_id"], state["committed"], state["stored"])
+                    except Exception as e:
+                        logging.error(f"💥 Checkpoint failed for job {state['job_id']}", exc_info=True)
+                        state["error"] = f"checkpoint failed: {e}"
+            finished = state["pending_windows"] == 0
+        if finished:
+            self._finalize_file(state)
+
+    def _finalize_file(self, state: dict):
+        from agentic_rag.store_pipeline import finalize_chunk_totals, log_store_metadata
+        from agentic_rag.ingest_jobs import finish_job
+        from agentic_rag.answer_cache import invalidate_subject_answers
+
+        metadata, subject = state["metadata"], state["subject"]
+        path, job_id, log_config = metadata["file_path"], state["job_id"], self.config["logs"]
+        try:
+            if state.get("error"):
+                # Committed windows stay → a rerun resumes from the checkpoint
+                finish_job(log_config, job_id, "failed", error=state["error"])
+                self._set_status(path, status="failed", error=state["error"], job_id=job_id)
+                return
+            if state["total"] == 0:
+                finish_job(log_config, job_id, "skipped", reason="empty")
+                self._set_status(path, status="skipped", reason="empty", job_id=job_id)
+                return
+            extra = {"store_mode": state["mode"], "chunk_strategy": state["chunk_strategy"], "chunks_embedded": state["stored"]}
+            if "deduped" in state:
+                extra["chunks_deduped"] = state["deduped"]
+            if state.get("near") is not None:
+                extra.update(state["near"].finish(job_id))
+            if state.get("diff") is not None:
+                extra.update(state["diff"].apply(metadata["file_hash"]))
+                if extra["chunks_deleted"]:
+                    invalidate_subject_answers(subject)
+            finalize_chunk_totals(self.config, subject, metadata["file_hash"], state["total"])
+            log_store_metadata(
+                log_config,
+                metadata,
+                subject,
+                status="completed",
+                chunk_count=state["total"],
+                chunk_size=state["chunk_size"],
+                chunk_overlap=state["chunk_overlap"],
+                subject_source=state["subject_source"],
+                embedding_model=self.embedding_model_name,
+                extra=extra,
+            )
+            finish_job(log_config, job_id, "completed", committed_chunk_index=state["total"],
+                       total_chunks=state["total"], **extra)
+            self._set_status(path, status="stored", stored=state["stored"], job_id=job_id)
+            print(f"✅ Stored {metadata['file_name']} ({state['stored']} chunks)")
+        except Exception as e:
+            logging.error(f"💥 Finalizing {path} failed", exc_info=True)
+            try:
+                finish_job(log_config, job_id, "failed", error=str(e))
+            except Exception:
+                logging.error(f"💥 Could not mark job {job_id} as failed", exc_info=True)
+            self._set_status(path, status="failed", error=str(e), job_id=job_id)
+
+    # ----------------------------
+    # Stage 1: parse (process pool) → embed_queue
+    # ----------------------------
+    def _start_file(self, path: str, user_id: str, seen_hashes: set):
+        """Metadata, duplicate check and job claim (parent side); returns the file state or None."""
+        from agentic_rag.store_pipeline import (extract_file_metadata, detect_subject_from_filename, is_duplicate_upload,
+                                                estimate_chunk_count, drop_uncommitted_chunks, get_store_mode, ChunkDiff)
+        from agentic_rag.chunkers import get_chunking_settings
+        from agentic_rag.ingest_jobs import claim_job
+        from agentic_rag.near_dedup import NearChunkDedup, get_near_dedup_settings
+        from agentic_rag.chunk_dedup import dedup_scope, embedding_model_key, get_embedding_dims, is_chunk_dedup_enabled
+
+        log_config = self.config["logs"]
+        metadata = extract_file_metadata(path, user_id)
+        if metadata["file_hash"] in seen_hashes or is_duplicate_upload(log_config, metadata):
+            self._set_status(path, status="skipped", reason="duplicate")
+            return None
+        seen_hashes.add(metadata["file_hash"])
+
+        subject, subject_source = detect_subject_from_filename(metadata["file_name"], self.config.get("routing_keywords", {}))
+        subject_config = self.config.get(subject, self.config["default"])
+        chunking = get_chunking_settings(self.config, subject_config)
+        mode = get_store_mode(self.config, subject_config, self.mode)
+        job = claim_job(log_config, metadata, subject, mode, estimated_total_chunks=estimate_chunk_count(metadata, chunking))
+        if job is None:
+            self._set_status(path, status="skipped", reason="already running")
+            return None
+        resume_from = job.get("committed_chunk_index", 0)
+        if resume_from:
+            drop_uncommitted_chunks(self.config, subject, metadata["file_hash"], resume_from)
+
+        near_settings = get_near_dedup_settings(self.config, subject_config)
+        scope = None
+        if is_chunk_dedup_enabled(self.config, subject_config) or near_settings["enabled"]:
+            # ♻️ Scoped to this user + the model / size the embedder really produces (probed once per model)
+            model_key = embedding_model_key(*self.embedding_namespace)
+            dims = get_embedding_dims(lambda x: self.embedding_model.embed_documents([x])[0], model_key)
+            scope = dedup_scope(subject, metadata, model_key, dims)
+        return {
+            "metadata": metadata,
+            "subject": subject,
+            "subject_source": subject_source,
+            "mode": mode,
+            "chunking": chunking,
+            "chunk_size": chunking["chunk_size"],
+            "chunk_overlap": chunking["chunk_overlap"],
+            "chunk_strategy": chunking["strategy"],
+            "job_id": job["_id"],
+            "resume_from": resume_from,
+            "stored": job.get("chunks_embedded", 0),
+            "committed": resume_from,
+            "total": 0,
+            "next_seq": 0,
+            "next_commit": 0,
+            "done_windows": {},
+            "pending_windows": 1,      # released when parsing finishes
+            "scope": scope,
+            "diff": ChunkDiff(self.config, subject, metadata) if mode == "update" else None,
+            "near": NearChunkDedup(self.config, subject, metadata, near_settings, scope) if near_settings["enabled"] else None,
+            "lock": threading.Lock(),
+            "started": time.perf_counter(),
+        }
+
+    def _enqueue_window(self, state: dict, window: list):
+        """Resume skip + update-mode diff for one streamed window, then hand it to the embedders."""
+        with state["lock"]:
+            seq, start = state["next_seq"], state["total"]
+            state["next_seq"] += 1
+            state["total"] += len(window)
+            state["pending_windows"] += 1
+        indices = list(range(start, start + len(window)))
+        end = start + len(window)
+        if state.get("error"):
+            self._window_done(state)
+            return
+        resume_from = state["resume_from"]
+        if start < resume_from:
+            # ⏭️ Already committed by a previous attempt → no re-embedding
+            done = min(len(window), resume_from - start)
+            if state["diff"] is not None:
+                state["diff"].split(window[:done], indices[:done])  # still mark reused chunks as kept
+            window, indices = window[done:], indices[done:]
+        if state["diff"] is not None:
+            window, indices = state["diff"].split(window, indices)
+        if not window:
+            self._window_done(state, (seq, end))
+            return
+        self._set_status(state["metadata"]["file_path"], status="embedding")
+        self.embed_queue.put((state, window, indices, (seq, end)))  # ⏳ blocks when embedders fall behind
+
+    def _on_parse_message(self, states: dict, message: tuple):
+        kind, path, payload = message
+        state = states.get(path)
+        if state is None:
+            return
+        if kind == "window":
+            self._enqueue_window(state, payload)
+            return
+        del states[path]
+        if kind == "error":
+            print(f"💥 Parse failed for {path}: {payload}")
+            logging.error(f"💥 Parse failed for {path}: {payload}")
+            self.stats["parse"].record(state["total"], time.perf_counter() - state["started"], error=True)
+            self._window_done(state, error=payload)
+            return
+        self.stats["parse"].record(payload, time.perf_counter() - state["started"])
+        self._set_status(path, chunks=payload)
+        self._window_done(state)  # parsing finished → last window done finalizes the file
+
+    def _run_parse_stage(self, file_paths: list, user_id: str):
+        max_in_flight = self.settings["parse_workers"] * 2
+        seen_hashes = set()
+        states = {}                # path → state of files still being parsed
+        futures = {}
+        paths = iter(file_paths)
+        exhausted = False
+        with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=self.settings["parse_workers"]) as pool:
+            parsed_queue = manager.Queue(maxsize=self.settings["queue_size"])
+            while True:
+                while not exhausted and len(states) < max_in_flight:
+                    path = next(paths, None)
+                    if path is None:
+                        exhausted = True
+                        break
+                    self._set_status(path, status="parsing")
+                    try:
+                        state = self._start_file(path, user_id, seen_hashes)
+                    except Exception as e:
+                        logging.error(f"💥 Could not start {path}", exc_info=True)
+                        self._set_status(path, status="failed", error=str(e))
+                        continue
+                    if state is None:
+                        continue
+                    states[path] = state
+                    self._set_status(path, subject=state["subject"], job_id=state["job_id"])
+                    futures[path] = pool.submit(parse_file, path, state["chunking"], self.settings["window_chunks"], parsed_queue)
+                if not states:
+                    break
+                try:
+                    self._on_parse_message(states, parsed_queue.get(timeout=1.0))
+                    continue
+                except queue.Empty:
+                    pass
+                # A worker that died (e.g. BrokenProcessPool) never posts its final message
+                for path in [p for p in states if futures[p].done() and futures[p].exception() is not None]:
+                    self._on_parse_message(states, ("error", path, str(futures[path].exception())))
+
+    # ----------------------------
+    # Stage 2: embed (threads) → write_queue
+    # ----------------------------
+    def _run_embed_worker(self):
+        from agentic_rag.store_pipeline import embed_chunks, generate_chunk_hash
+        from agentic_rag.embedding_cache import get_embedding_cache
+        from agentic_rag.chunk_dedup import ExactChunkDedup, is_chunk_dedup_enabled
+        from agentic_rag.near_dedup import NearChunkDedup
+
+        while True:
+            item = self.embed_queue.get()
+            if item is _STOP:
+                return
+            state, window, indices, position = item
+            if state.get("error"):
+                self._window_done(state)  # file already failed → don't spend quota on it
+                continue
+            started = time.perf_counter()
+            try:
+                dedup = None
+                if is_chunk_dedup_enabled(self.config, self.config.get(state["subject"], self.config["default"])):
+                    # ♻️ Chunks stored by other files → reference instead of embed + insert
+                    dedup = ExactChunkDedup(self.config, state["subject"], state["metadata"], state["scope"])
+                    window, indices = dedup.split(window, indices, [generate_chunk_hash(c) for c in window])
+                near = None
+                if state.get("near") is not None and window:
+                    # 🪞 Per-window helper; findings are merged into the file's report
+                    near = NearChunkDedup(self.config, state["subject"], state["metadata"], state["near"].settings,
+                                          state["scope"])
+                    window, indices = near.split(window, indices)
+                    with self.lock:
+                        state["near"].merge(near)
+                embedded = window and embed_chunks(
+                    window,
+                    embedding_fn=lambda x: self.embedding_model.embed_documents([x])[0],
+                    subject=state["subject"],
+                    metadata=state["metadata"],
+                    batch_embed_fn=self.embedding_model.embed_documents,
+                    cache=get_embedding_cache(),
+                    cache_namespace=self.embedding_namespace,
+                    chunk_indices=indices,  # total_chunks is backfilled when the file is finalized
+                )
+                if len(embedded) != len(window):
+                    raise RuntimeError(f"{len(window) - len(embedded)} chunks failed to embed")
+                if embedded and near is not None:
+                    near.annotate(embedded)
+            except Exception as e:
+                print(f"💥 Embedding failed for {state['metadata']['file_name']}: {e}")
+                logging.error("💥 Embed stage failed", exc_info=True)
+                self.stats["embed"].record(0, time.perf_counter() - started, error=True)
+                self._window_done(state, error=str(e))
+                continue
+            self.stats["embed"].record(len(embedded), time.perf_counter() - started)
+            self.write_queue.put((state, embedded, (dedup, near), position))  # ⏳ blocks when writers fall behind
+
+    # ----------------------------
+    # Stage 3: batched writes (threads)
+    # ----------------------------
+    def _flush(self, buffer: list):
+        from agentic_rag.store_pipeline import store_vectors_to_db
+        from agentic_rag.bulk_writer import BulkWriteFailed
+
+        by_subject = {}
+        for item in buffer:
+            by_subject.setdefault(item[0]["subject"], []).append(item)
+        for subject, items in by_subject.items():
+            docs, owners = [], []      # owners[i] → position in `items` of the file window docs[i] came from
+            for pos, (state, embedded, _, _) in enumerate(items):
+                if not state.get("error"):
+                    docs.extend(embedded)
+                    owners.extend([pos] * len(embedded))
+            started = time.perf_counter()
+            errors = {}                # position in `items` → first error for that window
+            if docs:
+                try:
+                    store_vectors_to_db(docs, self.config, subject)
+                except BulkWriteFailed as e:
+                    # ✅ Only the windows that own a failed document fail
+                    for err in e.report["errors"]:
+                        errors.setdefault(owners[err["index"]], err.get("errmsg") or str(e))
+                    logging.error(f"💥 {e.report['failed']} documents failed to write for subject={subject}")
+                except Exception as e:
+                    logging.error(f"💥 Write stage failed for subject={subject}", exc_info=True)
+                    errors = {pos: str(e) for pos in set(owners)}
+                self.stats["write"].record(len(docs), time.perf_counter() - started, error=bool(errors))
+            for pos, (state, embedded, (dedup, near), position) in enumerate(items):
+                item_error = errors.get(pos)
+                written = 0 if (item_error or state.get("error")) else len(embedded)
+                if not item_error and not state.get("error"):
+                    try:
+                        if dedup is not None:
+                            referenced = dedup.commit(embedded)
+                            with state["lock"]:
+                                state["deduped"] = state.get("deduped", 0) + referenced
+                        if near is not None:
+                            near.commit(embedded)
+                    except Exception as e:
+                        logging.error("💥 Writing chunk references failed", exc_info=True)
+                        item_error = str(e)
+                self._window_done(state, position, stored=written, error=item_error)
+
+    def _run_write_worker(self):
+        buffer, buffered_chunks = [], 0
+        last_flush = time.monotonic()
+        stopping = False
+        while not stopping:
+            try:
+                item = self.write_queue.get(timeout=self.settings["write_flush_seconds"])
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                stopping = True
+            elif item is not None:
+                buffer.append(item)
+                buffered_chunks += len(item[1])
+            due = time.monotonic() - last_flush >= self.settings["write_flush_seconds"]
+            if buffer and (stopping or due or buffered_chunks >= self.settings["write_batch_chunks"]):
+                try:
+                    self._flush(buffer)
+                except Exception:
+                    # Keep draining write_queue → embedders never block on a dead writer
+                    logging.error("💥 Write worker flush failed", exc_info=True)
+                buffer, buffered_chunks = [], 0
+                last_flush = time.monotonic()
+
+    # ----------------------------
+    # ▶️ Run
+    # ----------------------------
+    def run(self, file_paths: list, user_id: str) -> dict:
+        from agentic_rag.store_pipeline import load_embedding_model
+
+        start = time.perf_counter()
+        self.provider = os.getenv("EMBEDDING_PROVIDER", "gpt").lower()
+        self.embedding_model = load_embedding_model(self.config.get("embedding_batch", {}).get(self.provider))
+        self.embedding_model_name = getattr(self.embedding_model, "base_class_name", self.embedding_model.__class__.__name__)
+        self.embedding_namespace = (self.provider, getattr(self.embedding_model, "model_name", self.embedding_model_name))
+        print(f"🏭 Ingest engine: {len(file_paths)} files | parse={self.settings['parse_workers']} "
+              f"embed={self.settings['embed_workers']} write={self.settings['write_workers']} | model={self.embedding_model_name}")
+
+        embedders = [threading.Thread(target=self._run_embed_worker, name=f"ingest-embed-{i}", daemon=True)
+                     for i in range(self.settings["embed_workers"])]
+        writers = [threading.Thread(target=self._run_write_worker, name=f"ingest-write-{i}", daemon=True)
+                   for i in range(self.settings["write_workers"])]
+        for t in embedders + writers:
+            t.start()
+
+        try:
+            self._run_parse_stage(file_paths, user_id)
+        finally:
+            for _ in embedders:
+                self.embed_queue.put(_STOP)
+            for t in embedders:
+                t.join()
+            for _ in writers:
+                self.write_queue.put(_STOP)
+            for t in writers:
+                t.join()
+
+        return self.report(time.perf_counter() - start)
+
+    def report(self, wall_seconds: float) -> dict:
+        with self.lock:
+            files = [dict(f) for f in self.files.values()]
+        counts = {}
+        for f in files:
+            counts[f["status"]] = counts.get(f["status"], 0) + 1
+        report = {
+            "wall_seconds": round(wall_seconds, 2),
+            "files": files,
+            "file_counts": counts,
+            "stages": {name: s.as_dict(wall_seconds) for name, s in self.stats.items()},
+        }
+        print(f"📊 Ingest done in {report['wall_seconds']}s | files={counts}")
+        for name, stage in report["stages"].items():
+            print(f"   {name:<6} items={stage['items']} chunks={stage['chunks']} errors={stage['errors']} "
+                  f"busy={stage['busy_seconds']}s rate={stage['chunks_per_sec']}/s")
+        return report
@@ -0,0 +1,247 @@
+# ingest_jobs.py
+
+"""
+Persisted ingestion jobs (logs DB, "ingest_jobs" collection).
+- One job per file ingest: status, subject, mode, progress checkpoint
+- committed_chunk_index = number of chunks already stored AND checkpointed
+- A failed / crashed job for the same file_hash + user_id is resumed from its
+  checkpoint instead of re-embedding the file from the start
+- "running" jobs with no heartbeat for INGEST_JOB_STALE_SECONDS are treated as crashed
+- API uploads are deleted once their job completes; a superseded job's upload
+  is deleted when the job that resumed it finishes
+
+Statuses: queued → running → completed | failed | skipped | superseded
+"""
+
+import os
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+
+from agentic_rag.mongo_utils import get_mongo_client
+
+JOB_STALE_SECONDS = int(os.getenv("INGEST_JOB_STALE_SECONDS", "300"))
+STORE_WORKERS = int(os.getenv("RAG_STORE_WORKERS", "2"))
+STORE_QUEUE_SIZE = int(os.getenv("RAG_STORE_QUEUE_SIZE", "16"))
+RESUMABLE_STATUSES = ["queued", "running", "failed"]
+
+
+def get_jobs_collection(log_config: dict):
+    return get_mongo_client()[log_config["db_name"]][log_config.get("ingest_jobs", "ingest_jobs")]
+
+
+def create_job(log_config: dict, file_path: str, user_id: str, job_id: str = None, **fields) -> str:
+    """Register a queued job (e.g. from the API) and return its job_id."""
+    now = datetime.utcnow()
+    job_id = job_id or uuid.uuid4().hex
+    doc = {
+        "_id": job_id,
+        "status": "queued",
+        "file_path": file_path,
+        "file_name": os.path.basename(file_path),
+        "user_id": user_id,
+        "committed_chunk_index": 0,
+        "chunks_embedded": 0,
+        "attempts": 0,
+        "created_at": now,
+        "updated_at": now,
+    }
+    doc.update(fields)
+    get_jobs_collection(log_config).insert_one(doc)
+    return job_id
+
+
+def get_job(log_config: dict, job_id: str):
+    return get_jobs_collection(log_config).find_one({"_id": job_id})
+
+
+def claim_job(log_config: dict, metadata: dict, subject: str, mode: str, job_id: str = None, **extra):
+    """
+    Start (or resume) the job for this file and mark it running.
+    Returns the job doc, or None if another worker is actively running it.
+    """
+    jobs = get_jobs_collection(log_config)
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=JOB_STALE_SECONDS)
+
+    # 🔁 Resume an unfinished job for the same content (crash, outage, restart)
+    previous = jobs.find_one(
+        {"file_hash": metadata["file_hash"], "user_id": metadata["user_id"],
+         "status": {"$in": RESUMABLE_STATUSES}, "_id": {"$ne": job_id}},
+        sort=[("committed_chunk_index", -1)],
+    )
+    progress = {}
+    if previous is not None:
+        if previous["status"] == "running" and previous["updated_at"] > stale_before:
+            print(f"⏳ Job {previous['_id']} is already running for {metadata['file_name']}")
+            if job_id:
+                finish_job(log_config, job_id, "skipped", reason=f"running as job {previous['_id']}")
+            return None
+        if job_id:
+            # Caller already holds a job id (API) → carry the checkpoint over to it
+            progress = {k: previous.get(k, 0) for k in ("committed_chunk_index", "chunks_embedded")}
+            finish_job(log_config, previous["_id"], "superseded", superseded_by=job_id)
+        else:
+            job_id = previous["_id"]
+
+    fields = {
+        "status": "running",
+        "file_path": metadata["file_path"],
+        "file_name": metadata["file_name"],
+        "file_hash": metadata["file_hash"],
+        "user_id": metadata["user_id"],
+        "subject": subject,
+        "store_mode": mode,
+        "updated_at": now,
+        "started_at": now,         # this attempt (ETA uses progress since then)
+        **progress,
+        **extra,
+    }
+    on_insert = {k: v for k, v in {"committed_chunk_index": 0, "chunks_embedded": 0, "created_at": now}.items()
+                 if k not in progress}
+    job = jobs.find_one_and_update(
+        {"_id": job_id or uuid.uuid4().hex},
+        {"$set": fields, "$inc": {"attempts": 1}, "$setOnInsert": on_insert},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    jobs.update_one({"_id": job["_id"]}, {"$set": {"resumed_from": job["committed_chunk_index"]}})
+    if job["committed_chunk_index"]:
+        print(f"🔁 Resuming job {job['_id']} from chunk {job['committed_chunk_index']} (attempt {job['attempts']})")
+    else:
+        print(f"🆕 Ingest job {job['_id']} started for {metadata['file_name']}")
+    return job
+
+
+def checkpoint_job(log_config: dict, job_id: str, committed_chunk_index: int, chunks_embedded: int):
+    """Record progress after a window is durably stored (also serves as heartbeat)."""
+    get_jobs_collection(log_config).update_one(
+        {"_id": job_id},
+        {"$set": {"committed_chunk_index": committed_chunk_index, "chunks_embedded": chunks_embedded,
+                  "updated_at": datetime.utcnow()}},
+    )
+
+
+def finish_job(log_config: dict, job_id: str, status: str, **fields):
+    fields.update({"status": status, "updated_at": datetime.utcnow()})
+    if status in ("completed", "skipped"):
+        fields["finished_at"] = fields["updated_at"]
+    get_jobs_collection(log_config).update_one({"_id": job_id}, {"$set": fields})
+
+
+def get_job_progress(job: dict) -> dict:
+    """API view of a job: progress counters + ETA from this attempt's chunk rate."""
+    committed = job.get("committed_chunk_index", 0)
+    total = job.get("total_chunks") or job.get("estimated_total_chunks")
+    eta_seconds = None
+    if job.get("status") == "running" and total and job.get("started_at"):
+        done_this_attempt = committed - job.get("resumed_from", 0)
+        elapsed = (job["updated_at"] - job["started_at"]).total_seconds()
+        if done_this_attempt > 0 and elapsed > 0:
+            remaining = max(total - committed, 0)
+            eta_seconds = round(remaining / (done_this_attempt / elapsed), 1)
+    return {
+        "job_id": job["_id"],
+        "status": job.get("status"),
+        "file_name": job.get("file_name"),
+        "subject": job.get("subject"),
+        "store_mode": job.get("store_mode"),
+        "chunks_committed": committed,                     # processed incl. deduped / reused chunks
+        "chunks_embedded": job.get("chunks_embedded", 0),  # newly embedded + stored
+        "total_chunks": job.get("total_chunks"),
+        "estimated_total_chunks": job.get("estimated_total_chunks"),
+        "percent": round(100 * min(committed / total, 1.0), 1) if total else None,
+        "eta_seconds": eta_seconds,
+        "attempts": job.get("attempts", 0),
+        "error": job.get("error"),
+        "reason": job.get("reason"),
+        "created_at": job.get("created_at"),
+        "updated_at": job.get("updated_at"),
+    }
+
+
+# ============================
+# 🧵 Background worker pool (API uploads)
+# ============================
+class StoreQueueFull(Exception):
+    pass
+
+
+class StoreWorkerPool:
+    """Bounded pool running store_pipeline off the request path (queued + running ≤ workers + queue_size)."""
+
+    def __init__(self, workers: int = STORE_WORKERS, queue_size: int = STORE_QUEUE_SIZE):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rag-store")
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.reserve_lock = threading.Lock()
+
+    def reserve(self, count: int):
+        """Take `count` slots at once (all or none) → a multi-file upload is accepted or rejected as a whole."""
+        with self.reserve_lock:
+            taken = 0
+            while taken < count and self.slots.acquire(blocking=False):
+                taken += 1
+            if taken < count:
+                self.release(taken)
+                raise StoreQueueFull(f"Store queue can't take {count} more files "
+                                     f"({STORE_WORKERS} workers, {STORE_QUEUE_SIZE} queued)")
+
+    def release(self, count: int = 1):
+        """Give back reserved slots that were not used by submit(reserved=True)."""
+        for _ in range(count):
+            self.slots.release()
+
+    def submit(self, job_id: str, file_path: str, user_id: str, mode: str = None, config_path: str = None,
+               cleanup_file: bool = False, reserved: bool = False):
+        if not reserved and not self.slots.acquire(blocking=False):
+            raise StoreQueueFull(f"Store queue is full ({STORE_WORKERS} workers, {STORE_QUEUE_SIZE} queued)")
+        try:
+            return self.executor.submit(self._run, job_id, file_path, user_id, mode, config_path, cleanup_file)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def _run(self, job_id: str, file_path: str, user_id: str, mode: str, config_path: str, cleanup_file: bool):
+        from agentic_rag.store_pipeline import store_pipeline, load_config
+        try:
+            store_pipeline(file_path=file_path, user_id=user_id, config_path=config_path, mode=mode, job_id=job_id)
+        except Exception:
+            logging.error(f"💥 Store job {job_id} failed", exc_info=True)
+        finally:
+            self.slots.release()
+        if cleanup_file:
+            log_config = load_config(config_path)["logs"]
+            # Uploads of API jobs this one superseded: same content, never resumed again
+            for old in get_jobs_collection(log_config).find({"superseded_by": job_id, "source": "api"}, {"file_path": 1}):
+                if old.get("file_path") and old["file_path"] != file_path:
+                    _remove_upload(old["file_path"])
+            # Failed jobs keep their upload so they can be resumed
+            job = get_job(log_config, job_id) or {}
+            if job.get("status") in ("completed", "skipped"):
+                _remove_upload(file_path)
+
+
+def _remove_upload(file_path: str):
+    """Delete an API upload and its per-job folder."""
+    if os.path.exists(file_path):
+        os.remove(file_path)
+    try:
+        os.rmdir(os.path.dirname(file_path))  # per-job upload folder
+    except OSError:
+        pass
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_store_pool() -> StoreWorkerPool:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = StoreWorkerPool()
+        return _POOL
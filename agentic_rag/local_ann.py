@@ -0,0 +1,371 @@
+# local_ann.py
+
+"""
+Optional in-memory ANN backend mirroring the Atlas vector collections.
+- HNSW-style graph per (subject, dimensions), cosine similarity
+- Built from the subject collection at startup (or lazily in background)
+- Kept current by store_vectors_to_db in this process (inserted by a background
+  worker, never on the store request path); other processes' writes are detected
+  by a (document count, max _id) watermark, so update-mode re-ingests that keep
+  the count unchanged still trigger a rebuild
+- Freshness checks and rebuilds run in background threads; callers fall back to
+  Atlas $vectorSearch whenever the index is missing, stale or catching up
+- recall@k against exact search is measured on a sample after every build and
+  logged (the pure-Python graph reached ~0.76 recall@10 on 5000 random 128-d
+  vectors with the defaults; raise ef_search / ef_construction if it is too low)
+"""
+
+import os
+import math
+import time
+import heapq
+import random
+import logging
+import threading
+
+import numpy as np
+from langchain_core.documents import Document
+
+from agentic_rag.mongo_utils import get_mongo_client
+from agentic_rag.vector_codec import decode_vector
+
+DEFAULT_SETTINGS = {
+    "enabled": False,
+    "subjects": ["default", "profile", "history"],
+    "M": 16,
+    "ef_construction": 100,
+    "ef_search": 64,
+    "stale_check_seconds": 30,
+    "recall_sample": 50,
+    "recall_k": 10,
+}
+
+PAYLOAD_FIELDS = ["chunk_text", "subject", "source_file", "file_hash", "user_id", "upload_time",
+                  "upload_ts", "chunk_index", "total_chunks", "metadata"]
+
+
+def get_local_ann_settings(config: dict) -> dict:
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update((config or {}).get("local_ann", {}))
+    env = os.getenv("LOCAL_ANN_ENABLED")
+    if env is not None:
+        settings["enabled"] = env.lower() == "true"
+    return settings
+
+
+# ============================
+# 🕸️ HNSW graph
+# ============================
+class HNSWIndex:
+    def __init__(self, dim: int, M: int = 16, ef_construction: int = 100, ef_search: int = 64, seed: int = 42):
+        self.dim = dim
+        self.M = M
+        self.M0 = 2 * M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.level_mult = 1 / math.log(max(M, 2))
+        self.vectors = np.zeros((1024, dim), dtype=np.float32)
+        self.count = 0
+        self.links = []            # node → list (per level) of neighbor lists
+        self.entry_point = None
+        self.max_level = -1
+        self.rng = random.Random(seed)
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        arr = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(arr)
+        return arr / norm if norm else arr
+
+    def _search_layer(self, query: np.ndarray, entry_points: list, ef: int, level: int) -> list:
+        """Best-first search on one layer; returns [(similarity, node)] (unsorted, size ≤ ef)."""
+        visited = set(entry_points)
+        sims = self.vectors[entry_points] @ query
+        candidates = [(-float(s), n) for s, n in zip(sims, entry_points)]
+        heapq.heapify(candidates)
+        results = [(float(s), n) for s, n in zip(sims, entry_points)]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            neg_sim, node = heapq.heappop(candidates)
+            if len(results) >= ef and -neg_sim < results[0][0]:
+                break
+            neighbors = [n for n in self.links[node][level] if n not in visited]
+            if not neighbors:
+                continue
+            visited.update(neighbors)
+            for s, n in zip(self.vectors[neighbors] @ query, neighbors):
+                s = float(s)
+                if len(results) < ef or s > results[0][0]:
+                    heapq.heappush(candidates, (-s, n))
+                    heapq.heappush(results, (s, n))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return results
+
+    def _prune(self, node: int, level: int, limit: int):
+        neighbors = self.links[node][level]
+        if len(neighbors) <= limit:
+            return
+        sims = self.vectors[neighbors] @ self.vectors[node]
+        keep = np.argsort(-sims)[:limit]
+        self.links[node][level] = [neighbors[i] for i in keep]
+
+    def add(self, vector) -> int:
+        query = self._normalize(vector)
+        with self.lock:
+            node = self.count
+            if node >= len(self.vectors):
+                self.vectors = np.vstack([self.vectors, np.zeros_like(self.vectors)])
+            self.vectors[node] = query
+            self.count += 1
+            level = int(-math.log(1.0 - self.rng.random()) * self.level_mult)
+            self.links.append([[] for _ in range(level + 1)])
+
+            if self.entry_point is None:
+                self.entry_point, self.max_level = node, level
+                return node
+
+            entry = [self.entry_point]
+            for lvl in range(self.max_level, level, -1):
+                entry = [max(self._search_layer(query, entry, 1, lvl))[1]]
+            for lvl in range(min(level, self.max_level), -1, -1):
+                found = self._search_layer(query, entry, self.ef_construction, lvl)
+                limit = self.M0 if lvl == 0 else self.M
+                chosen = [n for _, n in heapq.nlargest(self.M, found)]
+                self.links[node][lvl] = chosen
+                for n in chosen:
+                    self.links[n][lvl].append(node)
+                    self._prune(n, lvl, limit)
+                entry = [n for _, n in found]
+
+            if level > self.max_level:
+                self.entry_point, self.max_level = node, level
+            return node
+
+    def search(self, vector, k: int = 5, ef: int = None) -> list:
+        """Return [(node, similarity)] for the k nearest nodes."""
+        with self.lock:
+            if self.entry_point is None:
+                return []
+            query = self._normalize(vector)
+            entry = [self.entry_point]
+            for lvl in range(self.max_level, 0, -1):
+                entry = [max(self._search_layer(query, entry, 1, lvl))[1]]
+            found = self._search_layer(query, entry, max(ef or self.ef_search, k), 0)
+            return [(n, s) for s, n in heapq.nlargest(k, found)]
+
+
+# ============================
+# 📚 Subject index (graph + payloads)
+# ============================
+class LocalVectorIndex:
+    def __init__(self, subject: str, collection, settings: dict):
+        self.subject = subject
+        self.collection = collection
+        self.settings = settings
+        self.graphs = {}           # dimensions → HNSWIndex
+        self.payloads = {}         # dimensions → list of payload dicts (aligned with graph nodes)
+        self.ids = set()
+        self.doc_count = 0         # documents seen (indexed or not) → compared with the collection size
+        self.watermark = None      # highest _id seen → catches delete + re-insert with an unchanged count
+        self.recall = {}           # dimensions → measured recall@k after the last build
+        self.ready = False
+        self.stale = False
+        self.checked_at = 0.0
+        self.checking = False
+        self.pending = []          # docs stored in this process, inserted by the worker thread
+        self.worker = None
+        self.lock = threading.Lock()
+
+    def add_documents(self, docs: list):
+        for doc in docs:
+            doc_id = str(doc.get("_id"))
+            with self.lock:
+                if doc_id in self.ids:
+                    continue
+                self.ids.add(doc_id)
+                self.doc_count += 1
+                if doc.get("_id") is not None and (self.watermark is None or doc["_id"] > self.watermark):
+                    self.watermark = doc["_id"]
+                vector = decode_vector(doc.get("embedding"))  # list or packed BinData
+                if not vector:
+                    continue
+                dim = len(vector)
+                graph = self.graphs.get(dim)
+                if graph is None:
+                    graph = self.graphs[dim] = HNSWIndex(dim, self.settings["M"], self.settings["ef_construction"], self.settings["ef_search"])
+                    self.payloads[dim] = []
+                payload = {f: doc[f] for f in PAYLOAD_FIELDS if f in doc}
+                payload["_id"] = doc.get("_id")
+                graph.add(vector)
+                self.payloads[dim].append(payload)
+
+    def build(self):
+        start = time.perf_counter()
+        projection = {f: 1 for f in PAYLOAD_FIELDS + ["embedding"]}
+        self.add_documents(self.collection.find({}, projection))
+        elapsed = time.perf_counter() - start
+        self.recall = self.measure_recall()
+        self.ready = True
+        self.stale = False
+        self.checked_at = time.monotonic()
+        recall = ", ".join(f"{dim}d={value:.3f}" for dim, value in self.recall.items()) or "-"
+        print(f"[LOCAL ANN] Built index for subject={self.subject} | docs={self.doc_count} | "
+              f"{elapsed:.2f}s | recall@{self.settings['recall_k']} {recall}")
+
+    def measure_recall(self) -> dict:
+        """recall@k of the graph vs exact search, on perturbed copies of sampled stored vectors."""
+        k, sample = self.settings["recall_k"], self.settings["recall_sample"]
+        rng = np.random.default_rng(0)
+        recall = {}
+        for dim, graph in self.graphs.items():
+            if graph.count <= k or not sample:
+                continue
+            vectors = graph.vectors[:graph.count]
+            hits = []
+            for node in rng.choice(graph.count, size=min(sample, graph.count), replace=False):
+                query = vectors[node] + rng.normal(scale=0.01, size=dim).astype(np.float32)
+                exact = set(np.argpartition(-(vectors @ query), k)[:k].tolist())
+                hits.append(len(exact & {n for n, _ in graph.search(query, k)}) / k)
+            recall[dim] = float(np.mean(hits))
+            if recall[dim] < 0.9:
+                logging.warning(f"⚠️ Local ANN recall@{k} for {self.subject} ({dim}d) is {recall[dim]:.3f}; "
+                                f"consider a higher ef_search / ef_construction")
+        return recall
+
+    def _collection_version(self) -> tuple:
+        latest = self.collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        return self.collection.estimated_document_count(), latest["_id"] if latest else None
+
+    def _check_freshness(self):
+        try:
+            count, latest = self._collection_version()
+            with self.lock:
+                if self.pending:
+                    self.checked_at = 0.0   # local inserts still draining → compare again next time
+                    return
+                self.stale = count != self.doc_count or latest != self.watermark
+        except Exception as e:
+            logging.warning(f"⚠️ Local ANN freshness check failed for {self.subject}: {e}")
+            self.stale = True
+        finally:
+            self.checking = False
+
+    def is_fresh(self) -> bool:
+        """Never touches Mongo: the watermark comparison runs in a background thread."""
+        now = time.monotonic()
+        if now - self.checked_at >= self.settings["stale_check_seconds"] and not self.checking:
+            self.checked_at = now
+            self.checking = True
+            threading.Thread(target=self._check_freshness, name=f"local-ann-check-{self.subject}", daemon=True).start()
+        return self.ready and not self.stale and not self.pending
+
+    def enqueue(self, docs: list):
+        """Queue docs stored in this process; inserted into the graph off the store path."""
+        with self.lock:
+            self.pending.extend(docs)
+            if self.worker is not None and self.worker.is_alive():
+                return
+            self.worker = threading.Thread(target=self._drain, name=f"local-ann-add-{self.subject}", daemon=True)
+            self.worker.start()
+
+    def _drain(self):
+        while True:
+            with self.lock:
+                docs, self.pending = self.pending[:256], self.pending[256:]
+            if not docs:
+                return
+            try:
+                self.add_documents(docs)
+            except Exception as e:
+                logging.error(f"❌ Local ANN insert failed for {self.subject}: {e}", exc_info=True)
+                self.stale = True
+
+    def search(self, query_vector: list, k: int = 5):
+        dim = len(query_vector)
+        docs = []
+        with self.lock:
+            graph = self.graphs.get(dim)
+            if graph is None:
+                return None
+            for node, score in graph.search(query_vector, k):
+                payload = dict(self.payloads[dim][node])
+                text = payload.pop("chunk_text", "")
+                payload["score"] = score
+                docs.append(Document(page_content=text, metadata=payload))
+        return docs
+
+
+# ============================
+# 🗃️ Registry
+# ============================
+_INDEXES = {}
+_BUILDING = set()
+_INDEXES_LOCK = threading.Lock()
+
+
+def _collection_for(config: dict, subject: str):
+    subject_config = config.get(subject, config.get("default"))
+    return get_mongo_client()[subject_config["db_name"]][subject_config["collection_name"]]
+
+
+def _build_in_background(subject: str, config: dict, settings: dict):
+    def run():
+        try:
+            index = LocalVectorIndex(subject, _collection_for(config, subject), settings)
+            index.build()
+            with _INDEXES_LOCK:
+                _INDEXES[subject] = index
+        except Exception as e:
+            logging.error(f"❌ Local ANN build failed for {subject}: {e}", exc_info=True)
+        finally:
+            with _INDEXES_LOCK:
+                _BUILDING.discard(subject)
+
+    with _INDEXES_LOCK:
+        if subject in _BUILDING:
+            return
+        _BUILDING.add(subject)
+    threading.Thread(target=run, name=f"local-ann-{subject}", daemon=True).start()
+
+
+def warm_local_indexes(config: dict, block: bool = False):
+    """Build indexes for every configured subject (call at API startup)."""
+    settings = get_local_ann_settings(config)
+    if not settings["enabled"]:
+        return
+    for subject in settings["subjects"]:
+        if block:
+            index = LocalVectorIndex(subject, _collection_for(config, subject), settings)
+            index.build()
+            with _INDEXES_LOCK:
+                _INDEXES[subject] = index
+        else:
+            _build_in_background(subject, config, settings)
+
+
+def get_local_index(subject: str, config: dict):
+    """Fresh local index for the subject, or None (→ caller falls back to Atlas)."""
+    settings = get_local_ann_settings(config)
+    if not settings["enabled"] or subject not in settings["subjects"]:
+        return None
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(subject)
+    if index is not None and index.is_fresh():
+        return index
+    if index is None or index.stale:
+        # Missing or stale → rebuild off the request path (pending local inserts only need to drain)
+        _build_in_background(subject, config, settings)
+    return None
+
+
+def add_to_local_index(subject: str, docs: list):
+    """Incremental update after an insert in this process (queued, never blocks the store)."""
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(subject)
+    if index is not None and index.ready:
+        index.enqueue(docs)
@@ -0,0 +1,126 @@
+# log_retention.py
+
+"""
+Log retention handled by MongoDB instead of request-path purges.
+- "timeseries" → the log collection is created as a time-series collection
+                 (timeField / metaField / granularity) with expireAfterSeconds
+- "ttl"        → regular collection + TTL index on a date field
+- An existing regular collection can't be converted in place → a "timeseries"
+  policy falls back to a TTL index on its timeField (with a warning)
+- Idempotent: re-running only adjusts expireAfterSeconds when the config changed
+
+Configured under "logs" → "retention" in mongo_config.json
+(expire_after_days: null → keep forever). Runs at API startup, or:
+  python -m agentic_rag.log_retention
+"""
+
+import os
+import sys
+import logging
+
+from pymongo.errors import CollectionInvalid
+
+from agentic_rag.mongo_utils import get_mongo_client
+
+DEFAULT_POLICIES = {
+    "retrieve_logs": {"type": "timeseries", "time_field": "timestamp", "meta_field": "subject",
+                      "granularity": "minutes", "expire_after_days": 1},
+    "store_logs": {"type": "ttl", "time_field": "logged_at", "expire_after_days": None},
+}
+
+
+def get_retention_policies(log_config: dict) -> dict:
+    """{collection name: policy} for every log collection with a policy."""
+    configured = log_config.get("retention", {})
+    policies = {}
+    for key, default in DEFAULT_POLICIES.items():
+        policy = {**default, **configured.get(key, {})}
+        policies[log_config.get(key, key)] = policy
+    return policies
+
+
+def _expire_seconds(policy: dict):
+    days = policy.get("expire_after_days")
+    return int(days * 86400) if days else None
+
+
+def _collection_options(db, name: str):
+    for info in db.list_collections(filter={"name": name}):
+        return info
+    return None
+
+
+def _ensure_ttl_index(collection, field: str, expire: int) -> str:
+    """TTL index on `field`, or a plain one when nothing expires (range queries stay indexed)."""
+    indexes = collection.index_information()
+    ttl_name, plain_name = f"{field}_ttl", f"{field}_1"
+    if expire is None:
+        outcome = "ok"
+        if ttl_name in indexes:
+            collection.drop_index(ttl_name)   # same key → must go before the plain index
+            outcome = "ttl removed"
+        if plain_name not in indexes:
+            collection.create_index(field, name=plain_name)
+        return outcome
+    if plain_name in indexes:
+        collection.drop_index(plain_name)
+    existing = indexes.get(ttl_name)
+    if existing is None:
+        collection.create_index(field, name=ttl_name, expireAfterSeconds=expire)
+        return f"ttl index created ({expire}s)"
+    if existing.get("expireAfterSeconds") != expire:
+        collection.database.command("collMod", collection.name, index={"name": ttl_name, "expireAfterSeconds": expire})
+        return f"ttl updated ({expire}s)"
+    return "ok"
+
+
+def ensure_log_collection(db, name: str, policy: dict) -> str:
+    expire = _expire_seconds(policy)
+    info = _collection_options(db, name)
+
+    if policy["type"] == "timeseries":
+        if info is None:
+            timeseries = {"timeField": policy["time_field"], "granularity": policy.get("granularity", "minutes")}
+            if policy.get("meta_field"):
+                timeseries["metaField"] = policy["meta_field"]
+            options = {"timeseries": timeseries}
+            if expire is not None:
+                options["expireAfterSeconds"] = expire
+            try:
+                db.create_collection(name, **options)
+                return "time-series collection created"
+            except CollectionInvalid:
+                info = _collection_options(db, name)   # created concurrently
+        if info.get("type") == "timeseries":
+            current = info.get("options", {}).get("expireAfterSeconds")
+            if current == "off":
+                current = None
+            if current != expire:
+                db.command("collMod", name, expireAfterSeconds=expire if expire is not None else "off")
+                return f"time-series expiry updated ({expire or 'off'})"
+            return "ok"
+        logging.warning(f"⚠️ {name} already exists as a regular collection → TTL index instead of time-series")
+
+    return _ensure_ttl_index(db[name], policy["time_field"], expire)
+
+
+def ensure_log_retention(log_config: dict) -> dict:
+    """Apply every retention policy; returns {collection: outcome}. Never raises."""
+    db = get_mongo_client()[log_config["db_name"]]
+    results = {}
+    for name, policy in get_retention_policies(log_config).items():
+        try:
+            results[name] = ensure_log_collection(db, name, policy)
+        except Exception as e:
+            logging.error(f"❌ Log retention setup failed for {name}: {e}")
+            results[name] = f"error: {e}"
+    print(f"[LOG RETENTION] {results}")
+    return results
+
+
+if __name__ == "__main__":
+    from agentic_rag.mongo_utils import load_mongo_config
+
+    os.environ.setdefault("MONGO_CONFIG_PATH", os.path.join(os.path.dirname(__file__), "mongo_config.json"))
+    outcome = ensure_log_retention(load_mongo_config()["logs"])
+    sys.exit(1 if any(v.startswith("error") for v in outcome.values()) else 0)
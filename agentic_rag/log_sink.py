@@ -0,0 +1,184 @@
+# log_sink.py
+
+"""
+Non-blocking log writes for best-effort logs (retrieve path).
+- emit() only appends to an in-memory ring buffer (no network on the request path)
+- A daemon thread flushes in batches when LOG_SINK_BATCH events are queued or every
+  LOG_SINK_FLUSH_SECONDS, through the unordered BulkWriter
+- When Mongo is slow or down the buffer fills and the oldest events are dropped
+  (counted in stats["dropped"]); failed batches are dropped and counted too
+- Flushed on interpreter exit (atexit) and from the API shutdown hook; events
+  emitted after close() are written inline (nothing would drain the buffer)
+- Logs other code reads back (store_logs → duplicate-upload detection, written
+  before the job is marked completed) use write_log(..., durable=True): inline,
+  never dropped, raises when the write fails
+
+Env: LOG_SINK_ENABLED (default true; false → synchronous writes), LOG_SINK_CAPACITY (10000),
+LOG_SINK_BATCH (500), LOG_SINK_FLUSH_SECONDS (1.0).
+"""
+
+import os
+import time
+import atexit
+import logging
+import threading
+from collections import deque
+
+from agentic_rag.mongo_utils import get_mongo_client
+from agentic_rag.bulk_writer import BulkWriter, BulkWriteFailed
+
+SINK_ENABLED = os.getenv("LOG_SINK_ENABLED", "true").lower() == "true"
+SINK_CAPACITY = int(os.getenv("LOG_SINK_CAPACITY", "10000"))
+SINK_BATCH = int(os.getenv("LOG_SINK_BATCH", "500"))
+SINK_FLUSH_SECONDS = float(os.getenv("LOG_SINK_FLUSH_SECONDS", "1.0"))
+
+
+class LogSink:
+    def __init__(self, capacity: int = SINK_CAPACITY, batch_size: int = SINK_BATCH, flush_seconds: float = SINK_FLUSH_SECONDS):
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.buffer = deque()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = False
+        self.thread = None
+        self.stats = {"emitted": 0, "written": 0, "duplicates": 0, "dropped": 0, "failed": 0, "flushes": 0}
+
+    def _start(self):
+        self.thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+        self.thread.start()
+
+    def emit(self, db_name: str, collection_name: str, doc: dict, write_concern: dict = None):
+        """Queue one log document; never blocks on Mongo (except after close(), see _write_inline)."""
+        with self.lock:
+            self.stats["emitted"] += 1
+            closed = self.stopped
+            if not closed:
+                if self.thread is None:
+                    self._start()
+                if len(self.buffer) >= self.capacity:
+                    self.buffer.popleft()           # 🗑️ ring buffer: oldest event goes first
+                    self.stats["dropped"] += 1
+                self.buffer.append((db_name, collection_name, doc, write_concern))
+                if len(self.buffer) >= self.batch_size:
+                    self.wake.set()
+        if closed:
+            self._write_inline(db_name, collection_name, doc, write_concern)
+
+    def _write_inline(self, db_name: str, collection_name: str, doc: dict, write_concern: dict = None):
+        """Closed sink (shutdown / atexit already flushed) → write now instead of queueing forever."""
+        try:
+            report = BulkWriter(get_mongo_client()[db_name][collection_name], {"write_concern": write_concern}).insert(
+                [doc], raise_on_error=False)
+        except Exception as e:
+            logging.warning(f"⚠️ Log sink dropped 1 event for {collection_name} after close: {e}")
+            with self.lock:
+                self.stats["failed"] += 1
+            return
+        with self.lock:
+            self.stats["written"] += report["inserted"]
+            self.stats["duplicates"] += report["duplicates"]
+            self.stats["failed"] += report["failed"]
+
+    def _run(self):
+        while not self.stopped:
+            self.wake.wait(self.flush_seconds)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logging.error("💥 Log sink flush failed", exc_info=True)
+
+    def flush(self):
+        """Write everything queued so far (called by the worker, atexit and shutdown)."""
+        with self.flush_lock:
+            while True:
+                with self.lock:
+                    items = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+                if not items:
+                    return
+                groups = {}
+                for db_name, collection_name, doc, write_concern in items:
+                    key = (db_name, collection_name, tuple(sorted((write_concern or {}).items())))
+                    groups.setdefault(key, []).append(doc)
+                for (db_name, collection_name, write_concern), docs in groups.items():
+                    started = time.perf_counter()
+                    try:
+                        collection = get_mongo_client()[db_name][collection_name]
+                        report = BulkWriter(collection, {"write_concern": dict(write_concern) or None}).insert(
+                            docs, raise_on_error=False)
+                    except Exception as e:
+                        # Degrade, don't back up: the batch is dropped and counted
+                        logging.warning(f"⚠️ Log sink dropped {len(docs)} events for {collection_name}: {e}")
+                        with self.lock:
+                            self.stats["failed"] += len(docs)
+                        continue
+                    with self.lock:
+                        self.stats["written"] += report["inserted"]
+                        self.stats["duplicates"] += report["duplicates"]
+                        self.stats["failed"] += report["failed"]
+                        self.stats["flushes"] += 1
+                    if report["duplicates"]:
+                        logging.warning(f"⚠️ {report['duplicates']} duplicate log events skipped for {collection_name}")
+                    logging.debug(f"🪵 Log sink wrote {report['inserted']} events to {collection_name} "
+                                  f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    def close(self, timeout: float = 5.0):
+        with self.lock:
+            self.stopped = True   # later emits are written inline, earlier ones are in the final flush
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        self.flush()
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {**self.stats, "queued": len(self.buffer), "capacity": self.capacity}
+
+
+_sink = None
+_sink_pid = None
+_sink_lock = threading.Lock()
+
+
+def get_log_sink() -> LogSink:
+    """One sink per process (re-created after fork, like the Mongo client)."""
+    global _sink, _sink_pid
+    pid = os.getpid()
+    if _sink is not None and _sink_pid == pid:
+        return _sink
+    with _sink_lock:
+        if _sink is None or _sink_pid != pid:
+            _sink, _sink_pid = LogSink(), pid
+            atexit.register(_sink.close)
+        return _sink
+
+
+def write_log_now(db_name: str, collection_name: str, doc: dict, write_concern: dict = None) -> dict:
+    """Synchronous write; a duplicate (unique index) is skipped, any other failure raises BulkWriteFailed."""
+    report = BulkWriter(get_mongo_client()[db_name][collection_name], {"write_concern": write_concern}).insert(
+        [doc], raise_on_error=False)
+    if report["failed"]:
+        raise BulkWriteFailed(report)
+    return report
+
+
+def write_log(db_name: str, collection_name: str, doc: dict, write_concern: dict = None, durable: bool = False):
+    """
+    Queue a best-effort log document (or write it inline when LOG_SINK_ENABLED=false).
+    durable=True → always written inline and never dropped (logs that are read back).
+    """
+    if durable:
+        write_log_now(db_name, collection_name, doc, write_concern)
+    elif SINK_ENABLED:
+        get_log_sink().emit(db_name, collection_name, doc, write_concern)
+    else:
+        BulkWriter(get_mongo_client()[db_name][collection_name], {"write_concern": write_concern}).insert(
+            [doc], raise_on_error=False)
+
+
+def flush_log_sink():
+    if _sink is not None and _sink_pid == os.getpid():
+        _sink.flush()
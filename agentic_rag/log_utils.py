@@ -1,7 +1,8 @@
 # log_utils.py
 
 import os
-from pymongo import MongoClient
+from agentic_rag.mongo_utils import get_mongo_client
+from agentic_rag.log_sink import write_log
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
@@ -9,28 +10,28 @@ load_dotenv()
 
 LOG_DB = os.getenv("LOG_DB", "agentic_rag_logs")
 LOG_COLLECTION = os.getenv("RETRIEVE_LOG_COLLECTION", "retrieve_logs")
-MONGO_URI = os.getenv("MONGO_URI")
-
-def log_retrieve_event(query: str, subject: str, match_count: int, provider: str):
-    client = MongoClient(MONGO_URI)
-    db = client[LOG_DB]
-    collection = db[LOG_COLLECTION]
 
+def log_retrieve_event(query: str, subject: str, match_count: int, provider: str, cache_hit: bool = False,
+                       filters: dict = None):
+    """Queued on the background log sink (no Mongo round trip on the request path)."""
     log_doc = {
         "query": query,
         "subject": subject,
         "matches_found": match_count,
         "provider": provider,
+        "cache_hit": cache_hit,
         "timestamp": datetime.utcnow(),
         "pipeline_version": os.getenv("RETRIEVE_PIPELINE_VERSION", "v1.0")
     }
+    if filters:
+        log_doc["filters"] = filters
 
-    collection.insert_one(log_doc)
+    write_log(LOG_DB, LOG_COLLECTION, log_doc)
 
 
 def read_retrieve_logs(limit: int = 10):
     """Read the latest N retrieve logs (default: 10)."""
-    client = MongoClient(MONGO_URI)
+    client = get_mongo_client()
     db = client[LOG_DB]
     collection = db[LOG_COLLECTION]
 
@@ -38,7 +39,7 @@ def read_retrieve_logs(limit: int = 10):
 
 def purge_old_logs(cutoff_datetime):
     """Delete logs older than the given datetime."""
-    client = MongoClient(MONGO_URI)
+    client = get_mongo_client()
     db = client[LOG_DB]
     collection = db[LOG_COLLECTION]
 
@@ -52,17 +53,5 @@ def purge_old_retrieve_logs(days: int = 1):
     purge_old_logs(cutoff)
 
 
-
-_last_cleanup_date = None
-
-def clean_logs_once_per_day():
-    """Cleans logs only once per UTC day (no matter how many times retrieve runs)."""
-    global _last_cleanup_date
-
-    today = datetime.utcnow().date()
-    if _last_cleanup_date != today:
-        print("[LOG CLEANUP] Running daily retrieve log cleanup...")
-        purge_old_retrieve_logs()
-        _last_cleanup_date = today
-    else:
-        print("[LOG CLEANUP] Skipped (already cleaned today)")
+# ℹ️ Routine retention is done by Mongo (TTL / time-series expiry, see log_retention.py);
+# the purge helpers above are for manual, one-off cleanups only.
@@ -2,12 +2,14 @@
 
 import os
 import json
+import time
+import logging
+import threading
 from pymongo import MongoClient
 from dotenv import load_dotenv
 
 load_dotenv()
 
-MONGO_URI = os.getenv("MONGO_URI")
 CONFIG_PATH = os.getenv("MONGO_CONFIG_PATH", "mongo_config.json")
 
 
@@ -20,7 +22,79 @@ def load_mongo_config():
         return json.load(f)
 
 
+def load_rag_config(config_path: str = None) -> dict:
+    """agentic_rag/mongo_config.json (or config_path) without importing the store pipeline (no API key needed)."""
+    config_path = config_path or os.path.join(os.path.dirname(__file__), "mongo_config.json")
+    with open(config_path, "r") as f:
+        return json.load(f)
+
+
+# ============================
+# 🔌 Shared MongoDB Client
+# ============================
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_mongo_uri() -> str:
+    """MONGODB_URI is canonical; MONGO_URI is still accepted for older .env files."""
+    uri = os.getenv("MONGODB_URI") or os.getenv("MONGO_URI")
+    if not uri:
+        raise EnvironmentError("❌ MONGODB_URI (or MONGO_URI) not set in .env")
+    return uri
+
+
+def get_client_options() -> dict:
+    """Pool size and timeouts, tunable through env."""
+    return {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_MS", "300000")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+        "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000")),
+        "retryWrites": True,
+        "retryReads": True,
+    }
+
+
+def get_mongo_client() -> MongoClient:
+    """
+    One pooled MongoClient per process. Re-created after fork, since
+    MongoClient instances are not fork-safe.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            _client = MongoClient(get_mongo_uri(), **get_client_options())
+            _client_pid = pid
+            logging.info(f"🔌 MongoClient created (pid={pid}, pool={_client.options.pool_options.max_pool_size})")
+        return _client
+
+
+def close_mongo_client():
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client, _client_pid = None, None
+
+
+def check_mongo_health() -> dict:
+    """Ping the cluster through the shared client; never raises."""
+    start = time.perf_counter()
+    try:
+        get_mongo_client().admin.command("ping")
+        return {"ok": True, "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+    except Exception as e:
+        return {"ok": False, "error": str(e), "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+
 def connect_to_mongo(collection_name: str):
-    client = MongoClient(MONGO_URI)
+    client = get_mongo_client()
     db = client["agentic_rag_vectors"]  # ✅ hardcoded default DB
     return db[collection_name]
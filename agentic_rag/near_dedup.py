@@ -0,0 +1,367 @@
+# near_dedup.py
+
+"""
+Near-duplicate chunk suppression (MinHash + LSH) for the STORE pipeline.
+- Each new chunk gets a MinHash signature over word shingles (chunks without
+  words are passed through: they would all share one constant signature)
+- Signatures are cut into LSH bands; with "skip" / "link" the signature and band
+  keys are stored on the chunk (metadata.minhash / metadata.lsh_bands, multikey-indexed)
+  → the per-subject LSH index lives in the collection itself
+- Per window: one $in query on the window's band keys finds candidates,
+  estimated Jaccard >= threshold marks a near duplicate
+- Candidates are scoped like exact dedup (chunk_dedup.dedup_scope: subject, user_id,
+  embedding model, dims): retrieval filters on user_id and never resolves links, so a
+  match owned by another user would make this user's content disappear
+- Stored chunks of an earlier version of the same file (same source_file + user_id,
+  other file_hash) are never candidates: update mode deletes them after the new
+  version is stored, so skipping / linking against them would lose the content
+- action: "skip" (drop), "link" (reference doc like exact dedup) or
+  "dry_run" (store anyway, write a report to the logs DB). Dry runs persist nothing
+  on the chunks and only compare within the window plus already backfilled signatures
+  (when the LSH index exists); use backfill + report for a corpus-wide estimate
+
+Settings: "near_dedup" block (global or per subject) in mongo_config.json.
+
+Usage (existing data):
+    python -m agentic_rag.near_dedup backfill default   # add signatures to stored chunks
+    python -m agentic_rag.near_dedup report default     # near-duplicate groups (dry run)
+"""
+
+import re
+import sys
+import zlib
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+from pymongo import ASCENDING, UpdateOne
+
+from agentic_rag.mongo_utils import get_mongo_client
+
+DEFAULT_SETTINGS = {
+    "enabled": False,
+    "threshold": 0.85,
+    "num_perm": 64,
+    "bands": 16,
+    "shingle_words": 3,
+    "action": "dry_run",         # skip | link | dry_run
+    "max_report_matches": 500,
+}
+NEAR_DEDUP_ACTIONS = ("skip", "link", "dry_run")
+
+_PRIME = (1 << 31) - 1
+_PERMS = {}
+_INDEXED = set()
+_NO_INDEX = set()
+_LOCK = threading.Lock()
+_WORD = re.compile(r"\w+")
+
+
+def get_near_dedup_settings(config: dict, subject_config: dict) -> dict:
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update((config or {}).get("near_dedup", {}))
+    settings.update((subject_config or {}).get("near_dedup", {}))
+    if settings["action"] not in NEAR_DEDUP_ACTIONS:
+        raise ValueError(f"Unsupported near_dedup action '{settings['action']}' (expected one of {NEAR_DEDUP_ACTIONS})")
+    if settings["num_perm"] % settings["bands"]:
+        raise ValueError("near_dedup num_perm must be a multiple of bands")
+    return settings
+
+
+# ============================
+# 🔢 MinHash + LSH bands
+# ============================
+def _permutations(num_perm: int):
+    with _LOCK:
+        if num_perm not in _PERMS:
+            rng = np.random.default_rng(1234567)  # fixed → signatures comparable across processes
+            a = rng.integers(1, _PRIME, size=num_perm, dtype=np.int64)
+            b = rng.integers(0, _PRIME, size=num_perm, dtype=np.int64)
+            _PERMS[num_perm] = (a[:, None], b[:, None])
+        return _PERMS[num_perm]
+
+
+def shingles(text: str, size: int = 3) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash_signature(text: str, num_perm: int = 64, shingle_words: int = 3) -> list:
+    values = np.fromiter((zlib.crc32(s.encode("utf-8")) % _PRIME for s in shingles(text, shingle_words)), dtype=np.int64)
+    if values.size == 0:
+        return [int(_PRIME)] * num_perm
+    a, b = _permutations(num_perm)
+    return ((a * values[None, :] + b) % _PRIME).min(axis=1).tolist()
+
+
+def lsh_band_keys(signature: list, bands: int) -> list:
+    rows = len(signature) // bands
+    keys = []
+    for band in range(bands):
+        chunk = ",".join(map(str, signature[band * rows:(band + 1) * rows]))
+        keys.append(f"{band}:{hashlib.md5(chunk.encode()).hexdigest()[:16]}")
+    return keys
+
+
+def stores_signatures(settings: dict) -> bool:
+    """Signatures / band keys live on the chunks only when they are acted on (~1.3 KB per chunk + index)."""
+    return settings["enabled"] and settings["action"] != "dry_run"
+
+
+def has_words(text: str) -> bool:
+    return _WORD.search(text) is not None
+
+
+def estimate_jaccard(sig_a: list, sig_b: list) -> float:
+    return float(np.mean(np.asarray(sig_a) == np.asarray(sig_b)))
+
+
+def _has_lsh_index(collection) -> bool:
+    """Checked once per collection and process (dry runs only query backfilled signatures through the index)."""
+    key = (collection.database.name, collection.name)
+    with _LOCK:
+        if key in _INDEXED or key in _NO_INDEX:
+            return key in _INDEXED
+    try:
+        found = "lsh_bands_1" in collection.index_information()
+    except Exception:
+        found = False
+    with _LOCK:
+        (_INDEXED if found else _NO_INDEX).add(key)
+    return found
+
+
+def _ensure_index(collection):
+    key = (collection.database.name, collection.name)
+    with _LOCK:
+        if key in _INDEXED:
+            return
+        try:
+            collection.create_index([("metadata.lsh_bands", ASCENDING)], name="lsh_bands_1", sparse=True)
+        except Exception as e:
+            logging.warning(f"⚠️ Could not ensure LSH index on {collection.name}: {e}")
+        _INDEXED.add(key)
+
+
+# ============================
+# 🧹 Store-time filter
+# ============================
+class NearChunkDedup:
+    """Per-file helper: split() before embedding, annotate() the embedded docs, commit() after insert."""
+
+    def __init__(self, config: dict, subject: str, metadata: dict, settings: dict, scope: dict):
+        db_config = config.get(subject, config["default"])
+        db = get_mongo_client()[db_config["db_name"]]
+        self.collection = db[db_config["collection_name"]]
+        self.refs = db[db_config.get("refs_collection_name", db_config["collection_name"] + "_refs")]
+        self.logs = get_mongo_client()[config["logs"]["db_name"]][config["logs"].get("near_dedup_reports", "near_dedup_reports")]
+        self.persist = stores_signatures(settings)
+        if self.persist:
+            _ensure_index(self.collection)
+        self.subject = subject
+        self.metadata = metadata
+        self.settings = settings
+        self.scope = scope         # see chunk_dedup.dedup_scope
+        self.signatures = {}       # chunk_index → (signature, band keys) for chunks about to be stored
+        self.pending = []          # (chunk_index, chunk_id, similarity) for "link"
+        self.matches = []          # report entries
+        self.suppressed = 0
+
+    def _is_previous_version(self, doc: dict) -> bool:
+        return (doc.get("source_file") == self.metadata.get("file_name") and doc.get("user_id") == self.metadata.get("user_id")
+                and doc.get("file_hash") != self.metadata.get("file_hash"))
+
+    def _stored_candidates(self, all_keys: list) -> dict:
+        """band key → [(doc_id, signature, source_file)] from chunks already stored."""
+        candidates = {}
+        if not all_keys or not (self.persist or _has_lsh_index(self.collection)):
+            return candidates     # dry run without backfilled signatures → no unindexed scan
+        cursor = self.collection.find({"metadata.lsh_bands": {"$in": all_keys}, **self.scope},
+                                      {"metadata.minhash": 1, "metadata.lsh_bands": 1, "source_file": 1,
+                                       "user_id": 1, "file_hash": 1})
+        for doc in cursor:
+            if self._is_previous_version(doc):
+                continue
+            meta = doc.get("metadata") or {}
+            for key in meta.get("lsh_bands", []):
+                candidates.setdefault(key, []).append((doc["_id"], meta.get("minhash"), doc.get("source_file")))
+        return candidates
+
+    def split(self, chunks: list, indices: list) -> (list, list):
+        s = self.settings
+        sigs = [minhash_signature(c, s["num_perm"], s["shingle_words"]) if has_words(c) else None for c in chunks]
+        bands = [lsh_band_keys(sig, s["bands"]) if sig is not None else [] for sig in sigs]
+        candidates = self._stored_candidates(list({k for keys in bands for k in keys}))
+
+        fresh, fresh_indices = [], []
+        for chunk, idx, sig, keys in zip(chunks, indices, sigs, bands):
+            if sig is None:
+                fresh.append(chunk)
+                fresh_indices.append(idx)
+                continue
+            best = None
+            for key in keys:
+                for doc_id, other_sig, source_file in candidates.get(key, []):
+                    if other_sig is None:
+                        continue
+                    similarity = estimate_jaccard(sig, other_sig)
+                    if similarity >= s["threshold"] and (best is None or similarity > best[1]):
+                        best = (doc_id, similarity, source_file)
+            if best is not None:
+                self._record(idx, chunk, best)
+                if s["action"] != "dry_run":
+                    continue
+            fresh.append(chunk)
+            fresh_indices.append(idx)
+            if self.persist:
+                self.signatures[idx] = (sig, keys)
+            # Later chunks of the same window can match this one
+            for key in keys:
+                candidates.setdefault(key, []).append((("window", idx), sig, self.metadata.get("file_name")))
+        return fresh, fresh_indices
+
+    def _record(self, idx: int, chunk: str, best: tuple):
+        doc_id, similarity, source_file = best
+        self.suppressed += 1
+        if len(self.matches) < self.settings["max_report_matches"]:
+            duplicate_of = f"chunk #{doc_id[1]} of this file" if isinstance(doc_id, tuple) else doc_id
+            self.matches.append({"chunk_index": idx, "duplicate_of": duplicate_of, "duplicate_source": source_file,
+                                 "similarity": round(similarity, 3), "preview": chunk[:120]})
+        if self.settings["action"] == "link":
+            self.pending.append((idx, doc_id, similarity))
+
+    def annotate(self, docs: list):
+        """Attach signatures + band keys so later chunks can find these ones."""
+        for doc in docs:
+            sig, keys = self.signatures.pop(doc["chunk_index"], (None, None))
+            if sig is not None:
+                doc["metadata"]["minhash"] = sig
+                doc["metadata"]["lsh_bands"] = keys
+
+    def commit(self, stored_docs: list) -> int:
+        """Write link references for the last split (window-local matches resolve to the inserted _id)."""
+        inserted = {doc["chunk_index"]: doc["_id"] for doc in stored_docs if "_id" in doc}
+        now = datetime.now(timezone.utc)
+        refs = []
+        for idx, chunk_id, similarity in self.pending:
+            if isinstance(chunk_id, tuple):
+                chunk_id = inserted.get(chunk_id[1])
+            if chunk_id is None:
+                continue
+            refs.append({
+                "chunk_id": chunk_id,
+                "near_duplicate": True,
+                "similarity": round(similarity, 3),
+                "subject": self.subject,
+                "source_file": self.metadata.get("file_name"),
+                "file_hash": self.metadata.get("file_hash"),
+                "user_id": self.metadata.get("user_id"),
+                "chunk_index": idx,
+                "upload_time": now.isoformat(),
+                "upload_ts": now.timestamp(),
+            })
+        if refs:
+            self.refs.insert_many(refs)
+        self.pending = []
+        return len(refs)
+
+    def merge(self, other: "NearChunkDedup"):
+        """Fold another (per-window) helper's findings into this one (ingest engine)."""
+        self.suppressed += other.suppressed
+        room = self.settings["max_report_matches"] - len(self.matches)
+        self.matches.extend(other.matches[:max(room, 0)])
+
+    def finish(self, job_id: str = None) -> dict:
+        """Summary for the store log; dry runs also persist the match report."""
+        summary = {"near_duplicates": self.suppressed, "near_dedup_action": self.settings["action"]}
+        if self.suppressed:
+            print(f"🪞 {self.suppressed} near-duplicate chunks (action={self.settings['action']}, "
+                  f"threshold={self.settings['threshold']})")
+        if self.settings["action"] == "dry_run" and self.matches:
+            self.logs.insert_one({
+                "job_id": job_id,
+                "subject": self.subject,
+                "source_file": self.metadata.get("file_name"),
+                "file_hash": self.metadata.get("file_hash"),
+                "threshold": self.settings["threshold"],
+                "near_duplicates": self.suppressed,
+                "matches": self.matches,
+                "created_at": datetime.utcnow(),
+            })
+        return summary
+
+
+# ============================
+# 🛠️ Existing data: backfill + report
+# ============================
+def backfill_signatures(collection, settings: dict, batch_size: int = 500) -> int:
+    _ensure_index(collection)
+    ops, done = [], 0
+    for doc in collection.find({"metadata.minhash": {"$exists": False}}, {"chunk_text": 1}):
+        if not has_words(doc.get("chunk_text", "")):
+            continue
+        sig = minhash_signature(doc.get("chunk_text", ""), settings["num_perm"], settings["shingle_words"])
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"metadata.minhash": sig,
+                                                            "metadata.lsh_bands": lsh_band_keys(sig, settings["bands"])}}))
+        if len(ops) >= batch_size:
+            collection.bulk_write(ops, ordered=False)
+            done, ops = done + len(ops), []
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+        done += len(ops)
+    return done
+
+
+def near_duplicate_report(collection, settings: dict) -> list:
+    """Groups of stored chunks whose estimated Jaccard >= threshold (uses stored signatures)."""
+    buckets, sigs, info = {}, {}, {}
+    for doc in collection.find({"metadata.minhash": {"$exists": True}},
+                               {"metadata.minhash": 1, "metadata.lsh_bands": 1, "source_file": 1, "chunk_index": 1}):
+        sigs[doc["_id"]] = doc["metadata"]["minhash"]
+        info[doc["_id"]] = (doc.get("source_file"), doc.get("chunk_index"))
+        for key in doc["metadata"].get("lsh_bands", []):
+            buckets.setdefault(key, []).append(doc["_id"])
+
+    parent = {}
+
+    def find(x):
+        while parent.get(x, x) != x:
+            x = parent[x]
+        return x
+
+    for ids in buckets.values():
+        for other in ids[1:]:
+            if estimate_jaccard(sigs[ids[0]], sigs[other]) >= settings["threshold"]:
+                parent[find(other)] = find(ids[0])
+    groups = {}
+    for doc_id in sigs:
+        groups.setdefault(find(doc_id), []).append(doc_id)
+    return [[{"_id": str(i), "source_file": info[i][0], "chunk_index": info[i][1]} for i in group]
+            for group in groups.values() if len(group) > 1]
+
+
+if __name__ == "__main__":
+    from agentic_rag.mongo_utils import load_mongo_config
+    import os
+
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] not in ("backfill", "report"):
+        print("Usage: python -m agentic_rag.near_dedup backfill|report <subject>")
+        sys.exit(1)
+    os.environ.setdefault("MONGO_CONFIG_PATH", os.path.join(os.path.dirname(__file__), "mongo_config.json"))
+    config = load_mongo_config()
+    subject_config = config.get(args[1], config["default"])
+    settings = get_near_dedup_settings(config, subject_config)
+    collection = get_mongo_client()[subject_config["db_name"]][subject_config["collection_name"]]
+    if args[0] == "backfill":
+        print(f"✅ Added signatures to {backfill_signatures(collection, settings)} chunks")
+    else:
+        groups = near_duplicate_report(collection, settings)
+        print(f"🪞 {len(groups)} near-duplicate groups (threshold={settings['threshold']}) "
+              f"| {sum(len(g) - 1 for g in groups)} redundant chunks")
+        for group in groups[:50]:
+            print("  - " + " | ".join(f"{g['source_file']}#{g['chunk_index']}" for g in group))
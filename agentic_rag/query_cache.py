@@ -0,0 +1,106 @@
+# query_cache.py
+
+"""
+Query-embedding cache for the RETRIEVE path.
+- In-process LRU with TTL, keyed by (provider, normalized query text)
+- Optionally backed by the on-disk EmbeddingCache so every uvicorn
+  worker on the node shares hits
+"""
+
+import os
+import re
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from langchain_core.embeddings import Embeddings
+
+from agentic_rag.embedding_cache import text_hash
+
+
+def normalize_query(text: str) -> str:
+    """Case/whitespace/trailing-punctuation insensitive form of a query."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip("?!. ")
+
+
+class QueryEmbeddingCache:
+    def __init__(self, max_entries: int = None, ttl_seconds: float = None):
+        self.max_entries = max_entries or int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "1024"))
+        self.ttl = ttl_seconds if ttl_seconds is not None else float(os.getenv("QUERY_CACHE_TTL_S", "3600"))
+        self.entries = OrderedDict()  # key → (vector, expires_at)
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "shared_hits": 0, "evictions": 0}
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                self.stats["misses"] += 1
+                return None
+            vector, expires_at = item
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return vector
+
+    def put(self, key, vector, shared_hit: bool = False):
+        with self.lock:
+            if shared_hit:
+                self.stats["shared_hits"] += 1
+            self.entries[key] = (vector, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {**self.stats, "entries": len(self.entries), "max_entries": self.max_entries, "ttl_s": self.ttl}
+
+
+_QUERY_CACHE = QueryEmbeddingCache()
+
+
+def get_query_cache() -> QueryEmbeddingCache:
+    return _QUERY_CACHE
+
+
+class QueryCachedEmbeddings(Embeddings):
+    """Embeddings wrapper: memory LRU → shared on-disk store → provider."""
+
+    def __init__(self, base, provider: str, model: str, cache: QueryEmbeddingCache = None, shared=None):
+        self.base = base
+        self.provider = provider
+        self.model = model
+        self.cache = cache or get_query_cache()
+        self.shared = shared
+
+    def embed_documents(self, texts: list) -> list:
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list:
+        normalized = normalize_query(text)
+        key = (self.provider, self.model, normalized)
+        vector = self.cache.get(key)
+        if vector is not None:
+            return vector
+
+        shared_key = text_hash(normalized)
+        if self.shared is not None:
+            hit = self.shared.get_many(self.provider, self.model, [shared_key])
+            if shared_key in hit:
+                self.cache.put(key, hit[shared_key], shared_hit=True)
+                return hit[shared_key]
+
+        vector = self.base.embed_query(text)
+        self.cache.put(key, vector)
+        if self.shared is not None:
+            self.shared.put_many(self.provider, self.model, {shared_key: vector})
+        return vector
@@ -2,13 +2,12 @@ import os
 from typing import Optional, List
 from langchain_core.documents import Document
 from agentic_rag.mongo_utils import load_mongo_config
-from agentic_rag.retriever_factory import get_retriever_model
-from agentic_rag.log_utils import log_retrieve_event, clean_logs_once_per_day
+from agentic_rag.retriever_factory import get_retriever_entry, search_by_vector
+from agentic_rag.log_utils import log_retrieve_event
 from langchain_openai import ChatOpenAI
 
-# These would typically come from your actual store logic module:
-from agentic_rag.attachment_handlers import load_file  # assumed function to load and chunk
-from agentic_rag.embedding_factory import embed_and_store  # assumed function to embed and write to DB
+from agentic_rag.store_pipeline import store_pipeline, load_config
+from agentic_rag.ingest_jobs import create_job, get_job, get_job_progress, get_store_pool
 
 class MasterRAGAgent:
     def __init__(self, embedding_provider: str = "gpt"):
@@ -16,42 +15,49 @@ class MasterRAGAgent:
         self.config = load_mongo_config()
         self.llm = ChatOpenAI(model_name="gpt-4", temperature=0)
 
-    def run(self, query: Optional[str] = None, mode: str = "auto", file: Optional[str] = None):
+    def run(self, query: Optional[str] = None, mode: str = "auto", file: Optional[str] = None,
+            filters: Optional[dict] = None):
         """
         Entry point. Determines mode and executes STORE or RETRIEVE.
         - mode: "auto", "store", "retrieve"
+        - filters: RETRIEVE pre-filters (see run_retrieve)
         """
         if mode == "store" or (mode == "auto" and file):
             return self.run_store(file)
         elif mode == "retrieve" or (mode == "auto" and query):
-            return self.run_retrieve(query)
+            return self.run_retrieve(query, filters=filters)
         else:
             raise ValueError("[RAG AGENT] Could not determine mode — please pass a query or file.")
 
-    def run_store(self, file_path: str):
+    def run_store(self, file_path: str, user_id: str = "rag_agent"):
+        """Synchronous STORE (scripts / tests). Subject routing happens inside store_pipeline."""
         print(f"[STORE] Processing file: {file_path}")
-        # Step 1: Load and chunk file
-        chunks, metadata = load_file(file_path)  # returns List[Document], metadata: Dict
-
-        # Step 2: Classify subject (based on filename or content)
-        subject = self.classify_subject(file_path, metadata)
-
-        # Step 3: Embed and write to MongoDB
-        embed_and_store(
-            documents=chunks,
-            subject=subject,
-            provider=self.provider
-        )
-
-        print(f"[STORE] Stored {len(chunks)} chunks under subject '{subject}'")
-        return f"✅ Stored {len(chunks)} chunks under subject '{subject}'"
-
-    def run_retrieve(self, query: str):
+        job_id = store_pipeline(file_path=file_path, user_id=user_id, config_path=None)
+        if job_id is None:
+            return f"⚠️ Skipped {os.path.basename(file_path)} (duplicate, empty or already running)"
+        progress = get_job_progress(get_job(load_config()["logs"], job_id))
+        summary = (f"Stored {progress['chunks_embedded']} new chunks ({progress['chunks_committed']} processed) "
+                   f"under subject '{progress['subject']}'")
+        print(f"[STORE] {summary}")
+        return f"✅ {summary}"
+
+    def submit_store(self, file_path: str, user_id: str = "rag_agent") -> str:
+        """Queue a STORE on the background worker pool; poll with get_job_progress(job_id)."""
+        job_id = create_job(load_config()["logs"], file_path, user_id, source="agent")
+        get_store_pool().submit(job_id, file_path, user_id)
+        return job_id
+
+    def run_retrieve(self, query: str, filters: Optional[dict] = None, num_candidates: Optional[int] = None):
+        """
+        filters → pre-filters inside $vectorSearch on the index filter fields
+        (subject, user_id, source_file, upload_ts), e.g. {"user_id": "u1"}.
+        """
         subject = self.detect_subject_from_query(query)
-        retriever = get_retriever_model(subject, self.provider)
+        entry = get_retriever_entry(subject, self.provider)
 
         try:
-            matched_docs = retriever.invoke(query)
+            matched_docs = search_by_vector(subject, self.provider, entry["embedding"].embed_query(query),
+                                            filters=filters, num_candidates=num_candidates)
         except Exception as e:
             if "indexed with" in str(e) and "queried with" in str(e):
                 raise RuntimeError(
@@ -62,8 +68,7 @@ class MasterRAGAgent:
         self.evaluate_retrieve_quality(matched_docs)
         final_answer = self.synthesize_with_llm(query, matched_docs)
 
-        clean_logs_once_per_day()
-        log_retrieve_event(query, subject, len(matched_docs), self.provider)
+        log_retrieve_event(query, subject, len(matched_docs), self.provider, filters=filters)
 
         return final_answer
 
@@ -1,17 +1,24 @@
 # retrieve_pipeline.py
 
 import os
-from agentic_rag.retriever_factory import get_retriever_model
+import json
+from agentic_rag.retriever_factory import get_retriever_entry, search_by_vector
+from agentic_rag.answer_cache import get_answer_cache, get_answer_cache_settings
 from agentic_rag.mongo_utils import load_mongo_config
-from agentic_rag.log_utils import log_retrieve_event, purge_old_logs, clean_logs_once_per_day
+from agentic_rag.log_utils import log_retrieve_event
 
 from datetime import timedelta, datetime
 from langchain_openai import ChatOpenAI  # ✅ Updated import
 
-def retrieve_answer(user_query: str, subject_hint: str = None):
+def retrieve_answer(user_query: str, subject_hint: str = None, filters: dict = None, num_candidates: int = None):
+    """
+    filters: pre-filters on the vector index filter fields, e.g.
+             {"user_id": "u1", "source_file": ["a.pdf"], "upload_ts": {"$gte": 1717000000}}
+    num_candidates: $vectorSearch numCandidates (default k * num_candidates_factor)
+    """
     # 1. Load config and setup
     config = load_mongo_config()
-    provider = os.getenv("EMBEDDING_PROVIDER", "gpt")
+    provider = os.getenv("EMBEDDING_PROVIDER", "gpt").lower()
 
     # 2. Detect subject or use hint
     subject = detect_subject_from_query(user_query, subject_hint, config)
@@ -25,13 +32,23 @@ def retrieve_answer(user_query: str, subject_hint: str = None):
         if not subject_config:
             raise ValueError("[RETRIEVE ERROR] No valid subject config found (neither detected nor default).")
 
-    # 3. Get retriever (handles index, collection internally)
-    retriever = get_retriever_model(subject, provider)
+    # 3. Get retriever (handles index, collection internally; cached per subject/provider)
+    retriever_entry = get_retriever_entry(subject, provider)
 
-
-    # 4. Retrieve documents from vector DB
+    # 4. Embed query once, then try the semantic answer cache
     try:
-        matched_docs = retriever.invoke(user_query)
+        query_vector = retriever_entry["embedding"].embed_query(user_query)
+        cache_settings = get_answer_cache_settings(config, subject)
+        # Answers retrieved under different filters (e.g. another user's files) never mix
+        cache_scope = json.dumps(filters, sort_keys=True, default=str) if filters else ""
+        cached = get_answer_cache().lookup(subject, provider, query_vector, cache_settings, scope=cache_scope)
+        if cached:
+            print(f"[CACHE] Semantic answer hit (similarity={cached['similarity']:.3f}) for subject={subject}")
+            log_retrieve_action(user_query, subject, len(cached["chunk_ids"]), provider, cache_hit=True, filters=filters)
+            return cached["answer"]
+
+        # 5. Retrieve documents from vector DB (filters applied inside $vectorSearch)
+        matched_docs = search_by_vector(subject, provider, query_vector, filters=filters, num_candidates=num_candidates)
     except Exception as e:
         if "indexed with" in str(e) and "queried with" in str(e):
             raise RuntimeError(
@@ -45,12 +62,15 @@ def retrieve_answer(user_query: str, subject_hint: str = None):
     for doc in matched_docs:
         print("-", doc.page_content[:100])
 
-    # 5. Synthesize final answer
+    # 6. Synthesize final answer
     llm = ChatOpenAI(model_name="gpt-4", temperature=0)
     final_response = synthesize_with_llm(user_query, matched_docs, llm)
 
-    # 6. Log retrieve event
-    log_retrieve_action(user_query, subject, len(matched_docs), provider)
+    # 7. Cache answer + log retrieve event
+    chunk_ids = [str(doc.metadata.get("_id")) for doc in matched_docs]
+    get_answer_cache().store(subject, provider, user_query, query_vector, chunk_ids, final_response, cache_settings,
+                             scope=cache_scope)
+    log_retrieve_action(user_query, subject, len(matched_docs), provider, filters=filters)
 
     return final_response
 
@@ -89,9 +109,8 @@ def synthesize_with_llm(query: str, docs, llm):
     return response.content.strip()
 
 
-def log_retrieve_action(query, subject, num_results, provider):
-    clean_logs_once_per_day()
-
-    log_retrieve_event(query, subject, num_results, provider)
-    print(f"[RETRIEVE] Logged + Cleaned | Query='{query}' | Subject={subject} | Matches={num_results} | Provider={provider}")
+def log_retrieve_action(query, subject, num_results, provider, cache_hit=False, filters=None):
+    # Retention is handled by the TTL / time-series expiry on retrieve_logs (log_retention.py)
+    log_retrieve_event(query, subject, num_results, provider, cache_hit=cache_hit, filters=filters)
+    print(f"[RETRIEVE] Logged | Query='{query}' | Subject={subject} | Matches={num_results} | Provider={provider}")
 
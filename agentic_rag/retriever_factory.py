@@ -4,35 +4,71 @@ from langchain_mongodb import MongoDBAtlasVectorSearch
 # from langchain_community.embeddings import OpenAIEmbeddings
 from langchain_openai import OpenAIEmbeddings
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from typing import Any, List, Optional
 
-from pymongo import MongoClient
+from agentic_rag.mongo_utils import get_mongo_client
+from agentic_rag.embedding_cache import get_embedding_cache
+from agentic_rag.query_cache import QueryCachedEmbeddings, get_query_cache
+from agentic_rag.local_ann import get_local_index
+from agentic_rag.flat_vector_store import FlatVectorStore
+from agentic_rag.vector_codec import get_vector_encoding, encode_vector
+from agentic_rag.dim_reduction import get_reducer, reduce_vector
+from agentic_rag.index_manager import get_vector_index_settings
 from dotenv import load_dotenv
-import os, json
+import os, json, time, threading
 
 # Load env variables
 load_dotenv()
-MONGO_URI = os.getenv("MONGO_URI")
 
 # Load mongo_config.json
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "mongo_config.json")
 with open(CONFIG_PATH, "r") as f:
     CONFIG = json.load(f)
 
+# ============================
+# 🗃️ Retriever Registry
+# ============================
+# (subject, provider) → {"vectorstore", "retriever", "embedding", "collection", "index_name",
+#                        "vector_encoding", "flat_store", "reducer", "filter_fields"}
+_REGISTRY = {}
+_REGISTRY_LOCK = threading.Lock()
+_STATS = {"builds": 0, "reuses": 0, "invalidations": 0}
 
-def get_retriever_model(subject: str, provider: str):
-    provider = provider.lower()
-    subject_config = CONFIG.get(subject, CONFIG.get("default"))
+DEFAULT_K = 5
+MAX_NUM_CANDIDATES = 10000      # Atlas $vectorSearch limit
+FILTER_OPERATORS = ("$eq", "$ne", "$in", "$nin", "$gt", "$gte", "$lt", "$lte")
 
-    db_name = subject_config["db_name"]
-    index_name = subject_config["index_name"]
-    collection_name = subject_config["collection_name"]
+CONFIG_CHECK_INTERVAL = float(os.getenv("RETRIEVER_CONFIG_CHECK_INTERVAL", "2"))
+_config_mtime = os.path.getmtime(CONFIG_PATH)
+_config_checked_at = time.monotonic()
 
-    print(f"[DEBUG] Building retriever for subject={subject}, index={index_name}, provider={provider}")
 
+def _refresh_config_if_changed():
+    """Reload mongo_config.json and drop cached retrievers when the file changes."""
+    global CONFIG, _config_mtime, _config_checked_at
+    now = time.monotonic()
+    if now - _config_checked_at < CONFIG_CHECK_INTERVAL:
+        return
+    _config_checked_at = now
+    try:
+        mtime = os.path.getmtime(CONFIG_PATH)
+    except OSError:
+        return
+    if mtime == _config_mtime:
+        return
+    with open(CONFIG_PATH, "r") as f:
+        new_config = json.load(f)
+    with _REGISTRY_LOCK:
+        CONFIG = new_config
+        _config_mtime = mtime
+        _REGISTRY.clear()
+        _STATS["invalidations"] += 1
+    print("[DEBUG] mongo_config.json changed → retriever registry invalidated")
 
-    client = MongoClient(MONGO_URI)
-    collection = client[db_name][collection_name]
 
+def _build_embedding_model(provider: str):
     # Select embedding provider
     if provider == "gpt":
         embedding_model = OpenAIEmbeddings()
@@ -41,6 +77,52 @@ def get_retriever_model(subject: str, provider: str):
     else:
         raise ValueError(f"Unsupported provider: {provider}")
 
+    # ✅ Query cache: in-process LRU/TTL on normalized text, backed by the on-disk
+    # embedding cache (query vectors get their own namespace: task type differs from stored chunks)
+    shared = get_embedding_cache() if os.getenv("QUERY_CACHE_SHARED", "true").lower() == "true" else None
+    model_name = getattr(embedding_model, "model", None) or embedding_model.__class__.__name__
+    return QueryCachedEmbeddings(embedding_model, provider, f"query:{model_name}", get_query_cache(), shared)
+
+
+def get_retriever_backend(subject_config: dict) -> str:
+    """"atlas" (default) or "flat" (memory-mapped export); env RETRIEVER_BACKEND wins."""
+    return (os.getenv("RETRIEVER_BACKEND") or subject_config.get("retriever_backend", "atlas")).lower()
+
+
+def _build_flat_entry(subject: str, provider: str) -> dict:
+    print(f"[DEBUG] Building flat-file retriever for subject={subject}, provider={provider}")
+    subject_config = CONFIG.get(subject, CONFIG.get("default"))
+    store = FlatVectorStore.open(subject, CONFIG)
+    embedding_model = _build_embedding_model(provider)
+    return {
+        "vectorstore": None,
+        # ✅ Via search_by_vector so the subject's dim reduction is applied to the query
+        "retriever": VectorSearchRetriever(subject=subject, provider=provider, embedding=embedding_model, k=DEFAULT_K),
+        "embedding": embedding_model,
+        "collection": None,
+        "index_name": None,
+        "vector_encoding": "list",
+        "flat_store": store,
+        "reducer": get_reducer(subject_config),
+        "filter_fields": get_vector_index_settings(CONFIG, subject_config, provider)["filter_fields"],
+    }
+
+
+def _build_retriever_entry(subject: str, provider: str) -> dict:
+    subject_config = CONFIG.get(subject, CONFIG.get("default"))
+    if get_retriever_backend(subject_config) == "flat":
+        return _build_flat_entry(subject, provider)
+
+    db_name = subject_config["db_name"]
+    index_name = subject_config["index_name"]
+    collection_name = subject_config["collection_name"]
+
+    print(f"[DEBUG] Building retriever for subject={subject}, index={index_name}, provider={provider}")
+
+    client = get_mongo_client()
+    collection = client[db_name][collection_name]
+    embedding_model = _build_embedding_model(provider)
+
     # Build vector retriever
 
     # vectorstore = MongoDBAtlasVectorSearch(
@@ -65,4 +147,152 @@ def get_retriever_model(subject: str, provider: str):
         else:
             raise  # propagate unrelated errors
 
-    return vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 5})
+    return {
+        "vectorstore": vectorstore,
+        # ✅ Routed through search_by_vector so packed vectors / local ANN work for every caller
+        "retriever": VectorSearchRetriever(subject=subject, provider=provider, embedding=embedding_model, k=DEFAULT_K),
+        "embedding": embedding_model,
+        "collection": collection,
+        "index_name": index_name,
+        "vector_encoding": get_vector_encoding(subject_config),
+        "flat_store": None,
+        "reducer": get_reducer(subject_config),
+        "filter_fields": get_vector_index_settings(CONFIG, subject_config, provider)["filter_fields"],
+        "num_candidates_factor": subject_config.get(
+            "num_candidates_factor", CONFIG.get("vector_search", {}).get("num_candidates_factor", 10)),
+    }
+
+
+def get_retriever_entry(subject: str, provider: str) -> dict:
+    """Cached registry entry (vector store, retriever, query embedder, collection)."""
+    provider = provider.lower()
+    _refresh_config_if_changed()
+    key = (subject, provider)
+
+    with _REGISTRY_LOCK:
+        entry = _REGISTRY.get(key)
+        if entry is not None:
+            _STATS["reuses"] += 1
+            return entry
+
+    # Build outside the lock (network + client construction), first writer wins
+    entry = _build_retriever_entry(subject, provider)
+    with _REGISTRY_LOCK:
+        existing = _REGISTRY.get(key)
+        if existing is not None:
+            _STATS["reuses"] += 1
+            return existing
+        _REGISTRY[key] = entry
+        _STATS["builds"] += 1
+    return entry
+
+
+def get_vector_store(subject: str, provider: str):
+    """Cached MongoDBAtlasVectorSearch for (subject, provider)."""
+    return get_retriever_entry(subject, provider)["vectorstore"]
+
+
+def get_retriever_model(subject: str, provider: str):
+    """Cached retriever for (subject, provider); built once per process."""
+    return get_retriever_entry(subject, provider)["retriever"]
+
+
+# ============================
+# 🔎 Metadata pre-filters
+# ============================
+def build_vector_filter(filters: dict, filter_fields: list) -> dict:
+    """
+    {"user_id": "u1", "source_file": ["a.pdf", "b.pdf"], "upload_ts": {"$gte": t0}}
+    → $vectorSearch "filter" (plain values → $eq, lists → $in, dicts → their operators).
+    Only fields indexed as "filter" in the vector index are accepted (see index_manager).
+    """
+    clauses = []
+    for field, value in (filters or {}).items():
+        if field not in filter_fields:
+            raise ValueError(f"Field '{field}' is not a vector index filter field (allowed: {filter_fields})")
+        if isinstance(value, dict):
+            unknown = [op for op in value if op not in FILTER_OPERATORS]
+            if unknown:
+                raise ValueError(f"Unsupported filter operator(s) {unknown} on '{field}' (allowed: {FILTER_OPERATORS})")
+            clauses.append({field: dict(value)})
+        elif isinstance(value, (list, tuple, set)):
+            clauses.append({field: {"$in": list(value)}})
+        else:
+            clauses.append({field: {"$eq": value}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def search_by_vector(subject: str, provider: str, query_vector: list, k: int = DEFAULT_K,
+                     filters: dict = None, num_candidates: int = None) -> list:
+    """
+    Search with a precomputed query vector (lets callers reuse the embedding).
+    Uses the local ANN index when it is enabled and fresh, else Atlas $vectorSearch.
+    `filters` are pushed into $vectorSearch as pre-filters (candidates are restricted
+    before top-k); `num_candidates` defaults to k * "num_candidates_factor".
+    """
+    entry = get_retriever_entry(subject, provider)
+    # Stored vectors were truncated / projected → project the query the same way
+    query_vector = reduce_vector(query_vector, entry["reducer"])
+    vector_filter = build_vector_filter(filters, entry["filter_fields"])
+    if entry["flat_store"] is not None:
+        return entry["flat_store"].search(query_vector, k, vector_filter=vector_filter)
+
+    # The local HNSW mirror can't pre-filter → filtered searches always go to Atlas
+    local_index = get_local_index(subject, CONFIG) if vector_filter is None else None
+    if local_index is not None:
+        docs = local_index.search(query_vector, k)
+        if docs is not None:
+            print(f"[DEBUG] Local ANN search for subject={subject} → {len(docs)} docs")
+            return docs
+
+    num_candidates = min(max(num_candidates or k * entry["num_candidates_factor"], k), MAX_NUM_CANDIDATES)
+    vector_search = {
+        "index": entry["index_name"],
+        "path": "embedding",
+        # Query vector must match the stored encoding (int8 / bit indexes reject float arrays)
+        "queryVector": encode_vector(query_vector, entry["vector_encoding"]),
+        "numCandidates": num_candidates,
+        "limit": k,
+    }
+    if vector_filter is not None:
+        vector_search["filter"] = vector_filter
+    print(f"[DEBUG] $vectorSearch subject={subject} | numCandidates={num_candidates} | filter={vector_filter}")
+    pipeline = [
+        {"$vectorSearch": vector_search},
+        {"$set": {"score": {"$meta": "vectorSearchScore"}}},
+        {"$project": {"embedding": 0}},
+    ]
+    docs = []
+    for res in entry["collection"].aggregate(pipeline):
+        text = res.pop("chunk_text", "")
+        docs.append(Document(page_content=text, metadata=res))
+    return docs
+
+
+def get_retriever_stats() -> dict:
+    with _REGISTRY_LOCK:
+        stats = {**_STATS, "cached": sorted(_REGISTRY.keys())}
+    stats["query_cache"] = get_query_cache().get_stats()
+    return stats
+
+
+def clear_retriever_cache():
+    with _REGISTRY_LOCK:
+        _REGISTRY.clear()
+        _STATS["invalidations"] += 1
+
+
+class VectorSearchRetriever(BaseRetriever):
+    """LangChain retriever that embeds the query and delegates to search_by_vector."""
+    subject: str
+    provider: str
+    embedding: Any
+    k: int = DEFAULT_K
+    filters: Optional[dict] = None
+    num_candidates: Optional[int] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        return search_by_vector(self.subject, self.provider, self.embedding.embed_query(query), self.k,
+                                filters=self.filters, num_candidates=self.num_candidates)
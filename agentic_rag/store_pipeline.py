@@ -14,7 +14,7 @@ from pathlib import Path
 import json
 import traceback
 import logging
-from pymongo import MongoClient
+from itertools import islice
 from datetime import datetime, timezone
 
 from langchain_community.embeddings import OpenAIEmbeddings
@@ -25,11 +25,27 @@ from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
 from dotenv import load_dotenv
 
+from agentic_rag.mongo_utils import get_mongo_client as get_shared_mongo_client, load_rag_config
 from agentic_rag.embedding_factory import get_embedding_model, EmbeddingProvider
-
-def load_embedding_model():
+from agentic_rag.embedding_scheduler import EmbeddingError
+from agentic_rag.embedding_cache import get_embedding_cache, embed_with_cache
+from agentic_rag.answer_cache import invalidate_subject_answers
+from agentic_rag.local_ann import add_to_local_index
+from agentic_rag.vector_codec import get_vector_encoding, encode_vector
+from agentic_rag.dim_reduction import get_reducer, reduce_vectors
+from agentic_rag.chunkers import get_chunking_settings, make_chunk_iter
+from agentic_rag.ingest_jobs import claim_job, checkpoint_job, finish_job
+from agentic_rag.dedup_filter import get_dedup_index
+from agentic_rag.chunk_dedup import (ExactChunkDedup, dedup_scope, embedding_model_key, get_embedding_dims,
+                                     is_chunk_dedup_enabled, release_chunks)
+from agentic_rag.near_dedup import NearChunkDedup, get_near_dedup_settings
+from agentic_rag.bulk_writer import BulkWriter, BulkWriteFailed, get_bulk_write_settings
+from agentic_rag.log_sink import write_log
+from pymongo import UpdateOne
+
+def load_embedding_model(batch_limits: dict = None):
     provider = os.getenv("EMBEDDING_PROVIDER", "gpt").lower()
-    return get_embedding_model(provider)
+    return get_embedding_model(provider, batch_limits=batch_limits)
 
 # ============================
 # 🔐 Load environment
@@ -59,10 +75,8 @@ logging.basicConfig(**log_config)
 # 🔌 MongoDB Client
 # ============================
 def get_mongo_client():
-    uri = os.getenv("MONGODB_URI")
-    if not uri:
-        raise EnvironmentError("❌ MONGODB_URI not set in .env")
-    return MongoClient(uri)
+    # ✅ Process-wide pooled client (see mongo_utils)
+    return get_shared_mongo_client()
 
 
 # ============================================
@@ -70,11 +84,8 @@ def get_mongo_client():
 # ============================================
 
 def load_config(config_path=None):
-    if config_path is None:
-        base = os.path.dirname(__file__)
-        config_path = os.path.join(base, "mongo_config.json")
-    print("🔧 Loading configuration from:", config_path)
-    return json.load(open(config_path))
+    print("🔧 Loading configuration from:", config_path or "agentic_rag/mongo_config.json")
+    return load_rag_config(config_path)
 
 
 def extract_file_metadata(file_path: str, user_id: str) -> dict:
@@ -84,8 +95,12 @@ def extract_file_metadata(file_path: str, user_id: str) -> dict:
     upload_time_str = upload_dt.isoformat()
     upload_ts = upload_dt.timestamp()
 
+    # ✅ Stream the hash (constant memory for large files)
+    md5 = hashlib.md5()
     with open(file_path, "rb") as f:
-        file_hash = hashlib.md5(f.read()).hexdigest()
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            md5.update(block)
+    file_hash = md5.hexdigest()
     return {
         "file_name": file.name,
         "file_path": file_path,
@@ -101,12 +116,11 @@ def extract_file_metadata(file_path: str, user_id: str) -> dict:
 # 🗂️ Step 2: Log Metadata Check
 # ============================================
 def is_duplicate_upload(log_config, metadata) -> bool:
-    client = get_mongo_client()
-    logs_collection = client[log_config['db_name']][log_config['store_logs']]
-    result = logs_collection.find_one({"file_hash": metadata["file_hash"]})
+    # ✅ Bloom filter answers "definitely new" locally; "maybe" is confirmed via the file_hash index
+    result = get_dedup_index(log_config).is_duplicate(metadata["file_hash"])
     if result:
         print("⚠️ Duplicate file detected in logs.")
-    return result is not None
+    return result
 
 
 # ============================================
@@ -141,22 +155,31 @@ def chunk_text(text: str, chunk_size: int = 500, overlap: int = 100) -> list:
 # ============================================
 # 🧠 Step 4: Embedding (No Classification)
 # ============================================
-def embed_chunks(chunks: list, embedding_fn, subject: str, metadata=None) -> list:
+def embed_chunks(chunks: list, embedding_fn, subject: str, metadata=None, batch_embed_fn=None, cache=None, cache_namespace=None,
+                 start_index: int = 0, total_chunks: int = None, chunk_indices: list = None) -> list:
     print("🧠 Embedding chunks...")
     results = []
+    chunk_hashes = [generate_chunk_hash(chunk) for chunk in chunks]
+
+    # ✅ Step: Embed in batches when the model supports it
+    # (cache first, then batched + rate-limited by the scheduler; raises EmbeddingError instead of storing bad vectors)
+    vectors = None
+    if batch_embed_fn is not None:
+        provider, model = cache_namespace or (None, None)
+        vectors = embed_with_cache(chunks, chunk_hashes, batch_embed_fn, cache, provider, model)
 
     for idx, chunk in enumerate(chunks):
         try:
-            # ✅ Step: Generate hash per chunk
-            chunk_hash = hashlib.md5(chunk.encode("utf-8")).hexdigest()
-
             upload_dt = datetime.now(timezone.utc)
             upload_time_str = upload_dt.isoformat()
             upload_ts = upload_dt.timestamp()
 
             # ✅ Step: Embed and structure result
-            embedding = embedding_fn(chunk)
-            chunk_hash = generate_chunk_hash(chunk)
+            if vectors is not None:
+                embedding = vectors[idx]
+            else:
+                embedding = embedding_fn(chunk)
+            chunk_hash = chunk_hashes[idx]
             char_count = len(chunk)
 
             doc = {
@@ -171,16 +194,19 @@ def embed_chunks(chunks: list, embedding_fn, subject: str, metadata=None) -> lis
                 "store_pipeline_version": "v1.0",
                 "client_ip": metadata.get("client_ip", "127.0.0.1"),
                 "session_id": metadata.get("session_id", "test_session"),
-                "chunk_index": idx,
-                "total_chunks": len(chunks),
+                "chunk_index": chunk_indices[idx] if chunk_indices else start_index + idx,
+                "total_chunks": total_chunks if total_chunks is not None else len(chunks),
                 "metadata": {
                     "chunk_hash": chunk_hash,
                     "char_count": char_count
                 }
             }
+            if cache_namespace:
+                doc["metadata"]["embedding_model"] = embedding_model_key(*cache_namespace)  # scopes chunk dedup
+            doc["metadata"]["dims"] = len(embedding)   # embedder output size (before dim_reduction), scopes chunk dedup
 
             results.append(doc)
-            print(f"🔢 Chunk {idx+1}/{len(chunks)} | hash: {chunk_hash[:8]}... stored ✅")
+            print(f"🔢 Chunk {start_index+idx+1} | hash: {chunk_hash[:8]}... stored ✅")
 
         except Exception as e:
             print(f"❌ Embedding failed for chunk {idx}: {e}")
@@ -198,8 +224,143 @@ def store_vectors_to_db(embedded_chunks: list, config: dict, subject: str):
     db_config = config.get(subject, config["default"])
     client = get_mongo_client()
     collection = client[db_config['db_name']][db_config['collection_name']]
-    collection.insert_many(embedded_chunks)
-    logging.info(f"✅ Stored {len(embedded_chunks)} chunks to DB: {db_config['collection_name']}")
+
+    # ✅ Truncate / PCA-project per subject config (same reducer is applied to query vectors)
+    reducer = get_reducer(db_config)
+    if reducer is not None:
+        reduced = reduce_vectors([doc["embedding"] for doc in embedded_chunks], reducer)
+        for doc, vector in zip(embedded_chunks, reduced):
+            doc["embedding"] = vector
+
+    # ✅ Pack vectors per subject config (list / float32 / int8 / bit BinData)
+    encoding = get_vector_encoding(db_config)
+    if encoding != "list":
+        for doc in embedded_chunks:
+            doc["embedding"] = encode_vector(doc["embedding"], encoding)
+
+    # ✅ Byte-sized, unordered batches: one bad doc no longer aborts the whole file
+    writer = BulkWriter(collection, get_bulk_write_settings(config, db_config))
+    report = writer.insert(embedded_chunks, raise_on_error=False)
+
+    # ✅ New content for this subject → cached answers may be stale, local ANN gets the new vectors
+    stored = [doc for doc in embedded_chunks if "_id" in doc]   # failed docs lost their _id
+    if stored:
+        invalidate_subject_answers(subject)
+        add_to_local_index(subject, stored)
+    if report["failed"]:
+        raise BulkWriteFailed(report)   # window isn't checkpointed → a resume re-embeds it
+    logging.info(f"✅ Stored {report['inserted']} chunks to DB: {db_config['collection_name']} (encoding={encoding}, "
+                 f"batches={len(report['batches'])}, duplicates={report['duplicates']})")
+    return report
+
+
+def finalize_chunk_totals(config: dict, subject: str, file_hash: str, total_chunks: int):
+    """Streamed files only know their chunk count at the end → backfill total_chunks."""
+    db_config = config.get(subject, config["default"])
+    collection = get_mongo_client()[db_config['db_name']][db_config['collection_name']]
+    collection.update_many({"file_hash": file_hash, "subject": subject}, {"$set": {"total_chunks": total_chunks}})
+
+
+def _drop_file_chunks(config: dict, subject: str, query: dict) -> int:
+    """Delete this file's chunks + references matching query (chunks other files reference are handed over)."""
+    db_config = config.get(subject, config["default"])
+    db = get_mongo_client()[db_config['db_name']]
+    collection = db[db_config['collection_name']]
+    refs = db[db_config.get("refs_collection_name", db_config['collection_name'] + "_refs")]
+    refs.delete_many(query)
+    chunk_ids = [doc["_id"] for doc in collection.find({**query, "subject": subject}, {"_id": 1})]
+    if not chunk_ids:
+        return 0
+    return release_chunks(collection, refs, chunk_ids)["deleted"]
+
+
+def drop_uncommitted_chunks(config: dict, subject: str, file_hash: str, committed_chunk_index: int):
+    """Before resuming: remove chunks written after the last checkpoint (crash between insert and checkpoint)."""
+    deleted = _drop_file_chunks(config, subject, {"file_hash": file_hash, "chunk_index": {"$gte": committed_chunk_index}})
+    if deleted:
+        print(f"🧹 Dropped {deleted} uncommitted chunks past index {committed_chunk_index}")
+
+
+def discard_partial_file(config: dict, subject: str, file_hash: str, stored_count: int):
+    """Remove chunks already written for a file whose stream failed midway."""
+    if not stored_count:
+        return
+    deleted = _drop_file_chunks(config, subject, {"file_hash": file_hash})
+    print(f"🧹 Removed {deleted} partially stored chunks for file_hash={file_hash[:8]}...")
+
+
+# ============================================
+# 🔁 Step 5.5: Update Mode (chunk diffing)
+# ============================================
+STORE_MODES = ("insert", "update")
+
+
+def get_store_mode(config: dict, subject_config: dict, mode: str = None) -> str:
+    """Explicit mode > subject "store_mode" > global "store_mode" > "insert" (update is opt-in per subject)."""
+    mode = (mode or subject_config.get("store_mode") or config.get("store_mode") or "insert").lower()
+    if mode not in STORE_MODES:
+        raise ValueError(f"Unsupported store_mode '{mode}' (expected one of {STORE_MODES})")
+    return mode
+
+
+class ChunkDiff:
+    """
+    Existing chunks of (source_file, user_id) vs the chunks of the new version.
+    Unchanged chunks are reused (re-indexed, not re-embedded); vanished ones are deleted.
+    Chunk references (see chunk_dedup) of the file take part in the diff the same way.
+    """
+
+    def __init__(self, config: dict, subject: str, metadata: dict):
+        db_config = config.get(subject, config["default"])
+        db = get_mongo_client()[db_config['db_name']]
+        self.collection = db[db_config['collection_name']]
+        self.refs = db[db_config.get("refs_collection_name", db_config['collection_name'] + "_refs")]
+        self.existing = {}         # chunk_hash → [(kind, _id, chunk_index)]  kind: "chunk" | "ref"
+        # Chunks of this exact version (a resumed job) are not "existing" content
+        query = {"source_file": metadata["file_name"], "user_id": metadata["user_id"],
+                 "file_hash": {"$ne": metadata["file_hash"]}}
+        for doc in self.collection.find(query, {"metadata.chunk_hash": 1, "chunk_index": 1}):
+            chunk_hash = (doc.get("metadata") or {}).get("chunk_hash")
+            self.existing.setdefault(chunk_hash, []).append(("chunk", doc["_id"], doc.get("chunk_index")))
+        for ref in self.refs.find(query, {"chunk_hash": 1, "chunk_index": 1}):
+            self.existing.setdefault(ref.get("chunk_hash"), []).append(("ref", ref["_id"], ref.get("chunk_index")))
+        self.previous_count = sum(len(v) for v in self.existing.values())
+        self.kept = []             # (kind, _id, new chunk_index, old chunk_index)
+        print(f"🔁 Update mode: {self.previous_count} existing chunks for {metadata['file_name']}")
+
+    def split(self, chunks: list, indices: list) -> (list, list):
+        """Return only the chunks (and their indices) that need embedding."""
+        fresh, fresh_indices = [], []
+        for chunk, idx in zip(chunks, indices):
+            matches = self.existing.get(generate_chunk_hash(chunk))
+            if matches:
+                kind, doc_id, old_index = matches.pop()
+                self.kept.append((kind, doc_id, idx, old_index))
+            else:
+                fresh.append(chunk)
+                fresh_indices.append(idx)
+        return fresh, fresh_indices
+
+    def apply(self, file_hash: str, batch_size: int = 1000) -> dict:
+        """Point reused chunks at the new file version and drop the ones that vanished."""
+        for kind, target in (("chunk", self.collection), ("ref", self.refs)):
+            ops = [UpdateOne({"_id": doc_id}, {"$set": {"file_hash": file_hash, "chunk_index": idx}})
+                   for k, doc_id, idx, _ in self.kept if k == kind]
+            for i in range(0, len(ops), batch_size):
+                target.bulk_write(ops[i:i + batch_size], ordered=False)
+
+        vanished = [(kind, doc_id) for matches in self.existing.values() for kind, doc_id, _ in matches]
+        vanished_chunks = [doc_id for kind, doc_id in vanished if kind == "chunk"]
+        vanished_refs = [doc_id for kind, doc_id in vanished if kind == "ref"]
+        for i in range(0, len(vanished_refs), batch_size):
+            self.refs.delete_many({"_id": {"$in": vanished_refs[i:i + batch_size]}})
+        handed_over = 0
+        for i in range(0, len(vanished_chunks), batch_size):
+            # Chunks other files still reference are handed over, not deleted
+            handed_over += release_chunks(self.collection, self.refs, vanished_chunks[i:i + batch_size])["handed_over"]
+        print(f"🔁 Reused {len(self.kept)} chunks | deleted {len(vanished)} vanished chunks "
+              f"({handed_over} handed over to other files)")
+        return {"chunks_reused": len(self.kept), "chunks_deleted": len(vanished)}
 
 
 # ============================================
@@ -217,12 +378,11 @@ def log_store_metadata(
     chunk_size: int,
     chunk_overlap: int,
     subject_source: str,
-    embedding_model: str  # ✅ new argument
+    embedding_model: str,  # ✅ new argument
+    extra: dict = None
 ):
     print(f"📝 Logging store metadata for file: {metadata['file_name']}")
     
-    client = get_mongo_client()
-    log_coll = client[log_config['db_name']][log_config['store_logs']]
     pipeline_version = os.getenv("STORE_PIPELINE_VERSION", "v1.0")
     log_entry = metadata.copy()
     log_entry.update({
@@ -234,10 +394,16 @@ def log_store_metadata(
         "embedding_model": embedding_model, # ✅ dynamic value now
         "classifier_model": "None",
         "store_intent_source": subject_source,
-        "store_pipeline_version": pipeline_version  # ✅ New version trace field
+        "store_pipeline_version": pipeline_version,  # ✅ New version trace field
+        "logged_at": datetime.now(timezone.utc),      # BSON date → TTL index / range queries
     })
+    log_entry.update(extra or {})
 
-    log_coll.insert_one(log_entry)
+    # ✅ Durable (inline) write: duplicate detection reads store_logs and the job is marked
+    # completed right after → never through the lossy sink buffer. A concurrent duplicate
+    # (unique file_hash index) is skipped; any other failure raises and fails the job
+    write_log(log_config['db_name'], log_config['store_logs'], log_entry, log_config.get("write_concern"), durable=True)
+    get_dedup_index(log_config).add(metadata["file_hash"])
     logging.info("📄 Log written with full traceability.")
 
 
@@ -272,43 +438,10 @@ def generate_chunk_hash(chunk_text: str) -> str:
 
 
 def extract_text_from_file(file_path: str) -> str:
+    """Whole-document text (small files / ad-hoc use); the pipeline streams via iter_text_segments."""
     print(f"📄 Extracting text from file: {file_path}")
     try:
-        if file_path.endswith(".pdf"):
-            loader = PyPDFLoader(file_path)
-            documents = loader.load()
-            text = "\n".join(doc.page_content for doc in documents)
-        elif file_path.endswith(".docx"):
-            loader = Docx2txtLoader(file_path)
-            documents = loader.load()
-            text = "\n".join(doc.page_content for doc in documents)
-        elif file_path.endswith(".txt"):
-            loader = TextLoader(file_path)
-            documents = loader.load()
-            text = "\n".join(doc.page_content for doc in documents)
-        elif file_path.endswith(".csv"):
-            import pandas as pd
-            df = pd.read_csv(file_path)
-            text = df.to_string(index=False)
-        elif file_path.endswith(".json"):
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            text = json.dumps(data, indent=2)
-        elif file_path.endswith(".xlsx"):
-            import pandas as pd
-            df = pd.read_excel(file_path, sheet_name=None)
-            text = "\n\n".join(f"{sheet}\n{df[sheet].to_string(index=False)}" for sheet in df)
-        elif file_path.endswith(".html"):
-            from bs4 import BeautifulSoup
-            with open(file_path, "r", encoding="utf-8") as f:
-                soup = BeautifulSoup(f, "html.parser")
-            text = soup.get_text(separator="\n")
-        elif file_path.endswith(".md"):
-            with open(file_path, "r", encoding="utf-8") as f:
-                text = f.read()
-        else:
-            raise ValueError("Unsupported file type.")
-
+        text = "".join(iter_text_segments(file_path))
         print(f"📏 Extracted {len(text)} characters from file.")
         return text
 
@@ -318,63 +451,245 @@ def extract_text_from_file(file_path: str) -> str:
         return ""
 
 
+# ============================================
+# 🌊 Streaming Extraction + Incremental Chunking
+# ============================================
+STREAM_BLOCK_CHARS = 64 * 1024   # plain-text read size
+TABLE_ROW_BLOCK = 500            # csv / xlsx rows per segment
+
+
+def iter_text_segments(file_path: str):
+    """
+    Yield the document as a sequence of text segments (page, row block,
+    JSON subtree...). Concatenating the segments gives the full document text.
+    Memory is bounded by one segment for txt/md, csv, xlsx, pdf (per page) and
+    json (via ijson; without it the file is parsed whole). html and docx are
+    still parsed in one piece by BeautifulSoup / docx2txt.
+    """
+    if file_path.endswith(".pdf"):
+        for i, doc in enumerate(PyPDFLoader(file_path).lazy_load()):
+            yield ("\n" if i else "") + doc.page_content
+    elif file_path.endswith(".docx"):
+        for i, doc in enumerate(Docx2txtLoader(file_path).lazy_load()):
+            yield ("\n" if i else "") + doc.page_content
+    elif file_path.endswith(".txt") or file_path.endswith(".md"):
+        with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+            while True:
+                block = f.read(STREAM_BLOCK_CHARS)
+                if not block:
+                    break
+                yield block
+    elif file_path.endswith(".csv"):
+        import pandas as pd
+        for i, df in enumerate(pd.read_csv(file_path, chunksize=TABLE_ROW_BLOCK)):
+            yield ("\n" if i else "") + df.to_string(index=False, header=(i == 0))
+    elif file_path.endswith(".json"):
+        yield from _iter_json_segments(file_path)
+    elif file_path.endswith(".xlsx"):
+        yield from _iter_xlsx_segments(file_path)
+    elif file_path.endswith(".html"):
+        from bs4 import BeautifulSoup
+        with open(file_path, "r", encoding="utf-8") as f:
+            soup = BeautifulSoup(f, "html.parser")
+        yield soup.get_text(separator="\n")
+    else:
+        raise ValueError("Unsupported file type.")
+
+
+def _iter_xlsx_segments(file_path: str):
+    from openpyxl import load_workbook
+    workbook = load_workbook(file_path, read_only=True, data_only=True)  # ✅ rows are streamed from the zip
+    try:
+        for sheet_idx, sheet in enumerate(workbook.worksheets):
+            yield ("\n\n" if sheet_idx else "") + sheet.title
+            rows = []
+            for row in sheet.iter_rows(values_only=True):
+                rows.append("\t".join("" if cell is None else str(cell) for cell in row))
+                if len(rows) >= TABLE_ROW_BLOCK:
+                    yield "\n" + "\n".join(rows)
+                    rows = []
+            if rows:
+                yield "\n" + "\n".join(rows)
+    finally:
+        workbook.close()
+
+
+def _iter_json_segments(file_path: str):
+    """One segment per top-level item/key; streamed with ijson (falls back to json.load if it is missing)."""
+    with open(file_path, "r", encoding="utf-8") as f:
+        head = f.read(1024).lstrip()[:1]
+    try:
+        import ijson
+    except ImportError:
+        ijson = None
+
+    with open(file_path, "rb" if ijson else "r") as f:
+        if ijson and head == "[":
+            items = ((None, value) for value in ijson.items(f, "item", use_float=True))
+        elif ijson and head == "{":
+            items = ijson.kvitems(f, "", use_float=True)
+        else:
+            data = json.load(f)
+            if isinstance(data, list):
+                items = ((None, value) for value in data)
+            elif isinstance(data, dict):
+                items = iter(data.items())
+            else:
+                items = iter([(None, data)])
+        for i, (key, value) in enumerate(items):
+            body = json.dumps(value, indent=2, default=str)
+            yield (",\n" if i else "") + (f"{json.dumps(key)}: {body}" if key is not None else body)
+
+
+def estimate_chunk_count(metadata: dict, chunking: dict):
+    """Rough chunk count from file size (plain-text formats only; None for PDF/DOCX/XLSX)."""
+    if Path(metadata["file_path"]).suffix.lower() not in (".txt", ".md", ".csv", ".json", ".html", ".htm"):
+        return None
+    step = max(chunking["chunk_size"] - chunking["chunk_overlap"], 1)
+    if chunking.get("unit") == "tokens":
+        step *= 4  # ~4 chars per token
+    return max(1, -(-metadata["file_size"] // step))
+
+
+def iter_windows(items, size: int):
+    """Group an iterator into lists of at most `size` items."""
+    iterator = iter(items)
+    while True:
+        window = list(islice(iterator, size))
+        if not window:
+            return
+        yield window
+
+
 # ============================================
 # 🚀 Main STORE Pipeline
 # ============================================
-def store_pipeline(file_path: str, user_id: str, config_path="mongo_config.json"):
+def store_pipeline(file_path: str, user_id: str, config_path="mongo_config.json", mode: str = None, job_id: str = None):
+    """
+    mode="insert" → store every chunk of the file as new.
+    mode="update" → diff against the chunks already stored for this source_file/user_id:
+                    embed only new chunks, delete vanished ones.
+    mode=None     → the subject's "store_mode" (global "store_mode" / "insert" otherwise).
+
+    Runs as a persisted ingest job (see ingest_jobs): progress is checkpointed per
+    window, and a rerun after a crash resumes from the last committed chunk.
+    Returns the job id (None when skipped). Any failure marks the job "failed"
+    and is re-raised.
+    """
+    job, log_config = None, None
     try:
         config = load_config(config_path)
         log_config = config["logs"]
         routing_keywords = config.get("routing_keywords", {})
-        default_chunk_size = config.get("chunk_size", 500)
-        default_chunk_overlap = config.get("chunk_overlap", 100)
 
         metadata = extract_file_metadata(file_path, user_id)
         print("🔄 Running pipeline for:", metadata["file_name"])
 
         if is_duplicate_upload(log_config, metadata):
             print("⚠️ Skipped duplicate upload.")
+            if job_id:
+                finish_job(log_config, job_id, "skipped", reason="duplicate")
             return
 
         subject, subject_source = detect_subject_from_filename(metadata["file_name"], routing_keywords)
         subject_config = config.get(subject, config["default"])
-        chunk_size = subject_config.get("chunk_size", default_chunk_size)
-        chunk_overlap = subject_config.get("chunk_overlap", default_chunk_overlap)
-
-        text = extract_text_from_file(file_path)
-        if not text.strip():
-            print("❌ Empty or unreadable content. Skipping.")
-            return
-
-        chunks = chunk_text(text, chunk_size=chunk_size, overlap=chunk_overlap)
-        if not chunks:
-            print("❌ No chunks created. Aborting.")
+        mode = get_store_mode(config, subject_config, mode)
+        chunking = get_chunking_settings(config, subject_config)
+        chunk_size, chunk_overlap = chunking["chunk_size"], chunking["chunk_overlap"]
+        diff = ChunkDiff(config, subject, metadata) if mode == "update" else None
+
+        job = claim_job(log_config, metadata, subject, mode, job_id=job_id,
+                        estimated_total_chunks=estimate_chunk_count(metadata, chunking))
+        if job is None:
             return
+        resume_from = job.get("committed_chunk_index", 0)
+        if resume_from:
+            drop_uncommitted_chunks(config, subject, metadata["file_hash"], resume_from)
 
         # embedding_model = OpenAIEmbeddings()
-        embedding_model = load_embedding_model()
-        embedding_model_name = embedding_model.__class__.__name__
+        provider = os.getenv("EMBEDDING_PROVIDER", "gpt").lower()
+        embedding_model = load_embedding_model(config.get("embedding_batch", {}).get(provider))
+        embedding_model_name = getattr(embedding_model, "base_class_name", embedding_model.__class__.__name__)
         print(f"🔁 Using embedding model: {embedding_model_name}")
+        embedding_namespace = (provider, getattr(embedding_model, "model_name", embedding_model_name))
 
 
-        # ✅ Dynamically pick embedding function
-        if hasattr(embedding_model, "embed_documents"):
-            embedding_fn = lambda x: embedding_model.embed_documents([x])[0]
+        # ✅ Dynamically pick embedding function (batched when supported)
+        batch_embed_fn = getattr(embedding_model, "embed_documents", None)
+        if batch_embed_fn is not None:
+            embedding_fn = lambda x: batch_embed_fn([x])[0]
         else:
             embedding_fn = embedding_model.embed_query
 
-        embedded = embed_chunks(
-            chunks,
-            embedding_fn=embedding_fn,
-            subject=subject,
-            metadata=metadata
-        )
-
-        if not embedded:
-            print("❌ No embeddings generated. Aborting.")
+        dedup, near = None, None
+        near_settings = get_near_dedup_settings(config, subject_config)
+        if is_chunk_dedup_enabled(config, subject_config) or near_settings["enabled"]:
+            # ♻️ Scoped to this user + the model / size the embedder really produces
+            model_key = embedding_model_key(*embedding_namespace)
+            scope = dedup_scope(subject, metadata, model_key, get_embedding_dims(embedding_fn, model_key))
+            if is_chunk_dedup_enabled(config, subject_config):
+                dedup = ExactChunkDedup(config, subject, metadata, scope)
+            if near_settings["enabled"]:
+                near = NearChunkDedup(config, subject, metadata, near_settings, scope)
+
+        # ✅ Stream: extract → chunk → embed → store, one window of chunks at a time
+        window_size = int(config.get("stream_window_chunks", 256))
+        segments = iter_text_segments(file_path)
+        chunks = (c for c in make_chunk_iter(segments, chunking) if c.strip())
+        stored_count, total_count = job.get("chunks_embedded", 0), 0
+        for window in iter_windows(chunks, window_size):
+            indices = list(range(total_count, total_count + len(window)))
+            total_count += len(window)
+            if indices[0] < resume_from:
+                # ⏭️ Already committed by a previous attempt → no re-embedding
+                done = min(len(window), resume_from - indices[0])
+                if diff is not None:
+                    diff.split(window[:done], indices[:done])  # still mark reused chunks as kept
+                window, indices = window[done:], indices[done:]
+            if diff is not None:
+                window, indices = diff.split(window, indices)
+            if dedup is not None and window:
+                # ♻️ Chunks stored by other files → reference instead of embed + insert
+                window, indices = dedup.split(window, indices, [generate_chunk_hash(c) for c in window])
+            if near is not None and window:
+                # 🪞 Near duplicates (MinHash/LSH) → skip, link or just report
+                window, indices = near.split(window, indices)
+            embedded = window and embed_chunks(
+                window,
+                embedding_fn=embedding_fn,
+                subject=subject,
+                metadata=metadata,
+                batch_embed_fn=batch_embed_fn,
+                cache=get_embedding_cache(),
+                cache_namespace=embedding_namespace,
+                chunk_indices=indices
+            )
+            if embedded and near is not None:
+                near.annotate(embedded)
+            if embedded:
+                store_vectors_to_db(embedded, config, subject)
+                stored_count += len(embedded)
+            if dedup is not None:
+                dedup.commit(embedded or [])
+            if near is not None:
+                near.commit(embedded or [])
+            checkpoint_job(log_config, job["_id"], total_count, stored_count)
+
+        if total_count == 0:
+            print("❌ Empty or unreadable content. Skipping.")
+            finish_job(log_config, job["_id"], "skipped", reason="empty")
             return
 
-        store_vectors_to_db(embedded, config, subject)
+        extra = {"store_mode": mode, "chunk_strategy": chunking["strategy"], "chunks_embedded": stored_count}
+        if dedup is not None:
+            extra["chunks_deduped"] = dedup.deduped
+        if near is not None:
+            extra.update(near.finish(job["_id"]))
+        if diff is not None:
+            extra.update(diff.apply(metadata["file_hash"]))
+            if extra["chunks_deleted"]:
+                invalidate_subject_answers(subject)
+        finalize_chunk_totals(config, subject, metadata["file_hash"], total_count)
 
         # log_store_metadata(
         #     log_config,
@@ -392,33 +707,51 @@ def store_pipeline(file_path: str, user_id: str, config_path="mongo_config.json"
             metadata,
             subject,
             status="completed",
-            chunk_count=len(embedded),
+            chunk_count=total_count,
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
             subject_source=subject_source,
-            embedding_model=embedding_model_name  # ✅ new dynamic input
+            embedding_model=embedding_model_name,  # ✅ new dynamic input
+            extra=extra
         )
-
-
+        finish_job(log_config, job["_id"], "completed", committed_chunk_index=total_count, total_chunks=total_count, **extra)
 
         print("✅ Pipeline complete for:", metadata["file_name"])
+        return job["_id"]
 
     except Exception as e:
-        print("💥 Exception occurred in pipeline:", e)
-        logging.error("💥 Pipeline failed", exc_info=True)
+        if isinstance(e, EmbeddingError):
+            # ❗ No zero/placeholder vectors ever reach Mongo
+            print(f"💥 Embedding failed for chunks {e.failed}: {e}")
+            logging.error(f"💥 Embedding failed for chunks {e.failed}", exc_info=True)
+        else:
+            print("💥 Exception occurred in pipeline:", e)
+            logging.error("💥 Pipeline failed", exc_info=True)
+        # The claimed job (or the caller's queued one) never stays "running";
+        # committed windows are kept, so a rerun resumes from the checkpoint
+        failed_job_id = job["_id"] if job is not None else job_id
+        if failed_job_id and log_config is not None:
+            try:
+                finish_job(log_config, failed_job_id, "failed", error=str(e))
+            except Exception:
+                logging.error(f"💥 Could not mark job {failed_job_id} as failed", exc_info=True)
+        raise
 
 
 # ============================================
 # 📂 Multi-file Batch Runner
 # ============================================
-def store_multiple_files(file_paths: list, user_id: str, config_path="mongo_config.json"):
-    for path in file_paths:
-        print(f"🔁 Processing: {path}")
-        try:
-            store_pipeline(file_path=path, user_id=user_id, config_path=config_path)
-        except Exception as e:
-            print(f"💥 Error while processing {path}: {e}")
-            logging.error(f"💥 Failed on {path}", exc_info=True)
+def store_multiple_files(file_paths: list, user_id: str, config_path="mongo_config.json", mode: str = None) -> dict:
+    """Parallel staged ingest (parse → embed → write); returns per-file status + stage throughput."""
+    from agentic_rag.ingest_engine import IngestEngine
+
+    config = load_config(config_path)
+    try:
+        return IngestEngine(config, mode=mode).run(list(file_paths), user_id)
+    except Exception as e:
+        print(f"💥 Error while processing batch: {e}")
+        logging.error("💥 Batch ingest failed", exc_info=True)
+        raise
 
 # ============================================
 # END
@@ -0,0 +1,57 @@
+# vector_codec.py
+
+"""
+Packed BSON vector encodings for stored embeddings.
+- "list"    → plain array of doubles (legacy, 8 bytes + tag/key per element)
+- "float32" → BSON BinData vector (subtype 9), 4 bytes per element
+- "int8"    → per-vector scaled int8 (cosine-safe: scale cancels out), 1 byte per element
+- "bit"     → 1-bit sign quantization, packed 8 dims per byte
+
+Mode is set per subject with "vector_encoding" in mongo_config.json.
+"""
+
+import numpy as np
+from bson.binary import Binary, BinaryVectorDtype
+
+VECTOR_ENCODINGS = ("list", "float32", "int8", "bit")
+BINARY_VECTOR_SUBTYPE = 9
+
+
+def get_vector_encoding(subject_config: dict) -> str:
+    mode = (subject_config or {}).get("vector_encoding", "list").lower()
+    if mode not in VECTOR_ENCODINGS:
+        raise ValueError(f"Unsupported vector_encoding '{mode}' (expected one of {VECTOR_ENCODINGS})")
+    return mode
+
+
+def encode_vector(vector, mode: str = "list"):
+    """Encode a float vector for storage (or as a $vectorSearch queryVector)."""
+    if mode == "list":
+        return list(vector)
+    arr = np.asarray(vector, dtype=np.float32)
+    if mode == "float32":
+        return Binary.from_vector(arr.tolist(), BinaryVectorDtype.FLOAT32)
+    if mode == "int8":
+        max_abs = float(np.max(np.abs(arr))) or 1.0
+        quantized = np.clip(np.rint(arr / max_abs * 127), -128, 127).astype(np.int8)
+        return Binary.from_vector(quantized.tolist(), BinaryVectorDtype.INT8)
+    if mode == "bit":
+        bits = np.packbits(arr > 0)
+        padding = (-len(arr)) % 8
+        return Binary.from_vector(bits.tolist(), BinaryVectorDtype.PACKED_BIT, padding)
+    raise ValueError(f"Unsupported vector_encoding '{mode}'")
+
+
+def decode_vector(value):
+    """Stored embedding (list or packed BinData) → list of floats; None if not a vector."""
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    if isinstance(value, Binary) and value.subtype == BINARY_VECTOR_SUBTYPE:
+        vec = value.as_vector()
+        if vec.dtype == BinaryVectorDtype.PACKED_BIT:
+            bits = np.unpackbits(np.asarray(vec.data, dtype=np.uint8))
+            if vec.padding:
+                bits = bits[:-vec.padding]
+            return (bits.astype(np.float32) * 2 - 1).tolist()  # {0,1} → {-1,+1}
+        return [float(x) for x in vec.data]
+    return None
@@ -25,10 +25,50 @@ app.include_router(agent_router)
 from mcp_server.routes.api_protected_router import router as protected_router
 app.include_router(protected_router)
 
+from mcp_server.routes.rag_router import router as rag_router
+app.include_router(rag_router)
+
 # from mcp_server.routes.gemini_media_router import router as gemini_media_router
 # app.include_router(gemini_media_router, prefix="/media")
 
 
+@app.on_event("startup")
+def warm_local_ann():
+    # Optional in-memory ANN mirror of the Atlas vector collections (LOCAL_ANN_ENABLED=true)
+    import os
+    if os.getenv("LOCAL_ANN_ENABLED", "false").lower() == "true":
+        from agentic_rag.retriever_factory import CONFIG
+        from agentic_rag.local_ann import warm_local_indexes
+        warm_local_indexes(CONFIG)
+
+
+@app.on_event("startup")
+def warm_dedup_filter():
+    # Duplicate-upload Bloom filter + file_hash index for /rag/store (loaded off the request path)
+    import threading
+    from agentic_rag.mongo_utils import load_rag_config
+    from agentic_rag.dedup_filter import get_dedup_index
+    log_config = load_rag_config()["logs"]
+    threading.Thread(target=get_dedup_index, args=(log_config,), name="dedup-warm", daemon=True).start()
+
+
+@app.on_event("startup")
+def ensure_log_retention():
+    # TTL / time-series expiry for retrieve_logs and store_logs (idempotent, off the request path)
+    import threading
+    from agentic_rag.mongo_utils import load_rag_config
+    from agentic_rag.log_retention import ensure_log_retention as apply_retention
+    log_config = load_rag_config()["logs"]
+    threading.Thread(target=apply_retention, args=(log_config,), name="log-retention", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def flush_logs():
+    # Write out retrieve/store log events still queued in the background sink
+    from agentic_rag.log_sink import flush_log_sink
+    flush_log_sink()
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
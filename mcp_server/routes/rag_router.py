@@ -0,0 +1,75 @@
+# File: rag_router.py
+
+from typing import List, Optional
+import os
+import uuid
+
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+# ⚠️ No store_pipeline import here: it requires OPENAI_API_KEY at import time and would
+# keep the app from starting; the worker pool imports it lazily when a job runs
+from agentic_rag.mongo_utils import load_rag_config
+from agentic_rag.ingest_jobs import create_job, get_job, get_job_progress, get_store_pool, StoreQueueFull
+
+router = APIRouter()
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+UPLOAD_DIR = os.getenv("RAG_UPLOAD_DIR", os.path.join(BASE_DIR, "agentic_rag", ".cache", "uploads"))
+UPLOAD_READ_BYTES = 1024 * 1024
+
+
+async def save_upload(upload: UploadFile, path: str):
+    """Stream the upload to disk (never holds the whole file in memory)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as out:
+        while True:
+            block = await upload.read(UPLOAD_READ_BYTES)
+            if not block:
+                break
+            await run_in_threadpool(out.write, block)
+
+
+@router.post("/rag/store", status_code=202)
+async def store_files(
+    files: List[UploadFile] = File(...),
+    user_id: str = Form(...),
+    mode: Optional[str] = Form(None),
+):
+    """
+    Accept uploads, queue one ingest job per file and return the job IDs right away.
+    Capacity is reserved for the whole batch first: either every file is queued or
+    the request gets a 429 before anything is saved.
+    """
+    if mode and mode not in ("insert", "update"):
+        raise HTTPException(status_code=400, detail="mode must be 'insert' or 'update'")
+    log_config = load_rag_config()["logs"]
+    pool = get_store_pool()
+    try:
+        pool.reserve(len(files))
+    except StoreQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    jobs = []
+    try:
+        for upload in files:
+            file_name = os.path.basename(upload.filename or "upload")
+            job_id = uuid.uuid4().hex
+            path = os.path.join(UPLOAD_DIR, job_id, file_name)
+            await save_upload(upload, path)
+            await run_in_threadpool(create_job, log_config, path, user_id, job_id=job_id, source="api")
+            pool.submit(job_id, path, user_id, mode=mode, cleanup_file=True, reserved=True)
+            jobs.append({"job_id": job_id, "file_name": file_name, "status": "queued"})
+    finally:
+        pool.release(len(files) - len(jobs))   # slots of files that never made it to the pool
+
+    return {"jobs": jobs}
+
+
+@router.get("/rag/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Progress of an ingest job: chunks embedded / written, percent and ETA."""
+    job = await run_in_threadpool(get_job, load_rag_config()["logs"], job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return get_job_progress(job)
@@ -0,0 +1,95 @@
+# Benchmark_Dim_Reduction.py
+
+# ✅ Usage
+# # Recall vs size for truncation / PCA on a real subject collection
+# python .\test_code\Benchmark_Dim_Reduction.py default 100
+#
+# # Offline: embedding-like synthetic vectors (no Mongo needed)
+# python .\test_code\Benchmark_Dim_Reduction.py --synthetic 5000
+
+import os
+import sys
+import time
+
+import numpy as np
+
+# 📁 Adjust path to import from parent directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from agentic_rag.dim_reduction import PCAReducer, TruncateReducer, sample_vectors
+
+from dotenv import load_dotenv
+load_dotenv()
+
+CONFIG_PATH = "./agentic_rag/mongo_config.json"
+K = 5
+FRACTIONS = (1, 2, 4, 8)   # full, half, quarter, eighth of the source dimension
+
+
+def log_step(step: str):
+    print("\n" + ">>>" * 10 + f" {step} " + "<<<" * 10)
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def top_k(matrix: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ matrix.T
+    return np.argpartition(-scores, k, axis=1)[:, :k]
+
+
+def run(base: np.ndarray, queries: np.ndarray, fit_sample: np.ndarray):
+    base, queries = normalize(base), normalize(queries)
+    source_dims = base.shape[1]
+    truth = top_k(base, queries, K)
+    print(f"📦 {len(base)} base vectors | {len(queries)} queries | {source_dims} dims")
+    print(f"{'method':<9} {'dims':>5} {'bytes/vec':>9} {'recall@' + str(K):>9} {'search ms':>9} {'variance':>8}")
+
+    for fraction in FRACTIONS:
+        dims = source_dims // fraction
+        reducers = [("full", None)] if fraction == 1 else [("truncate", TruncateReducer(dims)),
+                                                         ("pca", PCAReducer.fit(fit_sample, dims))]
+        for name, reducer in reducers:
+            reduced_base = base if reducer is None else reducer.reduce(base)
+            reduced_queries = queries if reducer is None else reducer.reduce(queries)
+            start = time.perf_counter()
+            found = top_k(reduced_base, reduced_queries, K)
+            elapsed = (time.perf_counter() - start) * 1000 / len(queries)
+            recall = np.mean([len(set(f) & set(t)) / K for f, t in zip(found, truth)])
+            variance = f"{reducer.explained:.1%}" if isinstance(reducer, PCAReducer) else "-"
+            print(f"{name:<9} {dims:>5} {dims * 4:>9} {recall:>9.3f} {elapsed:>9.3f} {variance:>8}")
+
+
+def run_synthetic(n: int, dim: int = 1536, queries: int = 200, rank: int = 128):
+    log_step(f"SYNTHETIC: {n} vectors x {dim} dims (effective rank ~{rank})")
+    rng = np.random.default_rng(7)
+    # Real embeddings concentrate their variance in few directions → low-rank signal + noise
+    basis = rng.normal(size=(rank, dim)) * np.linspace(3, 0.3, rank)[:, None]
+    data = (rng.normal(size=(n + queries, rank)) @ basis + rng.normal(scale=0.5, size=(n + queries, dim))).astype(np.float32)
+    run(data[:n], data[n:], data[:min(n, 5000)])
+
+
+def run_on_collection(subject: str, queries: int):
+    from agentic_rag.mongo_utils import get_mongo_client, load_mongo_config
+
+    log_step(f"COLLECTION: subject={subject}")
+    config = load_mongo_config()
+    subject_config = config.get(subject, config["default"])
+    collection = get_mongo_client()[subject_config["db_name"]][subject_config["collection_name"]]
+    vectors = sample_vectors(collection, 20000)
+    if len(vectors) <= queries * 2:
+        print("⚠️ Not enough stored embeddings for a meaningful benchmark.")
+        return
+    # Held-out stored vectors as queries; PCA is fitted on the rest (as the offline fit would be)
+    rng = np.random.default_rng(11)
+    order = rng.permutation(len(vectors))
+    run(vectors[order[queries:]], vectors[order[:queries]], vectors[order[queries:]])
+
+
+if __name__ == "__main__":
+    os.environ["MONGO_CONFIG_PATH"] = CONFIG_PATH
+    args = sys.argv[1:]
+    if args and args[0] == "--synthetic":
+        run_synthetic(int(args[1]) if len(args) > 1 else 5000)
+    else:
+        run_on_collection(args[0] if args else "default", int(args[1]) if len(args) > 1 else 100)
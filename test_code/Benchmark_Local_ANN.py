@@ -0,0 +1,124 @@
+# Benchmark_Local_ANN.py
+
+# ✅ Usage
+# # Compare local HNSW vs Atlas $vectorSearch on a real subject collection
+# python .\test_code\Benchmark_Local_ANN.py default 50
+#
+# # Offline: HNSW vs exact search on random vectors (no Mongo needed)
+# python .\test_code\Benchmark_Local_ANN.py --synthetic 5000
+
+import os
+import sys
+import time
+
+import numpy as np
+
+# 📁 Adjust path to import from parent directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from agentic_rag.local_ann import HNSWIndex, LocalVectorIndex, get_local_ann_settings
+from agentic_rag.vector_codec import decode_vector, encode_vector, get_vector_encoding
+
+from dotenv import load_dotenv
+load_dotenv()
+
+CONFIG_PATH = "./agentic_rag/mongo_config.json"
+K = 5
+
+
+def log_step(step: str):
+    print("\n" + ">>>" * 10 + f" {step} " + "<<<" * 10)
+
+
+def exact_top_k(matrix: np.ndarray, query: np.ndarray, k: int) -> list:
+    scores = matrix @ (query / np.linalg.norm(query))
+    top = np.argpartition(-scores, k)[:k]
+    return list(top[np.argsort(-scores[top])])
+
+
+def summarize(name: str, latencies: list, recalls: list):
+    lat = np.array(latencies) * 1000
+    print(f"{name:<10} | recall@{K}={np.mean(recalls):.3f} | p50={np.percentile(lat, 50):.2f}ms | "
+          f"p95={np.percentile(lat, 95):.2f}ms")
+
+
+def run_synthetic(n: int, dim: int = 768, queries: int = 100):
+    log_step(f"SYNTHETIC: {n} vectors x {dim} dims")
+    rng = np.random.default_rng(7)
+    data = rng.normal(size=(n, dim)).astype(np.float32)
+    normed = data / np.linalg.norm(data, axis=1, keepdims=True)
+
+    start = time.perf_counter()
+    index = HNSWIndex(dim)
+    for vector in data:
+        index.add(vector)
+    print(f"🕸️ Build time: {time.perf_counter() - start:.2f}s")
+
+    latencies, recalls = [], []
+    for query in rng.normal(size=(queries, dim)).astype(np.float32):
+        truth = set(exact_top_k(normed, query, K))
+        t0 = time.perf_counter()
+        found = {node for node, _ in index.search(query, K)}
+        latencies.append(time.perf_counter() - t0)
+        recalls.append(len(found & truth) / K)
+    summarize("local", latencies, recalls)
+
+
+def run_against_atlas(subject: str, queries: int):
+    from agentic_rag.retriever_factory import CONFIG, get_retriever_entry
+    from agentic_rag.mongo_utils import get_mongo_client
+
+    log_step(f"ATLAS vs LOCAL: subject={subject}")
+    subject_config = CONFIG.get(subject, CONFIG["default"])
+    collection = get_mongo_client()[subject_config["db_name"]][subject_config["collection_name"]]
+
+    docs = [{"_id": d["_id"], "embedding": decode_vector(d["embedding"])}
+            for d in collection.find({"embedding": {"$exists": True}}, {"embedding": 1})]
+    docs = [d for d in docs if d["embedding"]]
+    if not docs:
+        print("⚠️ No embeddings found in collection.")
+        return
+    dim = len(docs[0]["embedding"])
+    docs = [d for d in docs if len(d["embedding"]) == dim]  # one provider's vectors only
+    ids = [str(d["_id"]) for d in docs]
+    matrix = np.array([d["embedding"] for d in docs], dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    print(f"📦 Loaded {len(ids)} vectors ({matrix.shape[1]} dims)")
+
+    local = LocalVectorIndex(subject, collection, get_local_ann_settings(CONFIG))
+    local.build()
+    entry = get_retriever_entry(subject, os.getenv("EMBEDDING_PROVIDER", "gpt"))
+
+    rng = np.random.default_rng(11)
+    picks = rng.choice(len(ids), size=min(queries, len(ids)), replace=False)
+    results = {"local": ([], []), "atlas": ([], [])}
+    for i in picks:
+        # Perturb a stored vector so the query isn't trivially its own nearest neighbor
+        query = matrix[i] + rng.normal(scale=0.01, size=matrix.shape[1]).astype(np.float32)
+        truth = {ids[j] for j in exact_top_k(matrix, query, K)}
+
+        t0 = time.perf_counter()
+        local_docs = local.search(query.tolist(), K) or []
+        results["local"][0].append(time.perf_counter() - t0)
+        results["local"][1].append(len({str(d.metadata["_id"]) for d in local_docs} & truth) / K)
+
+        atlas_query = encode_vector(query.tolist(), get_vector_encoding(subject_config))
+        t0 = time.perf_counter()
+        atlas_docs = list(entry["collection"].aggregate([
+            {"$vectorSearch": {"index": entry["index_name"], "path": "embedding", "queryVector": atlas_query,
+                               "numCandidates": K * 10, "limit": K}},
+            {"$project": {"_id": 1}},
+        ]))
+        results["atlas"][0].append(time.perf_counter() - t0)
+        results["atlas"][1].append(len({str(d["_id"]) for d in atlas_docs} & truth) / K)
+
+    for name, (latencies, recalls) in results.items():
+        summarize(name, latencies, recalls)
+
+
+if __name__ == "__main__":
+    os.environ["MONGO_CONFIG_PATH"] = CONFIG_PATH
+    args = sys.argv[1:]
+    if args and args[0] == "--synthetic":
+        run_synthetic(int(args[1]) if len(args) > 1 else 5000)
+    else:
+        run_against_atlas(args[0] if args else "default", int(args[1]) if len(args) > 1 else 50)
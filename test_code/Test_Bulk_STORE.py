@@ -0,0 +1,43 @@
+# Test_Bulk_STORE.py
+
+# ✅ Usage
+# # Ingest every file in a folder through the parallel engine
+# python .\test_code\Test_Bulk_STORE.py ./_Data
+#
+# # Offline run with deterministic vectors (still needs Mongo)
+# set EMBEDDING_PROVIDER=fake
+# python .\test_code\Test_Bulk_STORE.py ./_Data
+
+import os
+import sys
+import json
+from datetime import datetime
+
+# 📁 Adjust path to import from parent directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from agentic_rag.store_pipeline import store_multiple_files
+
+USER_ID = "test_user"
+CONFIG_PATH = "./agentic_rag/mongo_config.json"
+
+
+def log_step(step: str):
+    print("\n" + ">>>" * 10 + f" {step} " + "<<<" * 10)
+
+
+if __name__ == "__main__":
+    base_dir = sys.argv[1] if len(sys.argv) > 1 else "./_Data"
+    files = [os.path.join(base_dir, f) for f in sorted(os.listdir(base_dir))
+             if os.path.isfile(os.path.join(base_dir, f))]
+    print(f"\n📅 Bulk Run @ {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | {len(files)} files")
+
+    log_step("START BULK STORE")
+    report = store_multiple_files(files, user_id=USER_ID, config_path=CONFIG_PATH)
+
+    log_step("PER-FILE STATUS")
+    for f in report["files"]:
+        print(f"{f['status']:<9} | chunks={f.get('chunks', 0):<5} stored={f.get('stored', 0):<5} | "
+              f"{os.path.basename(f['file'])} {f.get('error') or f.get('reason') or ''}")
+
+    log_step("STAGE THROUGHPUT")
+    print(json.dumps(report["stages"], indent=2))
@@ -0,0 +1,67 @@
+# Test_CDC_Edit_Locality.py
+
+# ✅ Usage
+# # Offline: how many CDC chunks change after a 1-character edit (no Mongo / API key needed)
+# python .\test_code\Test_CDC_Edit_Locality.py
+#
+# # Larger documents / another average chunk size
+# python .\test_code\Test_CDC_Edit_Locality.py 50000 500
+
+import os
+import sys
+import random
+import hashlib
+
+# 📁 Adjust path to import from parent directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from agentic_rag.chunkers import iter_cdc_chunks
+
+MAX_CHANGED = 5           # the chunk the edit lands in + a few more until the cut points re-synchronize
+MAX_FILL = 0.8            # mean chunk length / max_size above this → boundaries rarely fire
+
+
+def log_step(step: str):
+    print("\n" + ">>>" * 10 + f" {step} " + "<<<" * 10)
+
+
+def make_table(rows: int) -> str:
+    # Space-padded columns: a low-bit cut test sees the same ~9 chars over and over and
+    # (almost) never fires → max_size cuts that all shift after an insertion
+    rng = random.Random(3)
+    return "\n".join(f"{i:>8}{rng.randint(1, 9999):>14}.00{'0.00':>14}{'N/A':>14}" for i in range(rows))
+
+
+def make_prose(sentences: int) -> str:
+    rng = random.Random(5)
+    words = "the invoice was paid after review by finance and the customer confirmed receipt of goods".split()
+    return " ".join(" ".join(rng.choice(words) for _ in range(rng.randint(6, 18))).capitalize() + "."
+                    for _ in range(sentences))
+
+
+def chunk_hashes(text: str, avg: int) -> tuple:
+    chunks = list(iter_cdc_chunks([text], avg, avg // 4, avg * 2))
+    return [hashlib.md5(c.encode("utf-8")).hexdigest() for c in chunks], chunks
+
+
+def check(name: str, text: str, avg: int):
+    log_step(f"{name.upper()}: {len(text)} chars | avg={avg}")
+    before, chunks = chunk_hashes(text, avg)
+    mean = sum(len(c) for c in chunks) / len(chunks)
+    print(f"📦 {len(chunks)} chunks | mean length {mean:.0f} (max {avg * 2})")
+    assert mean < MAX_FILL * avg * 2, f"❌ Chunks degenerate to max_size ({mean:.0f} chars on average)"
+
+    for position in (len(text) // 7, len(text) // 2, len(text) * 5 // 6):
+        edited = text[:position] + "#" + text[position:]   # insertion → fixed-offset cuts would all shift
+        after, _ = chunk_hashes(edited, avg)
+        changed = len(set(after) - set(before))
+        print(f"✏️ 1-char insert at {position}: {changed}/{len(after)} chunks changed")
+        assert changed <= MAX_CHANGED, f"❌ Edit at {position} changed {changed} chunks"
+    print("✅ Edits stay local")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    size = int(args[0]) if args else 20000
+    avg_size = int(args[1]) if len(args) > 1 else 500
+    check("table", make_table(size), avg_size)
+    check("prose", make_prose(size // 4), avg_size)
@@ -0,0 +1,82 @@
+# Test_Embedding_Rate_Limit.py
+
+# ✅ Usage
+# # Offline: 429 + Retry-After handling of the embedding scheduler (no API key / Mongo needed)
+# python .\test_code\Test_Embedding_Rate_Limit.py
+#
+# # More chunks / a longer Retry-After hint
+# python .\test_code\Test_Embedding_Rate_Limit.py 500 0.3
+
+import os
+import sys
+import time
+
+# 📁 Adjust path to import from parent directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from agentic_rag.fake_embedder import FakeEmbeddings
+from agentic_rag.embedding_scheduler import EmbeddingError, EmbeddingScheduler, ScheduledEmbeddings
+
+BATCH_LIMITS = {"max_items": 16, "max_tokens": 100_000}
+
+
+def log_step(step: str):
+    print("\n" + ">>>" * 10 + f" {step} " + "<<<" * 10)
+
+
+def make_texts(n: int) -> list:
+    return [f"chunk {i}: rate limited embedding test text" for i in range(n)]
+
+
+def make_scheduler(max_retries: int) -> EmbeddingScheduler:
+    # Fresh scheduler per scenario → stats and pauses don't leak between runs
+    return EmbeddingScheduler("fake", requests_per_min=60_000, tokens_per_min=100_000_000,
+                              max_workers=4, max_retries=max_retries, base_backoff=0.01)
+
+
+def test_retry_after_is_honored(n: int, retry_after: float):
+    log_step(f"429 EVERY 3rd CALL | retry_after={retry_after}s")
+    base = FakeEmbeddings(dimensions=64, fail_every=3, retry_after=retry_after)
+    scheduler = make_scheduler(max_retries=5)
+    embeddings = ScheduledEmbeddings(base, "fake", scheduler=scheduler, batch_limits=BATCH_LIMITS)
+
+    texts = make_texts(n)
+    start = time.perf_counter()
+    vectors = embeddings.embed_documents(texts)
+    elapsed = time.perf_counter() - start
+    print(f"📊 {scheduler.stats} | {elapsed:.2f}s")
+
+    assert len(vectors) == n and all(v is not None for v in vectors), "❌ Missing vectors"
+    expected = FakeEmbeddings(dimensions=64).embed_documents(texts)
+    assert vectors == expected, "❌ Vectors out of order after retries"
+    assert scheduler.stats["rate_limited"] > 0, "❌ No 429 was seen"
+    assert scheduler.stats["failures"] == 0, "❌ A batch failed despite retries"
+    assert elapsed >= retry_after, f"❌ Finished in {elapsed:.2f}s → Retry-After ({retry_after}s) was not waited"
+    print("✅ Every chunk embedded in order, Retry-After honored")
+
+
+def test_exhausted_retries_raise(retry_after: float):
+    log_step("429 ON EVERY CALL | retries exhausted")
+    base = FakeEmbeddings(dimensions=64, fail_every=1, retry_after=retry_after / 10)
+    scheduler = make_scheduler(max_retries=2)
+    embeddings = ScheduledEmbeddings(base, "fake", scheduler=scheduler, batch_limits=BATCH_LIMITS)
+
+    texts = make_texts(64)
+    try:
+        embeddings.embed_documents(texts)
+    except EmbeddingError as e:
+        print(f"📊 {scheduler.stats} | calls={base.calls} | {e}")
+        batches = -(-len(texts) // BATCH_LIMITS["max_items"])
+        # Each batch: 1 call + max_retries retries, never bisected into single chunks
+        assert base.calls == batches * (scheduler.max_retries + 1), f"❌ Unexpected call count {base.calls}"
+        assert len(e.failed) == len(texts), "❌ EmbeddingError should list every chunk"
+        print("✅ EmbeddingError raised without bisecting the batches")
+        return
+    raise AssertionError("❌ Expected EmbeddingError when every call is rate limited")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    count = int(args[0]) if args else 200
+    hint = float(args[1]) if len(args) > 1 else 0.1
+    test_retry_after_is_honored(count, hint)
+    test_exhausted_retries_raise(hint)
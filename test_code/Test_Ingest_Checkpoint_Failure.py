@@ -0,0 +1,87 @@
+# Test_Ingest_Checkpoint_Failure.py
+
+# ✅ Usage
+# # Offline: a failing job checkpoint must fail the file, not hang the ingest engine
+# # (no Mongo / API key needed; job + Mongo calls are replaced by in-process fakes)
+# python .\test_code\Test_Ingest_Checkpoint_Failure.py
+
+import os
+import sys
+import tempfile
+import threading
+
+os.environ.setdefault("OPENAI_API_KEY", "offline-test")   # store_pipeline checks it on import
+os.environ["EMBED_CACHE_ENABLED"] = "false"
+
+# 📁 Adjust path to import from parent directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import agentic_rag.ingest_jobs as ingest_jobs
+import agentic_rag.store_pipeline as store_pipeline
+from agentic_rag.fake_embedder import FakeEmbeddings
+from agentic_rag.ingest_engine import IngestEngine
+
+RUN_TIMEOUT = 30
+CONFIG = {
+    "logs": {"db_name": "logs", "store_logs": "store_logs"},
+    "default": {"db_name": "rag", "collection_name": "chunks"},
+    "chunk_strategy": "fixed",
+    "stream_window_chunks": 4,
+    "ingest": {"parse_workers": 1, "embed_workers": 2, "write_workers": 1, "queue_size": 2,
+               "write_batch_chunks": 4, "write_flush_seconds": 0.1},
+}
+
+
+def log_step(step: str):
+    print("\n" + ">>>" * 10 + f" {step} " + "<<<" * 10)
+
+
+def install_fakes(finished: dict):
+    def checkpoint_job(*args, **kwargs):
+        raise ConnectionError("mongo unavailable")
+
+    def finish_job(log_config, job_id, status, **fields):
+        finished[job_id] = (status, fields.get("error"))
+
+    def store_vectors_to_db(docs, config, subject):
+        for i, doc in enumerate(docs):
+            doc["_id"] = f"{doc['file_hash']}:{doc['chunk_index']}:{i}"
+
+    ingest_jobs.claim_job = lambda log_config, metadata, *args, **kwargs: {"_id": f"job-{metadata['file_name']}"}
+    ingest_jobs.checkpoint_job = checkpoint_job
+    ingest_jobs.finish_job = finish_job
+    store_pipeline.is_duplicate_upload = lambda log_config, metadata: False
+    store_pipeline.load_embedding_model = lambda batch_limits=None: FakeEmbeddings(dimensions=8)
+    store_pipeline.store_vectors_to_db = store_vectors_to_db
+
+
+def test_checkpoint_failure_does_not_hang():
+    log_step("CHECKPOINT RAISES ON EVERY WINDOW")
+    finished = {}
+    install_fakes(finished)
+    with tempfile.TemporaryDirectory() as folder:
+        paths = []
+        for n in range(3):
+            path = os.path.join(folder, f"notes_{n}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(f"file {n} " + "lorem ipsum dolor sit amet " * 400)
+            paths.append(path)
+
+        result = {}
+        runner = threading.Thread(target=lambda: result.update(IngestEngine(CONFIG).run(paths, "test_user")), daemon=True)
+        runner.start()
+        runner.join(RUN_TIMEOUT)
+        if runner.is_alive():
+            # Process pool / manager shutdown would wait on the stuck run forever → exit hard
+            print(f"❌ IngestEngine.run() still blocked after {RUN_TIMEOUT}s")
+            os._exit(1)
+
+    statuses = {os.path.basename(f["file"]): f["status"] for f in result["files"]}
+    print(f"📊 files={statuses} | jobs={finished}")
+    assert set(statuses.values()) == {"failed"}, f"❌ Every file should fail: {statuses}"
+    assert all(status == "failed" and "checkpoint failed" in (error or "") for status, error in finished.values()), \
+        "❌ Jobs should be marked failed with the checkpoint error"
+    print("✅ run() returned, files + jobs failed (resumable)")
+
+
+if __name__ == "__main__":
+    test_checkpoint_failure_does_not_hang()
@@ -0,0 +1,111 @@
+# Test_Near_Dedup_Scope.py
+
+# ✅ Usage
+# # Offline: near-duplicate candidates are scoped to the uploading user (no Mongo / API key needed)
+# python .\test_code\Test_Near_Dedup_Scope.py
+
+import os
+import sys
+
+# 📁 Adjust path to import from parent directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import agentic_rag.near_dedup as near_dedup
+from agentic_rag.chunk_dedup import dedup_scope
+from agentic_rag.near_dedup import NearChunkDedup, get_near_dedup_settings, lsh_band_keys, minhash_signature
+
+TEXT = ("The quarterly invoice for the Berlin office was approved by finance after the vendor "
+        "confirmed delivery of all twelve workstations and the remaining network equipment.")
+MODEL, DIMS = "gpt:text-embedding-3-small", 1536
+
+
+def log_step(step: str):
+    print("\n" + ">>>" * 10 + f" {step} " + "<<<" * 10)
+
+
+def _get(doc: dict, path: str):
+    for part in path.split("."):
+        doc = (doc or {}).get(part)
+    return doc
+
+
+class MemoryCollection:
+    """Just enough of a pymongo collection for NearChunkDedup: find() with equality / $in."""
+
+    def __init__(self, name: str, docs: list = None):
+        self.name = name
+        self.database = type("Database", (), {"name": "memory"})()
+        self.docs = docs or []
+
+    def find(self, query: dict, projection: dict = None):
+        def matches(doc):
+            for path, cond in query.items():
+                value = _get(doc, path)
+                if isinstance(cond, dict) and "$in" in cond:
+                    values = value if isinstance(value, list) else [value]
+                    if not set(values) & set(cond["$in"]):
+                        return False
+                elif value != cond:
+                    return False
+            return True
+        return [doc for doc in self.docs if matches(doc)]
+
+    def create_index(self, *args, **kwargs):
+        return "lsh_bands_1"
+
+    def index_information(self):
+        return {"lsh_bands_1": {}}
+
+    def insert_many(self, docs):
+        self.docs.extend(docs)
+
+    def insert_one(self, doc):
+        self.docs.append(doc)
+
+
+class MemoryDatabase(dict):
+    def __missing__(self, name):
+        self[name] = MemoryCollection(name)
+        return self[name]
+
+
+class MemoryClient(dict):
+    def __missing__(self, name):
+        self[name] = MemoryDatabase()
+        return self[name]
+
+
+def stored_chunk(user_id: str, settings: dict) -> dict:
+    sig = minhash_signature(TEXT, settings["num_perm"], settings["shingle_words"])
+    return {"_id": f"chunk-{user_id}", "chunk_text": TEXT, "subject": "default", "user_id": user_id,
+            "source_file": "invoice.pdf", "file_hash": f"hash-{user_id}",
+            "metadata": {"minhash": sig, "lsh_bands": lsh_band_keys(sig, settings["bands"]),
+                         "embedding_model": MODEL, "dims": DIMS}}
+
+
+def make_dedup(client: MemoryClient, user_id: str, settings: dict) -> NearChunkDedup:
+    near_dedup.get_mongo_client = lambda: client
+    config = {"default": {"db_name": "rag", "collection_name": "chunks"}, "logs": {"db_name": "logs"}}
+    metadata = {"file_name": "copy_of_invoice.pdf", "file_hash": f"new-{user_id}", "user_id": user_id}
+    return NearChunkDedup(config, "default", metadata, settings, dedup_scope("default", metadata, MODEL, DIMS))
+
+
+def test_other_users_chunk_is_not_a_match():
+    log_step("NEAR DUPLICATE OWNED BY ANOTHER USER")
+    settings = get_near_dedup_settings({"near_dedup": {"enabled": True, "action": "skip"}}, {})
+    client = MemoryClient()
+    client["rag"]["chunks"].docs.append(stored_chunk("user_a", settings))
+
+    dedup = make_dedup(client, "user_b", settings)
+    fresh, _ = dedup.split([TEXT], [0])
+    print(f"📊 user_b: kept {len(fresh)} | suppressed {dedup.suppressed}")
+    assert fresh == [TEXT] and dedup.suppressed == 0, "❌ user_b's chunk was suppressed by user_a's chunk"
+
+    dedup = make_dedup(client, "user_a", settings)
+    fresh, _ = dedup.split([TEXT], [0])
+    print(f"📊 user_a: kept {len(fresh)} | suppressed {dedup.suppressed}")
+    assert fresh == [] and dedup.suppressed == 1, "❌ Same user's near duplicate should still be skipped"
+    print("✅ Candidates are scoped to the uploading user")
+
+
+if __name__ == "__main__":
+    test_other_users_chunk_is_not_a_match()